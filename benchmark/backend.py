@@ -0,0 +1,222 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmark the poll and booking paths of `OutlookRoomRepository` against the
+local Graph stand-in, which runs in a separate process so that only the
+display's side is measured.
+
+    python3 -m benchmark.backend [--polls N] [--output results.json]
+
+Per scenario and fetch mode the median wall time and CPU time of a poll, the
+bytes received, the memory allocated by one poll and the peak RSS of the
+process are reported, as well as wall and CPU time of `book_room` and
+`cancel_running_adhoc_meeting`. Wall times include the minimum delay O365
+keeps between two requests of a connection (`requests_delay`, 200 ms).
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import O365
+
+from mrd import delta_sync
+from mrd import metrics
+from mrd import outlook
+from mrd import time_util
+from mrd.token_manager import TokenManager
+
+SCENARIOS = [
+    # (events per day, attendees per event)
+    (0, 0),
+    (25, 5),
+    (200, 5),
+    (25, 200),
+]
+
+MODES = {
+    'full': {},
+    'lean': {'lean_fetch': True},
+    'delta': {'sync_mode': outlook.OutlookRoomRepository.SYNC_MODE_DELTA},
+}
+
+ROOM_ID = 'room@example.org'
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class StandInProcess(object):
+    """Runs `mrd.mocks.graph_server` seeded with one day of events in a child process."""
+
+    def __init__(self, num_events, num_attendees, token_path):
+        if os.path.exists(token_path):
+            os.remove(token_path)
+        self._token_path = token_path
+        self.port = _free_port()
+        self.url = 'http://127.0.0.1:{0}/'.format(self.port)
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', 'mrd.mocks.graph_server', '--port', str(self.port), '--events', str(num_events),
+             '--attendees', str(num_attendees), '--token', token_path],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def __enter__(self):
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                if os.path.exists(self._token_path):
+                    return self
+            except OSError:
+                pass
+            time.sleep(0.05)
+        self._process.kill()
+        raise RuntimeError("Graph stand-in did not start")
+
+    def __exit__(self, *args):
+        self._process.terminate()
+        self._process.wait()
+
+
+def _timed(action):
+    wall, cpu = time.perf_counter(), time.thread_time()
+    result = action()
+    return result, time.perf_counter() - wall, time.thread_time() - cpu
+
+
+def _peak_rss_in_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def poll(repository, now):
+    repository.invalidate_schedule()
+    return repository.get_next_state_changing_appointment_up_to_midnight(now)
+
+
+def measure_polls(repository, registry, polls, num_events):
+    # from the start of the day on, the polls cover all seeded events
+    now, _ = time_util.get_day_bounds(time.time())
+    # the first poll resolves the calendar and, with delta sync, does the initial full sync
+    poll(repository, now)
+    num_fetched = len(repository.get_day_schedule(now))
+    if num_fetched != num_events:
+        raise RuntimeError("fetched {0} of {1} events".format(num_fetched, num_events))
+
+    received = registry.http_bytes.value(direction='received')
+    walls, cpus = [], []
+    for _ in range(polls):
+        _, wall, cpu = _timed(lambda: poll(repository, now))
+        walls.append(wall)
+        cpus.append(cpu)
+    received = (registry.http_bytes.value(direction='received') - received) / polls
+
+    tracemalloc.start()
+    poll(repository, now)
+    _, allocated = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'poll_wall_secs': statistics.median(walls), 'poll_cpu_secs': statistics.median(cpus),
+            'poll_bytes_received': received, 'poll_peak_allocated_bytes': allocated}
+
+
+def measure_booking(repository, bookings):
+    book_walls, book_cpus, cancel_walls, cancel_cpus = [], [], [], []
+    for i in range(bookings):
+        now = time.time()
+        # alternate between shortening (PATCH) and deleting (DELETE) the booking on cancellation
+        start = now - 120 if i % 2 == 0 else now - 10
+        _, wall, cpu = _timed(lambda: repository.book_room(start, now + 1800))
+        book_walls.append(wall)
+        book_cpus.append(cpu)
+        _, wall, cpu = _timed(repository.cancel_running_adhoc_meeting)
+        cancel_walls.append(wall)
+        cancel_cpus.append(cpu)
+
+    return {'book_wall_secs': statistics.median(book_walls), 'book_cpu_secs': statistics.median(book_cpus),
+            'cancel_wall_secs': statistics.median(cancel_walls), 'cancel_cpu_secs': statistics.median(cancel_cpus)}
+
+
+def run(polls, bookings):
+    # the stand-in serves plain http
+    outlook.allow_insecure_transport()
+    directory = tempfile.mkdtemp()
+    results = []
+    try:
+        for num_events, num_attendees in SCENARIOS:
+            token_path = os.path.join(directory, 'token.txt')
+            for mode, options in MODES.items():
+                # a fresh stand-in per mode, the bookings of one mode must not show up in the next
+                with StandInProcess(num_events, num_attendees, token_path) as stand_in:
+                    registry = metrics.Registry()
+                    repository = outlook.OutlookRoomRepository(ROOM_ID, 'client_id', 'client_secret',
+                                                               token_manager=TokenManager(token_path),
+                                                               graph_url=stand_in.url, **options)
+                    if repository._delta_sync is not None:
+                        repository._delta_sync = delta_sync.CalendarDeltaSync(
+                            os.path.join(directory, 'delta_{0}_{1}.json'.format(num_events, num_attendees)))
+                    repository.session.add_response_hook(registry.count_response)
+
+                    result = {'events': num_events, 'attendees': num_attendees, 'mode': mode}
+                    result.update(measure_polls(repository, registry, polls, num_events))
+                    result.update(measure_booking(repository, bookings))
+                    result['peak_rss_kb'] = _peak_rss_in_kb()
+                    results.append(result)
+    finally:
+        shutil.rmtree(directory)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Outlook poll and booking paths")
+    parser.add_argument("--polls", type=int, default=20, help="polls per measurement")
+    parser.add_argument("--bookings", type=int, default=4, help="book/cancel cycles per measurement")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run(args.polls, args.bookings)
+
+    print("{:>6} {:>9} {:<6} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+        "events", "attendees", "mode", "poll [ms]", "cpu [ms]", "bytes", "alloc [kB]", "book [ms]", "cancel [ms]",
+        "rss [kB]"))
+    for r in results:
+        print("{events:>6} {attendees:>9} {mode:<6} {:>10.2f} {:>10.2f} {:>10.0f} {:>10.1f} {:>10.2f} {:>10.2f} "
+              "{peak_rss_kb:>10}".format(r['poll_wall_secs'] * 1000, r['poll_cpu_secs'] * 1000,
+                                         r['poll_bytes_received'], r['poll_peak_allocated_bytes'] / 1024,
+                                         r['book_wall_secs'] * 1000, r['cancel_wall_secs'] * 1000, **r))
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'python': platform.python_version(), 'o365': O365.__version__, 'machine': platform.machine(),
+                       'results': results}, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
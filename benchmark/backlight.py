@@ -0,0 +1,206 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Compare the transports between the display and the backlight service.
+
+    python3 -m benchmark.backlight [--changes N] [--output results.json]
+
+Client and service run in this process, the service in a thread of its own,
+so a state change is timed from `publish` until the service handed it to
+its LED port. CPU time is that of this process per state change, the D-Bus
+daemon and the MQTT broker are not included. D-Bus needs pydbus and a
+session bus, MQTT paho-mqtt and a broker on localhost; transports whose
+requirements are missing are reported as unavailable.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from mrd.backlight import protocol
+
+DELIVERY_TIMEOUT_IN_SECS = 5
+COLORS = [(0, 255, 0), (255, 0, 0)]
+
+
+class RecordingPort(object):
+
+    def __init__(self):
+        self.delivered = threading.Event()
+
+    def state_changed(self, state):
+        self.delivered.set()
+
+
+def _start_thread(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.daemon = True
+    thread.start()
+
+
+def start_socket(port, directory):
+    from mrd.backlight.socket_client import BackLightSocketClient
+    from mrd.backlight.socket_service import BackLightSocketService
+
+    path = os.path.join(directory, 'backlight.sock')
+    service = BackLightSocketService(port, path)
+    _start_thread(service.run)
+    client = BackLightSocketClient(path)
+
+    def stop():
+        client.close()
+        service.close()
+    return client.publish, stop
+
+
+def start_dbus(port, directory):
+    from mrd.backlight.dbus_client import BackLightDbusClient
+    from mrd.backlight.dbus_service import BackLightDbusService
+
+    # the service runs its GLib main loop until the process ends
+    _start_thread(BackLightDbusService, port)
+    deadline = time.monotonic() + DELIVERY_TIMEOUT_IN_SECS
+    while True:
+        try:
+            client = BackLightDbusClient()
+            break
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(.05)
+    return client.publish, lambda: None
+
+
+def start_mqtt(port, directory):
+    from mrd.backlight.mqtt_client import BackLightMqttClient
+    from mrd.backlight.mqtt_service import BackLightMqttService
+
+    # the service runs paho's network loop until the process ends
+    _start_thread(BackLightMqttService, port)
+    client = BackLightMqttClient()
+    return client.publish, client.close
+
+
+TRANSPORTS = {
+    'dbus': start_dbus,
+    'mqtt': start_mqtt,
+    'socket': start_socket,
+}
+
+
+def _payloads():
+    # start at a random sequence number, a broker may still retain a state of an earlier run
+    sequence = random.getrandbits(32)
+    while True:
+        sequence = (sequence + 1) & 0xffffffff
+        yield protocol.encode('rgb', COLORS[sequence % len(COLORS)], sequence=sequence)
+
+
+def _warm_up(publish, port, payloads):
+    """Publish until the service received a state, it may still be subscribing or binding."""
+    deadline = time.monotonic() + DELIVERY_TIMEOUT_IN_SECS
+    while time.monotonic() < deadline:
+        port.delivered.clear()
+        publish(next(payloads))
+        if port.delivered.wait(.2):
+            return
+    raise RuntimeError("no state reached the service within {0}s".format(DELIVERY_TIMEOUT_IN_SECS))
+
+
+def measure(publish, port, changes):
+    payloads = _payloads()
+    _warm_up(publish, port, payloads)
+
+    latencies = []
+    cpu_started_at = time.process_time()
+    for _ in range(changes):
+        payload = next(payloads)
+        port.delivered.clear()
+        started_at = time.perf_counter()
+        publish(payload)
+        if not port.delivered.wait(DELIVERY_TIMEOUT_IN_SECS):
+            raise RuntimeError("state change not delivered within {0}s".format(DELIVERY_TIMEOUT_IN_SECS))
+        latencies.append(time.perf_counter() - started_at)
+    cpu_in_secs = time.process_time() - cpu_started_at
+
+    latencies.sort()
+    return {'median_latency_secs': statistics.median(latencies),
+            'p99_latency_secs': latencies[int(0.99 * (len(latencies) - 1))],
+            'cpu_secs_per_change': cpu_in_secs / changes}
+
+
+def run(changes, transports):
+    directory = tempfile.mkdtemp()
+    results = []
+    try:
+        for name in transports:
+            result = {'transport': name}
+            port = RecordingPort()
+            try:
+                publish, stop = TRANSPORTS[name](port, directory)
+            except Exception as e:
+                result['unavailable'] = '{0}: {1}'.format(type(e).__name__, e)
+                results.append(result)
+                continue
+
+            try:
+                result.update(measure(publish, port, changes))
+            except RuntimeError as e:
+                result['unavailable'] = str(e)
+            finally:
+                stop()
+            results.append(result)
+    finally:
+        shutil.rmtree(directory)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the transports to the backlight service")
+    parser.add_argument("--changes", type=int, default=1000, help="state changes per transport")
+    parser.add_argument("--transport", action='append', choices=sorted(TRANSPORTS),
+                        help="transport to measure, all by default")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run(args.changes, args.transport or sorted(TRANSPORTS))
+
+    print("{:<9} {:>14} {:>14} {:>17}".format("transport", "median [us]", "p99 [us]", "cpu/change [us]"))
+    for r in results:
+        if 'unavailable' in r:
+            print("{:<9} unavailable ({})".format(r['transport'], r['unavailable']))
+        else:
+            print("{:<9} {:>14.1f} {:>14.1f} {:>17.1f}".format(r['transport'], r['median_latency_secs'] * 1e6,
+                                                                r['p99_latency_secs'] * 1e6,
+                                                                r['cpu_secs_per_change'] * 1e6))
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results},
+                      output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
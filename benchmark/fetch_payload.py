@@ -0,0 +1,119 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Compare payload size and parse time of full and lean calendarView responses.
+
+    python3 -m benchmark.fetch_payload [--repeat N] [--output results.json]
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+from O365 import Account
+from O365.calendar import Calendar, Event
+
+from mrd import delta_sync
+from mrd import outlook
+from mrd import time_util
+from mrd.mocks import graph_payloads
+
+SCENARIOS = [
+    # (events per day, attendees per event)
+    (0, 0),
+    (25, 5),
+    (25, 200),
+    (200, 5),
+]
+
+
+def _offline_calendar():
+    schedule = Account(('client_id', 'client_secret')).schedule()
+    return Calendar(parent=schedule, **{schedule._cloud_data_key: {'id': 'calendar', 'name': 'Calendar'}})
+
+
+def parse_full(payload, calendar):
+    data = json.loads(payload)
+    events = [Event(parent=calendar, **{calendar._cloud_data_key: e}) for e in data.get('value', [])]
+    return [outlook.to_appointment(e) for e in events]
+
+
+def parse_lean(payload):
+    data = json.loads(payload)
+    return [outlook.record_to_appointment(delta_sync.to_event_record(e)) for e in data.get('value', [])]
+
+
+def measure(parse, payload, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(payload)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def run(repeat):
+    calendar = _offline_calendar()
+    day_start, _ = time_util.get_day_bounds(time.time())
+    lean_fields = outlook.OutlookRoomRepository._lean_fields
+    results = []
+
+    for num_events, num_attendees in SCENARIOS:
+        events = graph_payloads.make_day(day_start, num_events, num_attendees)
+        payloads = {
+            'full': json.dumps({'value': events}),
+            'lean': json.dumps({'value': [graph_payloads.select(e, lean_fields + ',attendees') for e in events]}),
+            'lean_without_attendees': json.dumps({'value': [graph_payloads.select(e, lean_fields) for e in events]}),
+        }
+        parsers = {
+            'full': lambda p: parse_full(p, calendar),
+            'lean': parse_lean,
+            'lean_without_attendees': parse_lean,
+        }
+
+        for mode, payload in payloads.items():
+            results.append({
+                'events': num_events,
+                'attendees': num_attendees,
+                'mode': mode,
+                'payload_bytes': len(payload.encode('utf-8')),
+                'parse_secs': measure(parsers[mode], payload, repeat),
+            })
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full vs. lean calendar fetches")
+    parser.add_argument("--repeat", type=int, default=20, help="iterations per measurement")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+
+    print("{:>6} {:>9} {:<24} {:>12} {:>12}".format("events", "attendees", "mode", "bytes", "parse [ms]"))
+    for r in results:
+        print("{events:>6} {attendees:>9} {mode:<24} {payload_bytes:>12} {:>12.3f}".format(r['parse_secs'] * 1000, **r))
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,7 @@
 # You should have received a copy of the GNU General Public License along with
 # Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
 
+import concurrent.futures
 import logging
 import os
 import subprocess
@@ -22,12 +23,16 @@ import threading
 import time
 from enum import Enum
 
+from . import polling
 from . import rooms
+from . import startup
 from . import time_util
 from mrd.outlook import AuthenticationFailureError
 
 
 CHECK_STATUS_TIMEOUT_IN_SECS = 10
+UPCOMING_WARNING_IN_SECS = 15 * 60
+AD_HOC_BOOKING_TITLE = "Ad-hoc Meeting"
 ADMIN_GPIO_CHANNEL = 40
 
 try:
@@ -47,14 +52,26 @@ class Hotspot(object):
         self.url = url
 
 
-def to_occupation(appointment):
+def to_occupation(appointment, is_stale=False, now=None):
     if appointment is None:
-        return rooms.Occupation(None, None)
+        return rooms.Occupation(None, None, is_stale)
 
-    if time_util.is_in_future(appointment.date_from):
-        return rooms.Occupation(None, appointment)
+    now = time.time() if now is None else now
+    if appointment.date_from > now:
+        return rooms.Occupation(None, appointment, is_stale, appointment.date_from - now <= UPCOMING_WARNING_IN_SECS)
     else:
-        return rooms.Occupation(appointment, None)
+        return rooms.Occupation(appointment, None, is_stale)
+
+
+def next_state_change(appointment, time_in_sec_since_epoch):
+    """Return the next instant after the given time at which the occupation derived
+    from `appointment` changes: upcoming warning, start or end. None if there is none."""
+    if appointment is None:
+        return None
+
+    instants = [appointment.date_from - UPCOMING_WARNING_IN_SECS, appointment.date_from, appointment.date_until]
+    future_instants = [t for t in instants if t > time_in_sec_since_epoch]
+    return min(future_instants) if future_instants else None
 
 
 class MeetingRoomApp(threading.Thread):
@@ -62,46 +79,170 @@ class MeetingRoomApp(threading.Thread):
     WELCOME_MSG = "Welcome to MP Meeting Room Display!"
     INCORRECT_CONFIG_MSG = "Incorrect username or password,\nplease update configuration file!"
 
-    appointment = None
-
-    def __init__(self, backend, room_information, event_port, network):
+    def __init__(self, backend, room_information, event_port, network, poll_policy=None, day_cache=None,
+                 poll_rate=None):
         super(MeetingRoomApp, self).__init__()
         self.backend = backend
         self.room_information = room_information
         self.event_port = event_port
         self.network = network
+        self.appointment = None
+        self._optimistic_occupation = None
+        self._day_cache = day_cache
+        self._day_schedule = day_cache.load() if day_cache is not None else None
+        self._is_stale = False
         self._state = AppStates.CONFIGURED if room_information is not None else AppStates.UNCONFIGURED
-
-    def _fetch_appointment(self):
-        self.appointment = self.backend.get_next_state_changing_appointment_up_to_midnight(time.time())
+        self._poll_policy = poll_policy if poll_policy is not None else polling.PollPolicy()
+        # counted by the repository where it actually fetches, None if it is not logged by this app
+        self._poll_rate = poll_rate
+        self._wakeup = threading.Event()
+        self._next_poll_at = 0
+        self._next_state_change_at = None
+        self._next_rate_log_at = 0
+        # written by the action worker, the update loop applies it to _next_poll_at
+        self._last_local_booking_at = None
+        self._rescheduled_local_booking_at = None
+        # bookings and cancellations run one after another on a single worker
+        self._actions = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def _fetch_appointment(self, now=None):
+        now = time.time() if now is None else now
+        self.appointment = self.backend.get_next_state_changing_appointment_up_to_midnight(now)
+        self._is_stale = False
         logging.info("Got appointment %s", self.appointment)
 
     def _update_room_data_periodically(self):
         logging.info("Starting update loop")
         while self._is_running:
             try:
-                if self.is_connected_to_network():
-                    logging.info("Fetching room data")
-                    self._update_room_data()
-                else:
-                    self.event_port.no_network_connection()
-
-                time.sleep(CHECK_STATUS_TIMEOUT_IN_SECS)
+                deadline = self._run_due_tasks(time.time())
             except Exception as e:
                 logging.error("Exception in update loop %s", e)
+                deadline = time.time() + CHECK_STATUS_TIMEOUT_IN_SECS
+
+            self._wait_until(deadline)
+            if self._is_running:
+                self._wakeup.clear()
+
+    def _run_due_tasks(self, now):
+        """Poll the calendar and/or publish a state change if due at `now`.
+
+        :returns: the time at which the next task is due."""
+        self._apply_local_booking()
+        is_poll_due = now >= self._next_poll_at
+        is_state_change_due = self._next_state_change_at is not None and now >= self._next_state_change_at
+
+        if is_poll_due or is_state_change_due:
+            if self.is_connected_to_network():
+                if self._is_stale:
+                    logging.info("Network is back, reconciling with the calendar")
+                logging.info("Fetching room data (poll due: %s, state change due: %s)", is_poll_due, is_state_change_due)
+                try:
+                    self._update_room_data(now)
+                except Exception as e:
+                    if not self._continue_offline(now, e):
+                        raise
+                else:
+                    self._remember_day_schedule(now)
+            elif not self._continue_offline(now, "no network connection"):
+                self.event_port.no_network_connection()
+
+        self._next_state_change_at = next_state_change(self.appointment, now)
+
+        if is_poll_due:
+            if self._is_stale:
+                # check for the network often to reconcile soon after it is back
+                interval = CHECK_STATUS_TIMEOUT_IN_SECS
+            else:
+                interval = self._poll_policy.next_interval(now, self._next_state_change_at, self._last_local_booking_at)
+            self._next_poll_at = now + interval
+            logging.info("Next calendar poll in %d s", interval)
+
+        if self._poll_rate is not None and now >= self._next_rate_log_at:
+            self._poll_rate.log_rate(now)
+            self._next_rate_log_at = now + polling.PollRateMeter.WINDOW_IN_SECS
+
+        if self._next_state_change_at is None:
+            return self._next_poll_at
+        return min(self._next_poll_at, self._next_state_change_at)
+
+    def _continue_offline(self, now, reason):
+        """Compute the occupation from the last known day schedule while the calendar is unreachable.
+
+        :returns: False if no known schedule covers `now`."""
+        if self._day_schedule is None or not self._day_schedule.covers(now):
+            return False
+
+        if not self._is_stale:
+            logging.warning("Showing the cached day schedule until the calendar is reachable (%s)", reason)
+        self._is_stale = True
+        self.appointment = self._day_schedule.next_state_changing(now)
+        self._publish_appointment(now)
+        return True
 
-    def _get_occupation(self):
-        return to_occupation(self.appointment)
+    def _remember_day_schedule(self, now):
+        day_schedule = self.backend.get_day_schedule(now)
+        if day_schedule is None:
+            return
 
-    def _update_room_data(self):
-        self._fetch_appointment()
+        self._day_schedule = day_schedule
+        if self._day_cache is not None:
+            try:
+                self._day_cache.save(day_schedule)
+            except OSError as e:
+                logging.warning("Could not write day schedule cache: %s", e)
+
+    def _wait_until(self, deadline):
+        timeout = deadline - time.time()
+        if timeout > 0:
+            # returns early when on_exit or a local booking sets the event
+            self._wakeup.wait(timeout)
+
+    def _reschedule_after_local_booking(self):
+        self._last_local_booking_at = time.time()
+        self._wakeup.set()
+
+    def _apply_local_booking(self):
+        """Poll fast after the latest local booking or cancellation, on the update loop thread."""
+        last_local_booking_at = self._last_local_booking_at
+        if last_local_booking_at is None or last_local_booking_at == self._rescheduled_local_booking_at:
+            return
+
+        self._rescheduled_local_booking_at = last_local_booking_at
+        self._next_poll_at = last_local_booking_at + self._poll_policy.fast_interval_in_secs
+
+    @property
+    def poll_rate(self):
+        return self._poll_rate
+
+    def _get_occupation(self, now=None):
+        if self._optimistic_occupation is not None:
+            return self._optimistic_occupation
+        return to_occupation(self.appointment, self._is_stale, now)
+
+    def _update_room_data(self, now=None):
+        self._fetch_appointment(now)
+        self._publish_appointment(now)
+
+    def _publish_appointment(self, now=None):
         self._is_occupied = self.appointment is not None
-        self.event_port.occupation_changed(self._get_occupation())
+        self.event_port.occupation_changed(self._get_occupation(now))
 
     def _wait_for_network_connection(self):
         while self._is_running and not self.is_connected_to_network():
-            self.event_port.no_network_connection()
-            time.sleep(CHECK_STATUS_TIMEOUT_IN_SECS)
+            if not self._continue_offline(time.time(), "no network connection"):
+                self.event_port.no_network_connection()
+            self._wakeup.wait(CHECK_STATUS_TIMEOUT_IN_SECS)
+
+    def _render_warm_start(self):
+        """Render the cached day schedule as provisional state before the calendar is reachable.
+
+        :returns: False if there is no cached schedule for today."""
+        if self._day_schedule is None or not self._day_schedule.covers(time.time()):
+            return False
+
+        self.event_port.render_initial_state()
+        return self._continue_offline(time.time(), "starting up")
 
     def _admin_detected_on_startup(self, channel):
         GPIO.setmode(GPIO.BOARD)
@@ -125,10 +266,12 @@ class MeetingRoomApp(threading.Thread):
             else:
                 self.event_port.incorrect_configuration(self.WELCOME_MSG)
         else:
+            is_warm_start = self._render_warm_start()
             self._wait_for_network_connection()
             try:
                 logging.info("Try to connect with exchange calendar")
                 self.backend.fetch_calendar()
+                startup.log_milestone("connected to calendar")
             except AuthenticationFailureError as e:
                 # first try to fetch data failed, probably caused by wrong credentials
                 logging.info("Exception while fetching calendar: %s", e.message)
@@ -144,7 +287,8 @@ class MeetingRoomApp(threading.Thread):
 
             logging.info("Starting normal operation")
             # everything initialized correctly, inform backend and start fetching events
-            self.event_port.render_initial_state()
+            if not is_warm_start:
+                self.event_port.render_initial_state()
             self._update_room_data_periodically()
 
     def _start_hotspot(self):
@@ -210,6 +354,8 @@ class MeetingRoomApp(threading.Thread):
         logging.info("App received closing signal. Exiting thread, notifying backlight.")
         self.event_port.shut_down()
         self._is_running = False
+        self._wakeup.set()
+        self._actions.shutdown(wait=False)
 
     def get_room_name(self):
         return self.room_information.name
@@ -219,15 +365,57 @@ class MeetingRoomApp(threading.Thread):
 
     def book_room(self, time_from, time_to):
         appointment = self.backend.book_room(time_from, time_to)
-        self._update_room_data()
+        if appointment is None:
+            self._update_room_data()
+        else:
+            # the room was free, so the new booking is the running appointment
+            self.appointment = appointment
+            self._publish_appointment()
+        self._remember_day_schedule(time.time())
+        self._reschedule_after_local_booking()
         return appointment
 
     def cancel_appointment(self):
         self.backend.cancel_running_adhoc_meeting()
         self._update_room_data()
+        self._remember_day_schedule(time.time())
+        self._reschedule_after_local_booking()
+
+    def book_room_async(self, time_from, time_to):
+        """Book the room without blocking the caller.
+
+        The room is published as occupied right away and reconciled with the
+        calendar once the backend replied, or rolled back if the booking failed.
+
+        :returns: a `concurrent.futures.Future` of the booked `Appointment`"""
+        appointment = rooms.Appointment(time_from, time_to, AD_HOC_BOOKING_TITLE, 0, True)
+        return self._run_optimistically(rooms.Occupation(appointment, None), self.book_room, time_from, time_to)
+
+    def cancel_appointment_async(self):
+        """Cancel the running ad hoc meeting without blocking the caller, see `book_room_async`.
+
+        :returns: a `concurrent.futures.Future`"""
+        return self._run_optimistically(rooms.Occupation(None, None), self.cancel_appointment)
+
+    def _run_optimistically(self, occupation, action, *args):
+        self._optimistic_occupation = occupation
+        self.event_port.occupation_changed(occupation)
+        return self._actions.submit(self._reconcile_after, action, *args)
+
+    def _reconcile_after(self, action, *args):
+        try:
+            return action(*args)
+        except Exception as e:
+            logging.error("Local booking or cancellation failed, rolling back: %s", e)
+            raise
+        finally:
+            self._optimistic_occupation = None
+            self.event_port.occupation_changed(self._get_occupation())
 
     def is_occupied(self):
-        if self.appointment is None:
+        if self._optimistic_occupation is not None:
+            return self._optimistic_occupation.is_occupied
+        elif self.appointment is None:
             return False
         else:
             return time_util.is_date_in_span(self.appointment.date_from, self.appointment.date_until, time.time())
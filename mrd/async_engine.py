@@ -0,0 +1,101 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+
+from . import rooms
+
+
+class AsyncEngine(object):
+    """Runs one asyncio event loop on a background thread.
+
+    Coroutines are submitted from any thread and run concurrently on the loop,
+    so all backend I/O shares one loop instead of a thread per request."""
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name='AsyncEngine', daemon=True)
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def submit(self, coroutine):
+        """Schedule `coroutine` on the loop and return a `concurrent.futures.Future`.
+
+        Cancelling the returned future cancels the coroutine."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def call(self, coroutine, timeout_in_secs=None):
+        """Run `coroutine` on the loop and wait for its result, cancelling it on timeout."""
+        future = self.submit(coroutine)
+        try:
+            return future.result(timeout_in_secs)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self):
+        if self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+        self._loop.close()
+        logging.info("AsyncEngine: stopped")
+
+
+class BlockingRoomRepository(rooms.RoomRepositoryPort):
+    """Offers an `AsyncRoomRepositoryPort` running on an `AsyncEngine` to synchronous callers."""
+    DEFAULT_TIMEOUT_IN_SECS = 60
+
+    def __init__(self, repository, engine, timeout_in_secs=DEFAULT_TIMEOUT_IN_SECS):
+        self._repository = repository
+        self._engine = engine
+        self._timeout_in_secs = timeout_in_secs
+
+    @property
+    def repository(self):
+        return self._repository
+
+    def fetch_calendar(self):
+        return self._engine.call(self._repository.fetch_calendar(), self._timeout_in_secs)
+
+    def get_next_state_changing_appointment_up_to_midnight(self, time_in_sec_since_epoch):
+        return self._engine.call(
+            self._repository.get_next_state_changing_appointment_up_to_midnight(time_in_sec_since_epoch),
+            self._timeout_in_secs)
+
+    def get_day_schedule(self, time_in_sec_since_epoch):
+        return self._engine.call(self._repository.get_day_schedule(time_in_sec_since_epoch), self._timeout_in_secs)
+
+    def book_room(self, time_from, time_to):
+        return self._engine.call(self._repository.book_room(time_from, time_to), self._timeout_in_secs)
+
+    def cancel_running_adhoc_meeting(self):
+        return self._engine.call(self._repository.cancel_running_adhoc_meeting(), self._timeout_in_secs)
+
+    def close(self):
+        self._engine.call(self._repository.close(), self._timeout_in_secs)
@@ -0,0 +1,251 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from . import delta_sync
+from . import outlook
+from . import rooms
+from . import schedule
+from . import time_util
+
+
+class AsyncOutlookRoomRepository(rooms.AsyncRoomRepositoryPort):
+    """Asyncio implementation of the Outlook room repository.
+
+    All requests share one `aiohttp.ClientSession` and may run concurrently,
+    each one is bounded by `request_timeout_in_secs`. The O365 account is only
+    used for the OAuth token, which is refreshed in an executor as O365 itself
+    is blocking."""
+    DEFAULT_REQUEST_TIMEOUT_IN_SECS = 20
+
+    _events_per_page = outlook.OutlookRoomRepository._events_per_page
+    _lean_fields = outlook.OutlookRoomRepository._lean_fields
+    _scopes = outlook.OutlookRoomRepository._scopes
+    _ad_hoc_subject = outlook.OutlookRoomRepository._ad_hoc_subject
+
+    def __init__(self, room_id, client_id, client_secret,
+                 refresh_interval_in_secs=outlook.OutlookRoomRepository.DEFAULT_REFRESH_INTERVAL_IN_SECS,
+                 request_timeout_in_secs=DEFAULT_REQUEST_TIMEOUT_IN_SECS, count_attendees=True, session=None,
+                 token_manager=None, graph_url=None, poll_rate=None):
+        self._room_id = room_id
+        self._poll_rate = poll_rate
+        self._refresh_hooks = []
+        if session is None:
+            session = outlook.OutlookSession((client_id, client_secret), self._scopes, token_manager=token_manager,
+                                             graph_url=graph_url)
+        self._session = session
+        self._token_manager = token_manager
+        self._refresh_interval_in_secs = refresh_interval_in_secs
+        self._timeout = aiohttp.ClientTimeout(total=request_timeout_in_secs)
+        self._count_attendees = count_attendees
+        self._http = None
+        self._trace_configs = []
+        self._schedule_lock = None
+        self._schedule = None
+        self._schedule_expires_at = 0
+        self._booked_appointment = None
+
+        outlook.load_o365()
+
+    async def fetch_calendar(self):
+        loop = asyncio.get_running_loop()
+        try:
+            # resolving the account reads the token file and may refresh it
+            await loop.run_in_executor(None, self._session.get_calendar)
+        except RuntimeError as e:
+            raise outlook.AuthenticationFailureError(e)
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+
+    def add_trace_config(self, trace_config):
+        """Register an `aiohttp.TraceConfig`, takes effect with the next HTTP session."""
+        self._trace_configs.append(trace_config)
+
+    def add_refresh_hook(self, hook):
+        """Register `hook(duration_in_secs)`, called after every schedule refresh from Outlook."""
+        self._refresh_hooks.append(hook)
+
+    def _http_session(self):
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(timeout=self._timeout, trace_configs=self._trace_configs or None)
+        return self._http
+
+    def _request_context(self, rejected_access_token=None):
+        """Return the service URL and a valid access token.
+
+        Blocking, the session may rebuild the account and the token may have to
+        be refreshed, so this runs in an executor and never on the event loop."""
+        account = self._session.account
+        token = account.con.token_backend.token
+        if rejected_access_token is not None or token is None or token.is_access_expired:
+            if self._token_manager is not None:
+                # serialised with the background refresh and the ones O365 does itself
+                is_refreshed = self._token_manager.ensure_fresh(rejected_access_token)
+            else:
+                is_refreshed = account.con.refresh_token()
+            if not is_refreshed:
+                raise outlook.AuthenticationFailureError("refreshing the access token failed")
+            token = account.con.token_backend.token
+        return account.protocol.service_url, token['access_token']
+
+    async def _request(self, method, endpoint, params=None, json=None, headers=None):
+        """Send a Graph request and return the decoded response, None if it has no body.
+
+        `endpoint` is relative to the user, or an absolute URL such as a next link."""
+        loop = asyncio.get_running_loop()
+        rejected_access_token = None
+        while True:
+            service_url, access_token = await loop.run_in_executor(None, self._request_context,
+                                                                   rejected_access_token)
+            request_headers = dict(headers or {})
+            request_headers['Authorization'] = 'Bearer ' + access_token
+            url = endpoint if endpoint.startswith('http') else service_url + 'me' + endpoint
+            async with self._http_session().request(method, url, params=params, json=json,
+                                                    headers=request_headers) as response:
+                if response.status == 401 and rejected_access_token is None:
+                    # the token was revoked or expired early, refresh once
+                    rejected_access_token = access_token
+                    continue
+
+                response.raise_for_status()
+                if response.status == 204:
+                    return None
+                return await response.json()
+
+    async def _fetch_records(self, time_in_sec_since_epoch, midnight_in_secs):
+        params = {
+            'startDateTime': time_util.convert_secs_since_epoch_to_string(time_in_sec_since_epoch),
+            'endDateTime': time_util.convert_secs_since_epoch_to_string(midnight_in_secs),
+            '$select': self._lean_fields + (',attendees' if self._count_attendees else ''),
+            '$top': str(self._events_per_page),
+            '$orderby': 'start/dateTime',
+        }
+        headers = {'Prefer': 'outlook.timezone="UTC"'}
+        records = []
+        url = '/calendar/calendarView'
+        while url is not None:
+            data = await self._request('GET', url, params=params, headers=headers)
+            records.extend(delta_sync.to_event_record(e) for e in data.get('value', []))
+            # the next link carries the query
+            url, params = data.get('@odata.nextLink'), None
+        return records
+
+    async def get_day_schedule(self, time_in_sec_since_epoch):
+        """Return the cached `DaySchedule`, concurrent callers share one refresh."""
+        if self._schedule_lock is None:
+            self._schedule_lock = asyncio.Lock()
+
+        async with self._schedule_lock:
+            if self._schedule is None \
+                    or not self._schedule.covers(time_in_sec_since_epoch) \
+                    or time.monotonic() >= self._schedule_expires_at:
+                _, midnight_in_secs = time_util.get_day_bounds(time_in_sec_since_epoch)
+                if self._poll_rate is not None:
+                    self._poll_rate.record(time.time())
+                started_at = time.monotonic()
+                try:
+                    records = await self._fetch_records(time_in_sec_since_epoch, midnight_in_secs)
+                finally:
+                    for hook in self._refresh_hooks:
+                        hook(time.monotonic() - started_at)
+                appointments = [outlook.record_to_appointment(r, self._is_adhoc_record(r)) for r in records]
+                self._schedule = schedule.DaySchedule(appointments, time_in_sec_since_epoch, midnight_in_secs)
+                self._schedule_expires_at = time.monotonic() + self._refresh_interval_in_secs
+                logging.info("AsyncOutlookRoomRepository: refreshed day schedule, %d event(s)", len(self._schedule))
+
+            return self._schedule
+
+    def invalidate_schedule(self):
+        self._schedule = None
+
+    async def get_next_state_changing_appointment_up_to_midnight(self, time_in_sec_since_epoch):
+        day_schedule = await self.get_day_schedule(time_in_sec_since_epoch)
+        appointment = day_schedule.next_state_changing(time_in_sec_since_epoch)
+
+        if appointment is None:
+            logging.info("AsyncOutlookRoomRepository: no event found for %s", self._room_id)
+        else:
+            logging.info("AsyncOutlookRoomRepository: found event {0}, {1}, {2}".format(
+                time_util.convert_secs_since_epoch_to_string(appointment.date_from),
+                time_util.convert_secs_since_epoch_to_string(appointment.date_until),
+                appointment.title))
+
+        return appointment
+
+    async def book_room(self, time_from, time_to):
+        logging.info("AsyncOutlookRoomRepository: received booking request from %s, to %s",
+                     time_util.convert_secs_since_epoch_to_string(time_from),
+                     time_util.convert_secs_since_epoch_to_string(time_to))
+        event = {'subject': self._ad_hoc_subject,
+                 'start': outlook.to_graph_datetime(time_from), 'end': outlook.to_graph_datetime(time_to)}
+        graph_event = await self._request('POST', '/calendar/events', json=event)
+        appointment = outlook.record_to_appointment(delta_sync.to_event_record(graph_event), is_adhoc=True)
+        self._booked_appointment = appointment
+        self._apply_to_schedule(added=[appointment])
+
+        return appointment
+
+    def _apply_to_schedule(self, added=(), removed_event_ids=()):
+        if self._schedule is not None:
+            self._schedule = self._schedule.with_changes(added, removed_event_ids)
+
+    async def _get_running_adhoc_appointment(self, time_in_sec_since_epoch):
+        booked = self._booked_appointment
+        if booked is not None and booked.date_from <= time_in_sec_since_epoch < booked.date_until:
+            return booked
+
+        day_schedule = await self.get_day_schedule(time_in_sec_since_epoch)
+        current = day_schedule.current(time_in_sec_since_epoch)
+        if current is None:
+            logging.info("AsyncOutlookRoomRepository: no currently running event")
+            return None
+        if not current.is_adhoc:
+            logging.info("AsyncOutlookRoomRepository: current event is no ad hoc booking")
+            return None
+        return current
+
+    async def cancel_running_adhoc_meeting(self):
+        time_in_sec_since_epoch = time.time()
+        appointment = await self._get_running_adhoc_appointment(time_in_sec_since_epoch)
+        if appointment is None:
+            return None
+
+        # only retain events in calendar that took more than a minute
+        shortened = outlook.end_appointment(appointment, time_in_sec_since_epoch)
+        endpoint = '/events/{0}'.format(appointment.event_id)
+        if shortened is not None:
+            await self._request('PATCH', endpoint, json={'end': outlook.to_graph_datetime(time_in_sec_since_epoch)})
+        else:
+            await self._request('DELETE', endpoint)
+
+        self._booked_appointment = None
+        self._apply_to_schedule(added=[shortened] if shortened is not None else [],
+                                removed_event_ids=[appointment.event_id])
+        logging.info("AsyncOutlookRoomRepository: cancelled event %s", appointment.title)
+
+        return shortened
+
+    def _is_adhoc_record(self, record):
+        return record['organizer'].lower() == self._room_id.lower() and record['subject'] == self._ad_hoc_subject
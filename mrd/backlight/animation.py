@@ -0,0 +1,266 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Time based LED effects, rendered at a fixed frame rate into a `FrameBuffer`.
+
+All colors of an effect are looked up in tables computed once, a frame only
+indexes into them, so animating stays cheap on a Pi Zero."""
+
+import array
+import colorsys
+import logging
+import math
+import threading
+import time
+
+GAMMA = bytes(int(round(255 * (i / 255.0) ** 2.8)) for i in range(256))
+
+
+def pack_color(r, g, b):
+    """Pack a color the way `neopixel.Color` does."""
+    return (r << 16) | (g << 8) | b
+
+
+def _hue_wheel(steps=256):
+    wheel = array.array('I')
+    for i in range(steps):
+        r, g, b = colorsys.hsv_to_rgb(i / float(steps), 1, 1)
+        wheel.append(pack_color(int(r * 255), int(g * 255), int(b * 255)))
+    return wheel
+
+
+HUE_WHEEL = _hue_wheel()
+
+
+def brightness_table(rgb):
+    """Packed, gamma corrected colors of `rgb` for the brightness levels 0..255."""
+    r, g, b = rgb
+    return array.array('I', (pack_color(GAMMA[r * level // 255], GAMMA[g * level // 255], GAMMA[b * level // 255])
+                             for level in range(256)))
+
+
+def rainbow_frame(num_pixels):
+    return [HUE_WHEEL[(i * 16) % len(HUE_WHEEL)] for i in range(num_pixels)]
+
+
+class Effect(object):
+    """An effect draws its frames into a `FrameBuffer`.
+
+    `fps` is the frame rate the effect needs, None if it never changes after
+    the first frame. `duration_in_secs` is None for effects that run until
+    they are replaced."""
+    fps = None
+    duration_in_secs = None
+
+    def draw(self, frame_buffer, elapsed_in_secs):
+        raise NotImplementedError()
+
+
+class Static(Effect):
+
+    def __init__(self, rgb):
+        self._color = pack_color(*rgb)
+
+    def draw(self, frame_buffer, elapsed_in_secs):
+        frame_buffer.fill_packed(self._color)
+
+
+class Rainbow(Effect):
+
+    def __init__(self):
+        self._frame = None
+
+    def draw(self, frame_buffer, elapsed_in_secs):
+        if self._frame is None or len(self._frame) != len(frame_buffer):
+            self._frame = rainbow_frame(len(frame_buffer))
+        frame_buffer.set_frame(self._frame)
+
+
+class Breathing(Effect):
+    """Fade `rgb` between a floor and full brightness along a sine."""
+    fps = 30
+    STEPS = 128
+
+    def __init__(self, rgb, period_in_secs=3.0, floor=0.15):
+        self._period_in_secs = period_in_secs
+        levels = brightness_table(rgb)
+        self._colors = array.array('I')
+        for i in range(self.STEPS):
+            sine = (1 - math.cos(2 * math.pi * i / self.STEPS)) / 2
+            self._colors.append(levels[int(255 * (floor + (1 - floor) * sine))])
+
+    def draw(self, frame_buffer, elapsed_in_secs):
+        step = int(elapsed_in_secs / self._period_in_secs * self.STEPS) % self.STEPS
+        frame_buffer.fill_packed(self._colors[step])
+
+
+class Progress(Effect):
+    """Light the share of the strip that corresponds to the remaining time, the last lit pixel dims gradually.
+
+    `start_in_secs` and `end_in_secs` are seconds since the epoch."""
+    fps = 1
+
+    def __init__(self, rgb, start_in_secs, end_in_secs, clock=time.time):
+        self._levels = brightness_table(rgb)
+        self._start_in_secs = start_in_secs
+        self._total_in_secs = max(end_in_secs - start_in_secs, 1)
+        self._clock = clock
+
+    def draw(self, frame_buffer, elapsed_in_secs):
+        passed = (self._clock() - self._start_in_secs) / self._total_in_secs
+        remaining = 1 - min(max(passed, 0), 1)
+        lit = remaining * len(frame_buffer)
+        full = int(lit)
+        for i in range(len(frame_buffer)):
+            if i < full:
+                frame_buffer.set_packed(i, self._levels[255])
+            elif i == full:
+                frame_buffer.set_packed(i, self._levels[int((lit - full) * 255)])
+            else:
+                frame_buffer.set_packed(i, self._levels[0])
+
+
+class Pulse(Effect):
+    """Flash `rgb` once and fade out, drawn on top of the running effect."""
+    fps = 30
+    STEPS = 64
+
+    def __init__(self, rgb, duration_in_secs=1.5):
+        self.duration_in_secs = duration_in_secs
+        levels = brightness_table(rgb)
+        self._colors = array.array('I', (levels[int(255 * (1 - i / float(self.STEPS - 1)) ** 2)]
+                                         for i in range(self.STEPS)))
+
+    def draw(self, frame_buffer, elapsed_in_secs):
+        step = min(int(elapsed_in_secs / self.duration_in_secs * self.STEPS), self.STEPS - 1)
+        frame_buffer.fill_packed(self._colors[step])
+
+
+class FrameStats(object):
+    """How far frames were drawn after their deadline."""
+
+    def __init__(self):
+        self.frames = 0
+        self.dropped = 0
+        self.max_jitter_in_secs = 0.0
+        self._total_jitter_in_secs = 0.0
+
+    def add(self, jitter_in_secs):
+        self.frames += 1
+        self._total_jitter_in_secs += jitter_in_secs
+        self.max_jitter_in_secs = max(self.max_jitter_in_secs, jitter_in_secs)
+
+    @property
+    def mean_jitter_in_secs(self):
+        return self._total_jitter_in_secs / self.frames if self.frames else 0.0
+
+    def __repr__(self):
+        return 'frames: {0}, dropped: {1}, mean jitter: {2:.2f}ms, max jitter: {3:.2f}ms'.format(
+            self.frames, self.dropped, self.mean_jitter_in_secs * 1000, self.max_jitter_in_secs * 1000)
+
+
+class AnimationEngine(object):
+    """Run the current effect, plus an optional pulse on top of it, in a thread of its own.
+
+    Frames are scheduled on absolute deadlines so the rate does not drift,
+    frames that are late by more than a frame are dropped instead of being
+    caught up with. Without an animated effect the thread sleeps."""
+
+    def __init__(self, frame_buffer, clock=time.monotonic):
+        self._frame_buffer = frame_buffer
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._effect = None
+        self._effect_started_at = 0
+        self._overlay = None
+        self._overlay_started_at = 0
+        self._generation = 0
+        self._closed = False
+        self.stats = FrameStats()
+        self._thread = threading.Thread(target=self._run, name='animation')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def play(self, effect):
+        """Replace the running effect, a running pulse stays on top."""
+        with self._condition:
+            self._effect = effect
+            self._effect_started_at = self._clock()
+            self._draw(self._effect_started_at)
+            self._restart()
+
+    def flash(self, effect):
+        """Draw the finite `effect` on top of the running one until it is over."""
+        with self._condition:
+            self._overlay = effect
+            self._overlay_started_at = self._clock()
+            self._draw(self._overlay_started_at)
+            self._restart()
+
+    def close(self, timeout=None):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout)
+        logging.info("animation stopped, %s", self.stats)
+
+    def _restart(self):
+        self._generation += 1
+        self._condition.notify()
+
+    def _fps(self):
+        rates = [e.fps for e in (self._effect, self._overlay) if e is not None and e.fps]
+        return max(rates) if rates else None
+
+    def _draw(self, now):
+        overlay = self._overlay
+        if overlay is not None and now - self._overlay_started_at >= overlay.duration_in_secs:
+            self._overlay = overlay = None
+
+        if overlay is not None:
+            overlay.draw(self._frame_buffer, now - self._overlay_started_at)
+        elif self._effect is not None:
+            self._effect.draw(self._frame_buffer, now - self._effect_started_at)
+        self._frame_buffer.render()
+
+    def _run(self):
+        with self._condition:
+            while not self._closed:
+                fps = self._fps()
+                if fps is None:
+                    self._condition.wait()
+                    continue
+
+                generation = self._generation
+                period = 1.0 / fps
+                deadline = self._clock() + period
+                while not self._closed and generation == self._generation:
+                    now = self._clock()
+                    if now < deadline:
+                        self._condition.wait(deadline - now)
+                        continue
+
+                    lateness = now - deadline
+                    if lateness >= period:
+                        skipped = int(lateness / period)
+                        self.stats.dropped += skipped
+                        deadline += skipped * period
+                    self.stats.add(now - deadline)
+                    self._draw(now)
+                    deadline += period
+                    if self._fps() != fps:
+                        break
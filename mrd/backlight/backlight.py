@@ -15,36 +15,56 @@
 # You should have received a copy of the GNU General Public License along with
 # Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
 
-import time
 import logging
-import pickle
+import random
 
-from mrd.backlight.dbus_client import BackLightDbusClient
-from mrd.backlight.mqtt_client import BackLightMqttClient
+from mrd.backlight import protocol
 
 import mrd.rooms as rooms
 
 UNICORN = u"Unicorn User"
 
+TRANSPORT_DBUS = 'dbus'
+TRANSPORT_MQTT = 'mqtt'
+TRANSPORT_SOCKET = 'socket'
+
+
+def create_client(transport, registry=None, socket_path=None):
+    """Create the client sending states to the backlight service, the transports' dependencies are optional."""
+    logging.info("Using the %s backlight transport", transport)
+    if transport == TRANSPORT_DBUS:
+        from mrd.backlight.dbus_client import AsyncBackLightDbusClient
+        return AsyncBackLightDbusClient(registry=registry)
+    elif transport == TRANSPORT_MQTT:
+        from mrd.backlight.mqtt_client import BackLightMqttClient
+        return BackLightMqttClient(registry=registry)
+    elif transport == TRANSPORT_SOCKET:
+        from mrd.backlight.socket_client import BackLightSocketClient, SOCKET_PATH
+        return BackLightSocketClient(socket_path or SOCKET_PATH)
+    else:
+        raise ValueError("unknown backlight transport {0}".format(transport))
+
+
 def is_easteregg(occupation):
     organizer = repr(occupation.current_event.title.strip())
     return organizer == repr(UNICORN)
 
-def is_upcoming_event_in_some_minutes(occupation):
-    date_diff = int(occupation.upcoming_event_today.date_from - time.time())
-    return date_diff <= 15 * 60
-
 
 class BackLight(rooms.EventPort):
     def occupation_changed(self, occupation):
+        booked_event_id = None
         if occupation.is_occupied:
             logging.info("Setting backlight to occupied")
+            if occupation.current_event.is_adhoc:
+                booked_event_id = occupation.current_event.event_id
+            # the pulse is part of the occupied state, the transports only keep the latest state
+            is_booked = booked_event_id is not None and booked_event_id != self._booked_event_id
             if is_easteregg(occupation):
-                self.set_rainbow()
-            else:   
-                self.set_occupied()
+                self.set_rainbow(is_booked)
+            else:
+                self.set_occupied(occupation.current_event, is_booked)
         elif occupation.upcoming_event_today != None:
-            if is_upcoming_event_in_some_minutes(occupation):
+            if occupation.is_upcoming_soon:
                 logging.info("Setting backlight event upcoming")
                 self.set_event_upcoming()
             else:
@@ -53,6 +73,7 @@ class BackLight(rooms.EventPort):
         else:
             logging.info("Setting backlight to free")
             self.set_free()
+        self._booked_event_id = booked_event_id
 
     def no_network_connection(self):
         logging.info("BackLight: Received no_network_connection from application")
@@ -64,10 +85,10 @@ class BackLight(rooms.EventPort):
     def render_initial_state(self):
         pass
 
-    def __init__(self):
+    def __init__(self, registry=None, transport=TRANSPORT_DBUS, socket_path=None):
+        self._booked_event_id = None
         try:
-            #self.impl = BackLightProxy(BackLightMqttClient())
-            self.impl = BackLightProxy(BackLightDbusClient())
+            self.impl = BackLightProxy(create_client(transport, registry, socket_path))
         except Exception as e:
             logging.warning("Error while creating backlight client (%s), using dummy implementation", e)
             self.impl = BackLightDummy()
@@ -75,14 +96,14 @@ class BackLight(rooms.EventPort):
     def set_free(self):
         self.impl.set_free()
 
-    def set_occupied(self):
-        self.impl.set_occupied()
+    def set_occupied(self, appointment=None, is_booked=False):
+        self.impl.set_occupied(appointment, is_booked)
 
     def set_event_upcoming(self):
         self.impl.set_event_upcoming()
 
-    def set_rainbow(self):
-        self.impl.set_rainbow()
+    def set_rainbow(self, is_booked=False):
+        self.impl.set_rainbow(is_booked)
 
     def set_unconnected(self):
         self.impl.set_unconnected()
@@ -95,64 +116,62 @@ class BackLight(rooms.EventPort):
 
 
 class BackLightProxy(object):
+    CLOSE_TIMEOUT_IN_SECS = 3
+    MAX_PROGRESS_IN_SECS = 12 * 60 * 60
 
     def __init__(self, client):
         self._client = client
+        # states are retained by the broker, start at a random number so the
+        # first state after a restart is not taken for a redelivery
+        self._sequence = random.getrandbits(32)
+
+    def _publish(self, name, rgb=None, effect=protocol.EFFECT_NONE, start=0, end=0, pulse=False):
+        self._sequence = (self._sequence + 1) & 0xffffffff
+        logging.debug("Publishing backlight state %s %s, effect %d, pulse %s (%d)", name, rgb, effect, pulse,
+                      self._sequence)
+        self._client.publish(protocol.encode(name, rgb, effect, self._sequence, start, end, pulse))
 
     def set_free(self):
-        event = {'name': 'rgb', 'rgb': (0, 255, 0)}
-        dumps = pickle.dumps(event)
-        logging.info("set backlight to green: {0}".format(event))
-        self._client.publish(dumps)
+        self._publish('rgb', (0, 255, 0))
 
-    def set_occupied(self):
-        event = {'name': 'rgb', 'rgb': (255, 0, 0)}
-        dumps = pickle.dumps(event)
-        logging.info("set backlight to red: {0}".format(event))
-        self._client.publish(dumps)
+    def set_occupied(self, appointment=None, is_booked=False):
+        if appointment is None or appointment.date_until - appointment.date_from > self.MAX_PROGRESS_IN_SECS:
+            # a bar spanning e.g. an all-day booking would hardly move
+            self._publish('rgb', (255, 0, 0), pulse=is_booked)
+        else:
+            # the service counts down the remaining time on its own
+            self._publish('rgb', (255, 0, 0), protocol.EFFECT_PROGRESS, appointment.date_from, appointment.date_until,
+                          pulse=is_booked)
 
     def set_event_upcoming(self):
-        event = {'name': 'rgb', 'rgb': (255, 95, 0)}
-        dumps = pickle.dumps(event)
-        logging.info("set backlight to orange: {0}".format(event))
-        self._client.publish(dumps)
+        self._publish('rgb', (255, 95, 0), protocol.EFFECT_BREATHING)
 
-    def set_rainbow(self):
-        event = {'name': 'rainbow'}
-        dumps = pickle.dumps(event)
-        logging.info("set backlight to rainbow: {0}".format(event))
-        self._client.publish(dumps)
+    def set_rainbow(self, is_booked=False):
+        self._publish('rainbow', pulse=is_booked)
 
     def set_unconnected(self):
-        event = {'name': 'rgb', 'rgb': (0, 0, 255)}
-        dumps = pickle.dumps(event)
-        logging.info("set backlight to blue: {0}".format(event))
-        self._client.publish(dumps)
+        self._publish('rgb', (0, 0, 255))
 
     def clear(self):
-        event = {'name': 'clear'}
-        dumps = pickle.dumps(event)
-        logging.info("clear backlight: {0}".format(event))
-        self._client.publish(dumps)
+        self._publish('clear')
 
     def shut_down(self):
-        event = {'name': 'quit'}
-        dumps = pickle.dumps(event)
-        logging.info("turn off backlight: {0}".format(event))
-        self._client.publish(dumps)
+        self._publish('quit')
+        # the client delivers in the background, make sure 'quit' is out before the app exits
+        self._client.close(self.CLOSE_TIMEOUT_IN_SECS)
 
 
 class BackLightDummy(object):
     def set_free(self):
         logging.info("Set backlight to free")
 
-    def set_occupied(self):
-        logging.info("Set backlight to occupied")
+    def set_occupied(self, appointment=None, is_booked=False):
+        logging.info("Set backlight to occupied%s", ", pulse for booking" if is_booked else "")
     
     def set_event_upcoming(self):
         logging.info("set backlight to upcoming")
 
-    def set_rainbow(self):
+    def set_rainbow(self, is_booked=False):
         logging.info("Set backlight to rainbow")
 
     def set_unconnected(self):
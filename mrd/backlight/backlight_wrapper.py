@@ -15,10 +15,20 @@
 # You should have received a copy of the GNU General Public License along with
 # Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
 
+import array
 import logging
 import time
-import colorsys
-from neopixel import *
+
+from mrd.backlight import animation
+from mrd.backlight import protocol
+from mrd.backlight.animation import pack_color
+
+try:
+    from neopixel import Adafruit_NeoPixel, ws
+except ImportError:
+    # not running on a Raspberry Pi, `BacklightWrapper` falls back to `BacklightMock`
+    Adafruit_NeoPixel = None
+    ws = None
 
 
 class LEDPort(object):
@@ -46,7 +56,7 @@ class CompositeLEDPort(LEDPort):
 
 class LEDState(object):
     def __init__(self, name, rgb=None):
-        logging.info("new LEDState {0}, {1}".format(name, rgb))
+        logging.debug("new LEDState %s, %s", name, rgb)
         self._name = name
         self._rgb = rgb
 
@@ -81,6 +91,68 @@ class BacklightWrapper(LEDPort):
         self.backlight.state_changed(state)
 
 
+class FrameBuffer(object):
+    """Compose frames in a flat array and push only what changed to the strip.
+
+    The strip is written pixel by pixel and `show()` is only called when at
+    least one pixel differs from the last frame shown."""
+    UNKNOWN = 0xffffffff
+
+    def __init__(self, strip, num_pixels):
+        self._strip = strip
+        self._frame = array.array('I', [0] * num_pixels)
+        self._shown = array.array('I', [self.UNKNOWN] * num_pixels)
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+        self.pixels_pushed = 0
+
+    def __len__(self):
+        return len(self._frame)
+
+    def fill(self, r, g, b):
+        self.fill_packed(pack_color(r, g, b))
+
+    def fill_packed(self, color):
+        for i in range(len(self._frame)):
+            self._frame[i] = color
+
+    def set_pixel(self, i, r, g, b):
+        self._frame[i] = pack_color(r, g, b)
+
+    def set_packed(self, i, color):
+        self._frame[i] = color
+
+    def set_frame(self, colors):
+        """Replace the whole frame with a sequence of packed colors."""
+        self._frame[:] = array.array('I', colors)
+
+    def render(self):
+        """Push the composed frame, return whether the strip was updated."""
+        frame = self._frame
+        shown = self._shown
+        changed = 0
+        for i in range(len(frame)):
+            color = frame[i]
+            if color != shown[i]:
+                self._strip.setPixelColor(i, color)
+                shown[i] = color
+                changed += 1
+
+        if changed == 0:
+            self.frames_skipped += 1
+            return False
+
+        self._strip.show()
+        self.frames_rendered += 1
+        self.pixels_pushed += changed
+        return True
+
+    def invalidate(self):
+        """Forget the last frame shown, e.g. after the strip was reset by someone else."""
+        for i in range(len(self._shown)):
+            self._shown[i] = self.UNKNOWN
+
+
 class NeoPixelLight(object):
     # LED strip configuration:
     LED_COUNT = 16  # Number of LED pixels.
@@ -90,10 +162,13 @@ class NeoPixelLight(object):
     LED_BRIGHTNESS = 100  # Set to 0 for darkest and 255 for brightest
     LED_INVERT = False  # True to invert the signal (when using NPN transistor level shift)
     LED_CHANNEL = 0  # set to '1' for GPIOs 13, 19, 41, 45 or 53
-    STRIP_TYPE = ws.WS2811_STRIP_GRB  # set strip type to match the used LED's
+    STRIP_TYPE = ws.WS2811_STRIP_GRB if ws is not None else None  # set strip type to match the used LED's
+    PULSE_RGB = (255, 255, 255)  # flashed on top of the state after a booking
 
     def __init__(self):
         self.strip = self._configure_neopixel()
+        self.frame_buffer = FrameBuffer(self.strip, self.strip.numPixels())
+        self.animation = animation.AnimationEngine(self.frame_buffer)
         self._set_color(255, 0, 0)
         time.sleep(0.5)
         self._set_color(0, 255, 0)
@@ -102,10 +177,18 @@ class NeoPixelLight(object):
 
     def state_changed(self, state):
         name = state.name
-        
+        effect = getattr(state, 'effect', protocol.EFFECT_NONE)
+
         if name == 'rgb':
-            r, g, b = state.rgb
-            self._set_color(r, g, b)
+            if effect == protocol.EFFECT_BREATHING:
+                self.animation.play(animation.Breathing(state.rgb))
+            elif effect == protocol.EFFECT_PROGRESS:
+                self.animation.play(animation.Progress(state.rgb, state.start, state.end))
+            elif effect == protocol.EFFECT_PULSE:
+                self.animation.flash(animation.Pulse(state.rgb))
+            else:
+                r, g, b = state.rgb
+                self._set_color(r, g, b)
         elif name == 'rainbow':
             self._set_rainbow()
         elif name == 'clear':
@@ -115,7 +198,12 @@ class NeoPixelLight(object):
         else:
             logging.warn("unknown state name: {0}".format(name))
 
+        if getattr(state, 'pulse', False):
+            self.animation.flash(animation.Pulse(self.PULSE_RGB))
+
     def _configure_neopixel(self):
+        if Adafruit_NeoPixel is None:
+            raise ImportError("no module named neopixel")
         # Create NeoPixel object with appropriate configuration.
         strip = Adafruit_NeoPixel(self.LED_COUNT, self.LED_PIN, self.LED_FREQ_HZ,
                                        self.LED_DMA, self.LED_INVERT, self.LED_BRIGHTNESS,
@@ -125,25 +213,12 @@ class NeoPixelLight(object):
         return strip
 
     def _set_color(self, r, g, b):
-        for i in range(self.strip.numPixels()):
-            if Color(r, g, b) != self.strip.getPixelColor(i):
-                logging.info("set color to rgb ({0}, {1}, {2})".format(r, g, b))
-                self.strip.setPixelColorRGB(i, r, g, b)
-
-        self.strip.show()
+        logging.info("set color to rgb ({0}, {1}, {2})".format(r, g, b))
+        self.animation.play(animation.Static((r, g, b)))
 
     def _set_rainbow(self):
         logging.info("set color to rainbow")
-        for i in range(self.strip.numPixels()):
-            h = i*360.0/16/360
-            (r,g,b) = colorsys.hsv_to_rgb(h,1,1)
-            r = int(r*255)
-            g = int(g*255)
-            b = int(b*255)
-            if Color(r, g, b) != self.strip.getPixelColor(i):
-                self.strip.setPixelColorRGB(i, r, g, b)
-
-        self.strip.show()
+        self.animation.play(animation.Rainbow())
 
     def _clear(self):
         logging.info("clear neopixel")
@@ -154,13 +229,17 @@ class NeoPixelLight(object):
         logging.info("turn off neopixel")
         # turn color to black / off
         self._set_color(0, 0, 0)
+        logging.info("frames rendered: {0}, skipped: {1}, animation {2}".format(self.frame_buffer.frames_rendered,
+                                                                                self.frame_buffer.frames_skipped,
+                                                                                self.animation.stats))
 
 
 class BacklightMock(object):
     def __init__(self):
-        pass
+        self.state = None
 
     def state_changed(self, state):
+        self.state = state
         name = state.name
         if name == 'rgb':
             r, g, b = state.rgb
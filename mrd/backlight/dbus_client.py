@@ -17,21 +17,138 @@
 
 import gi.repository.GLib
 import logging
+import threading
+import time
 import pydbus
 
 DBUS_SERVICE = "de.methodpark.er.meeting_room_display.Backlight"
 
 
+def bind_backlight_service():
+    try:
+        bus = pydbus.SystemBus()
+        return bus.get(DBUS_SERVICE)
+    except gi.repository.GLib.Error:
+        logging.warning("Failed to retrieve D-BUS service from system bus; falling back to session bus")
+        bus = pydbus.SessionBus()
+        return bus.get(DBUS_SERVICE)
+
+
 class BackLightDbusClient(object):
 
     def __init__(self):
-        try:
-            bus = pydbus.SystemBus()
-            self._obj = bus.get(DBUS_SERVICE)
-        except gi.repository.GLib.Error:
-            logging.warning("Failed to retrieve D-BUS service from system bus; falling back to session bus")
-            bus = pydbus.SessionBus()
-            self._obj = bus.get(DBUS_SERVICE)
+        self._obj = bind_backlight_service()
 
     def publish(self, dumps):
         self._obj.set_state(dumps)
+
+    def close(self, timeout_in_secs=None):
+        pass
+
+
+class AsyncBackLightDbusClient(object):
+    """Call the backlight service from a thread of its own.
+
+    `publish` never blocks, a state still waiting for delivery is replaced
+    by a newer one. If the service is not there or a call fails, the client
+    forgets the service and binds it again with a growing delay, so the LEDs
+    recover when the service is restarted."""
+    CALL_TIMEOUT_IN_SECS = 2
+    MIN_REBIND_DELAY_IN_SECS = 1
+    MAX_REBIND_DELAY_IN_SECS = 60
+
+    def __init__(self, bind=bind_backlight_service, registry=None):
+        self._bind = bind
+        self._registry = registry
+        self._condition = threading.Condition()
+        self._latest = None
+        self._closed = False
+        self._obj = None
+        self._is_available = True
+        self._rebind_delay_in_secs = 0
+        self.delivered_count = 0
+        self.superseded_count = 0
+        self.failure_count = 0
+        self.total_round_trip_in_secs = 0.0
+        self.max_round_trip_in_secs = 0.0
+        self._thread = threading.Thread(target=self._run, name='backlight-dbus')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def is_bound(self):
+        return self._obj is not None
+
+    def publish(self, dumps):
+        with self._condition:
+            if self._latest is not None:
+                self.superseded_count += 1
+            self._latest = dumps
+            self._condition.notify()
+
+    def close(self, timeout_in_secs=None):
+        """Try once more to deliver a state still waiting, e.g. the final 'quit', then stop."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout_in_secs)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._latest is None and not self._closed:
+                    self._condition.wait()
+                if self._latest is None:
+                    return
+                dumps, self._latest = self._latest, None
+                is_closing = self._closed
+
+            if self._deliver(dumps):
+                self._rebind_delay_in_secs = 0
+                continue
+            if is_closing:
+                return
+
+            with self._condition:
+                if self._latest is None:
+                    self._latest = dumps
+                self._rebind_delay_in_secs = min(max(2 * self._rebind_delay_in_secs, self.MIN_REBIND_DELAY_IN_SECS),
+                                                 self.MAX_REBIND_DELAY_IN_SECS)
+                retry_at = time.monotonic() + self._rebind_delay_in_secs
+                while not self._closed and time.monotonic() < retry_at:
+                    self._condition.wait(retry_at - time.monotonic())
+
+    def _deliver(self, dumps):
+        if self._obj is None:
+            try:
+                self._obj = self._bind()
+            except Exception as e:
+                self._failed('unavailable', e)
+                return False
+
+        started_at = time.monotonic()
+        try:
+            self._obj.set_state(dumps, timeout=self.CALL_TIMEOUT_IN_SECS)
+        except Exception as e:
+            self._obj = None
+            self._failed('error', e)
+            return False
+        round_trip = time.monotonic() - started_at
+
+        if not self._is_available:
+            logging.info("Backlight service is available again")
+            self._is_available = True
+        self.delivered_count += 1
+        self.total_round_trip_in_secs += round_trip
+        self.max_round_trip_in_secs = max(self.max_round_trip_in_secs, round_trip)
+        if self._registry is not None:
+            self._registry.backlight_call_duration.observe(round_trip, transport='dbus')
+        return True
+
+    def _failed(self, kind, e):
+        if self._is_available:
+            logging.warning("Backlight service is gone (%s), retrying in the background", e)
+            self._is_available = False
+        self.failure_count += 1
+        if self._registry is not None:
+            self._registry.backlight_call_failures.inc(kind=kind, transport='dbus')
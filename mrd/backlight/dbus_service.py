@@ -17,8 +17,8 @@
 
 import gi.repository.GLib
 import logging
-import pickle
 import pydbus
+from mrd.backlight import protocol
 from mrd.backlight.dbus_client import DBUS_SERVICE
 import mrd.backlight.backlight_wrapper as backlight
 
@@ -36,6 +36,7 @@ class BackLightDbusService(object):
 
     def __init__(self, state_port):
         self.state_port = state_port
+        self._receiver = protocol.Receiver()
         loop = gi.repository.GLib.MainLoop()
         try:
             bus = pydbus.SystemBus()
@@ -47,13 +48,10 @@ class BackLightDbusService(object):
         loop.run()
 
     def set_state(self, msg):
-        event = pickle.loads(bytes(msg))
-        logging.info("new message: {0}".format(event))
-
-        name = event.get('name')
-        rgb = event.get('rgb')
-        state = backlight.LEDState(name, rgb)
-        self.state_port.state_changed(state)
+        state = self._receiver.receive(msg)
+        if state is not None:
+            logging.debug("new message: %s", state)
+            self.state_port.state_changed(state)
 
 
 if __name__ == "__main__":
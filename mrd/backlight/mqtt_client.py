@@ -15,6 +15,10 @@
 # You should have received a copy of the GNU General Public License along with
 # Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
 
+import logging
+import threading
+import time
+
 # https://pypi.org/project/paho-mqtt/
 import paho.mqtt.client as mqtt
 
@@ -26,11 +30,105 @@ PORT     = 1883
 
 
 class BackLightMqttClient(object):
+    """Publish backlight states from paho's network thread.
+
+    `publish` never blocks. While the broker is unreachable only the latest
+    state is kept and sent once paho has reconnected. States are retained, so
+    a restarted backlight service shows the current one right away.
 
-    def __init__(self):
-        self._client = mqtt.Client()
-        self._client.connect(HOST, PORT, 60)
+    :param registry: optional `metrics.Registry` for the time until the broker
+        acknowledged a state and for failures."""
+    MIN_RECONNECT_DELAY_IN_SECS = 1
+    MAX_RECONNECT_DELAY_IN_SECS = 60
+    QOS = 1
+
+    def __init__(self, host=HOST, port=PORT, client=None, registry=None):
         self._url = BASE_URL + TOPIC
+        self._registry = registry
+        # paho may call back from within publish on this thread
+        self._lock = threading.RLock()
+        self._latest = None
+        self._last_info = None
+        self._published_at = {}
+        self._connected = False
+        self.coalesced_count = 0
+        self.failure_count = 0
+
+        self._client = client if client is not None else mqtt.Client()
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.on_publish = self._on_publish
+        self._client.reconnect_delay_set(min_delay=self.MIN_RECONNECT_DELAY_IN_SECS,
+                                         max_delay=self.MAX_RECONNECT_DELAY_IN_SECS)
+        self._client.connect_async(host, port, 60)
+        self._client.loop_start()
+
+    def publish(self, payload):
+        with self._lock:
+            if self._latest is not None:
+                self.coalesced_count += 1
+            self._latest = payload
+            if self._connected:
+                self._flush()
+
+    def close(self, timeout_in_secs=None):
+        """Wait up to `timeout_in_secs` until the broker acknowledged the last state, then disconnect."""
+        deadline = time.monotonic() + timeout_in_secs if timeout_in_secs is not None else None
+        with self._lock:
+            info = self._last_info if self._latest is None else None
+        while info is not None and not info.is_published():
+            if deadline is not None and time.monotonic() >= deadline:
+                logging.warning("The last backlight state was not acknowledged by the MQTT broker")
+                break
+            time.sleep(0.01)
+
+        self._client.disconnect()
+        self._client.loop_stop()
+
+    def _flush(self):
+        # called with the lock held, so states reach paho in order
+        payload, self._latest = self._latest, None
+        if payload is None:
+            return
+
+        published_at = time.monotonic()
+        info = self._client.publish(self._url, payload, qos=self.QOS, retain=True)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            logging.warning("Publishing backlight state failed with rtn code %s, retrying after reconnect", info.rc)
+            self._count_failure('error')
+            self._latest = payload
+            return
+
+        self._last_info = info
+        self._published_at[info.mid] = published_at
+
+    def _on_publish(self, client, userdata, mid):
+        with self._lock:
+            published_at = self._published_at.pop(mid, None)
+        if published_at is not None and self._registry is not None:
+            self._registry.backlight_call_duration.observe(time.monotonic() - published_at, transport='mqtt')
+
+    def _count_failure(self, kind):
+        self.failure_count += 1
+        if self._registry is not None:
+            self._registry.backlight_call_failures.inc(kind=kind, transport='mqtt')
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            logging.warning("Connecting to the MQTT broker failed with rtn code %s", rc)
+            self._count_failure('unavailable')
+            return
+
+        logging.info("Connected to the MQTT broker")
+        with self._lock:
+            self._connected = True
+            self._flush()
 
-    def publish(self, dumps):
-        self._client.publish(self._url, dumps)
+    def _on_disconnect(self, client, userdata, rc):
+        with self._lock:
+            self._connected = False
+            # unacknowledged states are not reported by paho after a reconnect
+            self._published_at.clear()
+        if rc != 0:
+            self._count_failure('unavailable')
+            logging.warning("Lost connection to the MQTT broker (rtn code %s), reconnecting", rc)
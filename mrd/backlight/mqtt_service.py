@@ -16,17 +16,19 @@
 # Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
 
 import logging
-import pickle
+import sys
 # https://pypi.org/project/paho-mqtt/
 import paho.mqtt.client as mqtt
 from mrd.backlight.mqtt_client import BASE_URL, TOPIC, HOST, PORT
 import mrd.backlight.backlight_wrapper as backlight
+from mrd.backlight import protocol
 
 
 class BackLightMqttService(object):
 
     def __init__(self, state_port):
         self.state_port = state_port
+        self._receiver = protocol.Receiver()
         self._url = BASE_URL + TOPIC
         self._server = self._set_up_server()
         self._server.loop_forever()
@@ -51,19 +53,17 @@ class BackLightMqttService(object):
     def on_connect(self, client, userdata, flags, rc):
         logging.info("connected with flags {0} rtn code {1}".format(flags, rc))
         logging.info("subscribe to {0}".format(self._url))
-        self._server.subscribe(self._url)
+        # the retained state is delivered right after subscribing
+        self._server.subscribe(self._url, qos=1)
 
-    def on_disconnect(client, userdata, rc):
+    def on_disconnect(self, client, userdata, rc):
         logging.info("disconnected with rtn code {0}".format(rc))
 
     def on_message(self, client, userdata, msg):
-        event = pickle.loads(msg.payload)
-        logging.info("new message: {0}".format(event))
-
-        name = event.get('name')
-        rgb = event.get('rgb')
-        state = backlight.LEDState(name, rgb)
-        self.state_port.state_changed(state)
+        state = self._receiver.receive(msg.payload)
+        if state is not None:
+            logging.debug("new message: %s", state)
+            self.state_port.state_changed(state)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,134 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Wire format of backlight states, shared by the D-Bus and the MQTT transport.
+
+Every message is a fixed size record in network byte order:
+
+    version (B) | kind (B) | red (B) | green (B) | blue (B) | effect (B) | sequence (I)
+    | effect start (I) | effect end (I)
+
+The effect start and end, in seconds since the epoch, were added with version
+2; version 1 messages are still accepted. They are absolute, so a state that
+is delivered again later, retained by the broker or resent by the socket
+client, still shows the right remaining time. The top bit of the effect byte
+asks for a pulse on top of the state, e.g. after a booking. It travels with
+the state because the transports only keep the latest message. Receivers reject other versions, so the layout can evolve without
+ever unpickling bytes from the bus.
+"""
+
+import logging
+import struct
+
+VERSION = 2
+
+KIND_RGB = 1
+KIND_RAINBOW = 2
+KIND_CLEAR = 3
+KIND_QUIT = 4
+
+EFFECT_NONE = 0
+# slowly fade the color in and out, e.g. while a meeting is about to start
+EFFECT_BREATHING = 1
+# light the share of the strip that corresponds to the remaining duration
+EFFECT_PROGRESS = 2
+# flash once on top of the current state, sent by older displays on its own
+EFFECT_PULSE = 3
+# flag in the effect byte: flash once on top of the state it is sent with
+FLAG_PULSE = 0x80
+
+_KIND_NAMES = {KIND_RGB: 'rgb', KIND_RAINBOW: 'rainbow', KIND_CLEAR: 'clear', KIND_QUIT: 'quit'}
+_KINDS = {name: kind for kind, name in _KIND_NAMES.items()}
+
+_formats = {1: struct.Struct('!BBBBBBI'), 2: struct.Struct('!BBBBBBIII')}
+MESSAGE_SIZE = _formats[VERSION].size
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+class BacklightMessage(object):
+    """Decoded backlight state, usable wherever an `LEDState` is expected."""
+    __slots__ = ('name', 'rgb', 'effect', 'sequence', 'start', 'end', 'pulse')
+
+    def __init__(self, name, rgb=None, effect=EFFECT_NONE, sequence=0, start=0, end=0, pulse=False):
+        self.name = name
+        self.rgb = rgb
+        self.effect = effect
+        self.sequence = sequence
+        self.start = start
+        self.end = end
+        self.pulse = pulse
+
+    def __repr__(self):
+        return 'BacklightMessage({0}, {1}, effect={2}, sequence={3}, start={4}, end={5}, pulse={6})'.format(
+            self.name, self.rgb, self.effect, self.sequence, self.start, self.end, self.pulse)
+
+
+def encode(name, rgb=None, effect=EFFECT_NONE, sequence=0, start=0, end=0, pulse=False):
+    try:
+        kind = _KINDS[name]
+    except KeyError:
+        raise ProtocolError("unknown backlight state {0}".format(name))
+    r, g, b = rgb if rgb is not None else (0, 0, 0)
+    if pulse:
+        effect |= FLAG_PULSE
+    try:
+        return _formats[VERSION].pack(VERSION, kind, r, g, b, effect, sequence & 0xffffffff, int(start), int(end))
+    except struct.error as e:
+        raise ProtocolError("cannot encode backlight state: {0}".format(e))
+
+
+def decode(data):
+    data = bytes(data)
+    version = data[0] if data else None
+    if version not in _formats:
+        raise ProtocolError("unsupported backlight protocol version {0}".format(version))
+    message_format = _formats[version]
+    if len(data) != message_format.size:
+        raise ProtocolError("backlight message of {0} bytes, expected {1}".format(len(data), message_format.size))
+
+    fields = message_format.unpack(data)
+    _, kind, r, g, b, effect, sequence = fields[:7]
+    start, end = fields[7:] if version >= 2 else (0, 0)
+    try:
+        name = _KIND_NAMES[kind]
+    except KeyError:
+        raise ProtocolError("unknown backlight state kind {0}".format(kind))
+    return BacklightMessage(name, (r, g, b) if kind == KIND_RGB else None, effect & ~FLAG_PULSE, sequence, start, end,
+                            bool(effect & FLAG_PULSE))
+
+
+class Receiver(object):
+    """Decodes incoming messages, dropping undecodable ones and redeliveries of the last one."""
+
+    def __init__(self):
+        self._last_sequence = None
+
+    def receive(self, data):
+        """Return the decoded message or None if it is to be ignored."""
+        try:
+            message = decode(data)
+        except ProtocolError as e:
+            logging.warning("Ignoring backlight message: %s", e)
+            return None
+
+        if message.sequence == self._last_sequence:
+            return None
+        self._last_sequence = message.sequence
+        return message
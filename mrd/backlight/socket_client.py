@@ -0,0 +1,82 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+import socket
+import threading
+
+SOCKET_PATH = "/run/mrd-backlight.sock"
+
+
+class BackLightSocketClient(object):
+    """Send backlight states as datagrams to the Unix socket of the backlight service.
+
+    Sending never blocks, a state the socket does not take right away is lost.
+    The latest state is sent again every `RESEND_INTERVAL_IN_SECS`, so a
+    service that was started or restarted after the last change catches up;
+    the service drops these repetitions by their sequence number."""
+    RESEND_INTERVAL_IN_SECS = 10
+
+    def __init__(self, path=SOCKET_PATH):
+        self._path = path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._condition = threading.Condition()
+        self._latest = None
+        self._closed = False
+        self._is_available = True
+        self.sent_count = 0
+        self.failure_count = 0
+        self._thread = threading.Thread(target=self._resend, name='backlight-socket')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def publish(self, dumps):
+        with self._condition:
+            self._latest = dumps
+            self._send(dumps)
+
+    def close(self, timeout_in_secs=None):
+        """Stop resending, states are sent by `publish` itself so none is pending."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout_in_secs)
+        self._socket.close()
+
+    def _send(self, dumps):
+        try:
+            self._socket.sendto(dumps, self._path)
+        except OSError as e:
+            # no service listening (yet) or its queue is full
+            if self._is_available:
+                logging.warning("Backlight service not reachable at %s (%s)", self._path, e)
+                self._is_available = False
+            self.failure_count += 1
+            return
+
+        if not self._is_available:
+            logging.info("Backlight service reachable again at %s", self._path)
+            self._is_available = True
+        self.sent_count += 1
+
+    def _resend(self):
+        with self._condition:
+            while not self._closed:
+                self._condition.wait(self.RESEND_INTERVAL_IN_SECS)
+                if not self._closed and self._latest is not None:
+                    self._send(self._latest)
@@ -0,0 +1,86 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import logging
+import os
+import shutil
+import socket
+from mrd.backlight import protocol
+from mrd.backlight.socket_client import SOCKET_PATH
+import mrd.backlight.backlight_wrapper as backlight
+
+
+class BackLightSocketService(object):
+    """Receive backlight states on a Unix datagram socket, without a bus or broker in between.
+
+    Only the owner and `group` may send states, the display has to run as a member of it."""
+    BUFFER_SIZE = 64
+    SOCKET_MODE = 0o660
+
+    def __init__(self, state_port, path=SOCKET_PATH, group=None):
+        self.state_port = state_port
+        self._receiver = protocol.Receiver()
+        self._path = path
+        self._closed = False
+        if os.path.exists(path):
+            # left over from a previous run
+            os.unlink(path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(path)
+        if group is not None:
+            shutil.chown(path, group=group)
+        os.chmod(path, self.SOCKET_MODE)
+        logging.info("listening on {0}".format(path))
+
+    def run(self):
+        while not self._closed:
+            try:
+                msg = self._socket.recv(self.BUFFER_SIZE)
+            except OSError:
+                if self._closed:
+                    break
+                raise
+            if self._closed:
+                break
+            self.set_state(msg)
+
+    def close(self):
+        self._closed = True
+        # wake up recv
+        self._socket.shutdown(socket.SHUT_RDWR)
+        self._socket.close()
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+    def set_state(self, msg):
+        state = self._receiver.receive(msg)
+        if state is not None:
+            logging.debug("new message: %s", state)
+            self.state_port.state_changed(state)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the backlight on a Unix datagram socket")
+    parser.add_argument("path", nargs='?', default=SOCKET_PATH)
+    parser.add_argument("--group", help="group allowed to send states, the one the display runs in")
+    args = parser.parse_args()
+
+    wrapper = backlight.BacklightWrapper()
+    port = backlight.CompositeLEDPort()
+    port.add_adapter(wrapper)
+    BackLightSocketService(port, args.path, args.group).run()
@@ -17,9 +17,9 @@
 
 import logging
 import paho.mqtt.client as mqtt
-import pickle
 
-from mrd.backlight.backlight import BASE_URL, TOPIC, HOST, PORT
+from mrd.backlight import protocol
+from mrd.backlight.mqtt_client import BASE_URL, TOPIC, HOST, PORT
 
 logging.basicConfig(
     level=logging.INFO,
@@ -30,11 +30,9 @@ client = mqtt.Client()
 client.connect(HOST, PORT, 60)
 url = BASE_URL + TOPIC
 
-event = {'name': 'quit'}
-dumps = pickle.dumps(event)
-logging.info("turn off backlight: {0}".format(event))
+logging.info("turn off backlight")
 
-client.publish(url, dumps)
+client.publish(url, protocol.encode('quit'))
 client.disconnect()
 
 logging.info("exiting script")
@@ -0,0 +1,72 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+import pathlib
+
+from . import rooms
+from . import schedule
+
+
+class DayScheduleCache(object):
+    """Persists the last synchronized `DaySchedule` so it can be shown while offline.
+
+    Appointments are stored as compact rows and the file is only rewritten if
+    the schedule changed, to spare the SD card."""
+    _version = 1
+
+    def __init__(self, path=pathlib.Path() / 'mrd' / 'day_cache.json'):
+        self._path = pathlib.Path(path)
+        self._written = None
+
+    def save(self, day_schedule):
+        state = {
+            'version': self._version,
+            'valid_from': day_schedule.valid_from,
+            'valid_until': day_schedule.valid_until,
+            'appointments': [[a.date_from, a.date_until, a.title, a.num_attendees, a.is_adhoc, a.event_id]
+                             for a in day_schedule],
+        }
+        if state == self._written:
+            return
+
+        tmp_path = self._path.with_suffix('.tmp')
+        with tmp_path.open('w') as cache_file:
+            json.dump(state, cache_file, separators=(',', ':'))
+            cache_file.flush()
+            os.fsync(cache_file.fileno())
+        os.replace(str(tmp_path), str(self._path))
+        self._written = state
+
+    def load(self):
+        """Return the cached `DaySchedule` or None if there is no usable cache."""
+        if not self._path.exists():
+            return None
+
+        try:
+            with self._path.open('r') as cache_file:
+                state = json.load(cache_file)
+            if state['version'] != self._version:
+                return None
+            appointments = [rooms.Appointment(*row) for row in state['appointments']]
+            self._written = state
+            return schedule.DaySchedule(appointments, state['valid_from'], state['valid_until'])
+        except (ValueError, KeyError, TypeError) as e:
+            logging.warning("DayScheduleCache: ignoring corrupt cache file %s (%s)", self._path, e)
+            return None
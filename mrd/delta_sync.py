@@ -0,0 +1,163 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+import pathlib
+
+from . import time_util
+
+
+def to_event_record(graph_event):
+    """Reduce a Graph event resource to the fields the display needs."""
+    organizer = graph_event.get('organizer') or {}
+    return {
+        'id': graph_event['id'],
+        'start': time_util.convert_graph_datetime_to_secs_since_epoch(graph_event['start']['dateTime']),
+        'end': time_util.convert_graph_datetime_to_secs_since_epoch(graph_event['end']['dateTime']),
+        'subject': graph_event.get('subject') or "",
+        'organizer': organizer.get('emailAddress', {}).get('address', ""),
+        'num_attendees': len(graph_event.get('attendees') or []),
+    }
+
+
+class DeltaLinkExpiredError(Exception):
+    pass
+
+
+class CalendarDeltaSync(object):
+    """Keeps a local copy of one day of the calendar up to date via Graph delta queries.
+
+    The first sync of a day pages through the whole calendar view, every later
+    sync only follows the delta link and applies the returned changes. Delta link
+    and events are written to `state_path` so a restart continues incrementally."""
+    _endpoint = '/calendarView/delta'
+    _max_page_size = 50
+
+    def __init__(self, state_path=pathlib.Path() / 'mrd' / 'o365_delta.json'):
+        self._state_path = pathlib.Path(state_path)
+        self._day = None
+        self._delta_link = None
+        self._events = {}
+        self._dirty = False
+        self._load_state()
+
+    @property
+    def events(self):
+        return list(self._events.values())
+
+    def sync(self, calendar, time_in_sec_since_epoch):
+        """Bring the local copy up to date and return the events of the day.
+
+        :param calendar: O365 calendar handle used for url building and requests.
+        :param time_in_sec_since_epoch: any time within the day to synchronize."""
+        day_start, day_end = time_util.get_day_bounds(time_in_sec_since_epoch)
+        if self._day != day_start:
+            logging.info("CalendarDeltaSync: starting full sync for new day")
+            self._reset(day_start)
+
+        try:
+            self._follow(calendar, self._next_url(calendar, day_start, day_end))
+        except DeltaLinkExpiredError:
+            logging.warning("CalendarDeltaSync: delta link expired, starting full sync")
+            self._reset(day_start)
+            self._follow(calendar, self._next_url(calendar, day_start, day_end))
+
+        if self._dirty:
+            # an unchanged calendar still hands out a new delta link, but replaying
+            # an older one is harmless, so the SD card is only written on changes
+            self._save_state()
+
+        return self.events
+
+    def _next_url(self, calendar, day_start, day_end):
+        if self._delta_link is not None:
+            return self._delta_link, None
+
+        params = {
+            'startDateTime': time_util.convert_secs_since_epoch_to_string(day_start),
+            'endDateTime': time_util.convert_secs_since_epoch_to_string(day_end),
+        }
+        return calendar.build_url(self._endpoint), params
+
+    def _follow(self, calendar, url_and_params):
+        url, params = url_and_params
+        headers = {'Prefer': 'odata.maxpagesize={0}'.format(self._max_page_size)}
+
+        while url is not None:
+            data = self._get(calendar, url, params, headers)
+
+            for graph_event in data.get('value', []):
+                self._apply(graph_event)
+
+            params = None
+            url = data.get('@odata.nextLink')
+            if url is None:
+                self._delta_link = data.get('@odata.deltaLink')
+
+    def _get(self, calendar, url, params, headers):
+        try:
+            return calendar.con.get(url, params=params, headers=headers).json()
+        except Exception as e:
+            response = getattr(e, 'response', None)
+            if response is not None and response.status_code == 410:
+                raise DeltaLinkExpiredError()
+            raise
+
+    def _apply(self, graph_event):
+        event_id = graph_event['id']
+        if '@removed' in graph_event:
+            if self._events.pop(event_id, None) is not None:
+                self._dirty = True
+            return
+
+        record = to_event_record(graph_event)
+        if self._events.get(event_id) != record:
+            self._events[event_id] = record
+            self._dirty = True
+
+    def _reset(self, day_start):
+        self._day = day_start
+        self._delta_link = None
+        self._events = {}
+        self._dirty = True
+
+    def _load_state(self):
+        if not self._state_path.exists():
+            return
+
+        try:
+            with self._state_path.open('r') as state_file:
+                state = json.load(state_file)
+            self._day = state['day']
+            self._delta_link = state['delta_link']
+            self._events = {record['id']: record for record in state['events']}
+        except (ValueError, KeyError, TypeError, OSError) as e:
+            # also a well-formed file of the wrong shape, e.g. null or a list
+            logging.warning("CalendarDeltaSync: ignoring corrupt state file %s (%s)", self._state_path, e)
+            self._reset(None)
+
+    def _save_state(self):
+        state = {'day': self._day, 'delta_link': self._delta_link, 'events': self.events}
+        tmp_path = self._state_path.with_suffix('.tmp')
+        with tmp_path.open('w') as state_file:
+            json.dump(state, state_file, separators=(',', ':'))
+            state_file.flush()
+            os.fsync(state_file.fileno())
+        os.replace(str(tmp_path), str(self._state_path))
+        self._dirty = False
@@ -25,6 +25,8 @@ import os.path
 
 from .ui import ui as ui
 from . import app
+from . import day_cache
+from . import mailbox
 from . import rooms
 from . import outlook
 
@@ -32,6 +34,10 @@ from .backlight.backlight import BackLight
 from .mocks import room_mock
 
 from . import network
+from . import polling
+from . import startup
+
+ADAPTER_SHUT_DOWN_TIMEOUT_IN_SECS = 5
 
 
 def read_configuration():
@@ -96,6 +102,14 @@ def determine_network():
         return network.DefaultWifi()
 
 
+def create_backlight(config, registry=None):
+    if config is None:
+        return BackLight(registry)
+
+    return BackLight(registry, config.get('Backlight', 'transport', fallback='dbus'),
+                     config.get('Backlight', 'socket_path', fallback='') or None)
+
+
 def parse_command_line_args():
     parser = argparse.ArgumentParser(description="Run MRD")
     parser.add_argument("--nooutlook", help="Start with mock backend instead of outlook backend", default=False, required=False, action="store_true")
@@ -105,6 +119,7 @@ def parse_command_line_args():
 if __name__ == '__main__':
 
     logging.info("Application starting")
+    startup.log_milestone("application starting")
 
     config = read_configuration()  # None if configuration.ini does not exist
     room_information = read_room_information(config)
@@ -113,24 +128,82 @@ if __name__ == '__main__':
 
     args = parse_command_line_args()
 
+    registry = None
+    if config is not None and config.getboolean('Metrics', 'enabled', fallback=False):
+        from . import metrics
+        registry = metrics.Registry()
+        metrics.MetricsServer(registry, config.get('Metrics', 'host', fallback='127.0.0.1'),
+                              config.getint('Metrics', 'port', fallback=9464)).start()
+
     if config is not None and not args.nooutlook:
         logging.info("Starting with outlook repository, for room %s with id %s", room_information.name, room_information.id)
         logging.info("Allow booking adhoc meetings: %s", room_information.adhoc)
         logging.info("Adhoc meeting password required: %s", room_information.adhoc_ask_for_password)
-        backend = outlook.OutlookRoomRepository(room_information.id, room_information.client_id, room_information.client_secret)
+        sync_mode = config.get('Outlook', 'sync_mode', fallback=outlook.OutlookRoomRepository.SYNC_MODE_QUERY)
+        refresh_interval = config.getint('Outlook', 'refresh_interval_in_secs',
+                                         fallback=outlook.OutlookRoomRepository.DEFAULT_REFRESH_INTERVAL_IN_SECS)
+        lean_fetch = config.getboolean('Outlook', 'lean_fetch', fallback=False)
+        logging.info("Calendar sync mode: %s, refresh interval: %ss, lean fetch: %s", sync_mode, refresh_interval, lean_fetch)
+        graph_url = config.get('Outlook', 'graph_url', fallback='') or None
+        if config.getboolean('Outlook', 'allow_insecure_graph_url', fallback=False):
+            outlook.allow_insecure_transport()
+        from .token_manager import TokenManager
+        tokens = TokenManager()
+        tokens.start()
+        # the repository counts its calendar requests, the app logs the rate
+        poll_rate = polling.PollRateMeter()
+        if config.get('Outlook', 'engine', fallback='threads') == 'asyncio':
+            logging.info("Using the asyncio backend engine")
+            from .async_engine import AsyncEngine, BlockingRoomRepository
+            from .async_outlook import AsyncOutlookRoomRepository
+            engine = AsyncEngine()
+            engine.start()
+            backend = BlockingRoomRepository(
+                AsyncOutlookRoomRepository(room_information.id, room_information.client_id, room_information.client_secret,
+                                           refresh_interval_in_secs=refresh_interval,
+                                           count_attendees=room_information.capacity != "", token_manager=tokens,
+                                           graph_url=graph_url, poll_rate=poll_rate),
+                engine)
+        else:
+            backend = outlook.OutlookRoomRepository(room_information.id, room_information.client_id, room_information.client_secret,
+                                                    sync_mode=sync_mode, refresh_interval_in_secs=refresh_interval,
+                                                    lean_fetch=lean_fetch, count_attendees=room_information.capacity != "",
+                                                    token_manager=tokens, graph_url=graph_url, poll_rate=poll_rate)
+        if registry is not None:
+            registry.add(metrics.Gauge('mrd_token_expiry_seconds', 'Seconds until the access token expires.',
+                                       tokens.seconds_until_expiry))
+            if isinstance(backend, outlook.OutlookRoomRepository):
+                backend.session.add_response_hook(registry.count_response)
+                backend.add_refresh_hook(registry.observe_schedule_refresh)
+            else:
+                backend.repository.add_trace_config(registry.aiohttp_trace_config())
+                backend.repository.add_refresh_hook(registry.observe_schedule_refresh)
+            backend = metrics.InstrumentedRoomRepository(backend, registry)
+        schedule_cache = day_cache.DayScheduleCache()
     else:
         logging.info("Starting with mock repository")
         backend = room_mock.AlternatingOccupation()
+        schedule_cache = None
+        poll_rate = None
 
     event_port = rooms.CompositeEventPort()
 
-    rooms_app = app.MeetingRoomApp(backend, room_information, event_port, network)
+    rooms_app = app.MeetingRoomApp(backend, room_information, event_port, network, polling.PollPolicy.from_config(config),
+                                   schedule_cache, poll_rate)
     rooms_app.setDaemon(True)
 
     ui = ui.KivyUI(rooms_app, translator)
 
-    event_port.add_adapter(ui)
-    event_port.add_adapter(BackLight())
+    # every adapter gets a mailbox of its own, so neither a busy UI nor a hanging
+    # LED service holds up the application, and both report their latencies
+    ui_mailbox = mailbox.AdapterMailbox(ui, 'ui', registry=registry)
+    backlight_mailbox = mailbox.AdapterMailbox(create_backlight(config, registry), 'backlight', registry=registry)
+    event_port.add_adapter(ui_mailbox)
+    event_port.add_adapter(backlight_mailbox)
 
     rooms_app.start()
     ui.start()
+
+    # the UI has stopped and notified `shut_down`, deliver it before the process exits
+    ui_mailbox.close(ADAPTER_SHUT_DOWN_TIMEOUT_IN_SECS)
+    backlight_mailbox.close(ADAPTER_SHUT_DOWN_TIMEOUT_IN_SECS)
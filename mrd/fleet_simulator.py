@@ -0,0 +1,309 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Headless simulation of a building full of meeting room displays.
+
+Runs many `MeetingRoomApp` instances in one process on a virtual clock against
+a shared, seeded calendar, e.g. to plan hub capacity and Graph request quota:
+
+    python3 -m mrd.fleet_simulator --rooms 300 --hours 12 [--output results.json]
+
+The apps are not started as threads, the simulator calls their due tasks in
+order of their deadlines. Besides the meetings known in the morning, meetings
+are booked at short notice during the day and only become visible to the apps
+with their next poll. The repositories cache the day schedule like
+`OutlookRoomRepository` does, only refreshes count as requests. The report
+contains the request rate, the latency from a meeting starting or ending to the
+display showing it, the thread count of a hub running the fleet and the memory
+held per simulated room.
+"""
+
+import argparse
+import datetime
+import heapq
+import json
+import logging
+import random
+import statistics
+import time
+import tracemalloc
+
+from . import app
+from . import network
+from . import polling
+from . import rooms
+from . import schedule
+from . import time_util
+
+# threads of a hub process as started by hub_main: the main thread and the token
+# refresher, plus per room the update loop of its app and its booking worker
+THREADS_PER_PROCESS = 2
+THREADS_PER_ROOM = 2
+DEFAULT_REFRESH_INTERVAL_IN_SECS = 10
+
+
+class VirtualClock(object):
+    def __init__(self, start):
+        self._now = start
+
+    def now(self):
+        return self._now
+
+    def advance_to(self, t):
+        self._now = max(self._now, t)
+
+
+class SimulatedCalendar(object):
+    """Deterministic calendars of all rooms of a building.
+
+    Every meeting has a creation time, the repositories only return meetings
+    that were created at the (virtual) time of the request."""
+    _durations_in_mins = (30, 30, 60, 60, 90)
+
+    def __init__(self, room_ids, clock, seed=0):
+        self._clock = clock
+        self._random = random.Random(seed)
+        self._meetings = {room_id: [] for room_id in room_ids}
+        self._ids = 0
+        self.request_count = 0
+
+    def add_meeting(self, room_id, created_at, date_from, date_until, title="Meeting", is_adhoc=False):
+        self._ids += 1
+        appointment = rooms.Appointment(date_from, date_until, title, 4, is_adhoc, 'event-{0}'.format(self._ids))
+        self._meetings[room_id].append((created_at, appointment))
+        return appointment
+
+    def populate(self, day_start, occupancy=0.4, short_notice_per_room_and_hour=0.1, working_hours=(8, 18)):
+        """Plan the day: meetings known since the evening before plus meetings booked at short notice."""
+        work_start = day_start + working_hours[0] * 3600
+        work_end = day_start + working_hours[1] * 3600
+        for room_id in self._meetings:
+            t = work_start
+            while t < work_end:
+                duration = self._random.choice(self._durations_in_mins) * 60
+                if self._random.random() < occupancy:
+                    self.add_meeting(room_id, day_start - 3600, t, t + duration)
+                t += duration
+
+            created_at = work_start
+            while short_notice_per_room_and_hour > 0:
+                created_at += self._random.expovariate(short_notice_per_room_and_hour) * 3600
+                if created_at >= work_end:
+                    break
+                start = created_at + self._random.randint(5, 30) * 60
+                end = start + self._random.choice(self._durations_in_mins) * 60
+                if not self._is_busy(room_id, start, end):
+                    self.add_meeting(room_id, created_at, start, end, "Short notice")
+
+    def _is_busy(self, room_id, time_from, time_to):
+        return any(a.date_from < time_to and a.date_until > time_from for _, a in self._meetings[room_id])
+
+    def meetings(self, room_id):
+        return [a for _, a in self._meetings[room_id]]
+
+    def day_schedule(self, room_id, time_in_sec_since_epoch):
+        now = self._clock.now()
+        _, midnight = time_util.get_day_bounds(time_in_sec_since_epoch)
+        return schedule.DaySchedule([a for created_at, a in self._meetings[room_id] if created_at <= now],
+                                    time_in_sec_since_epoch, midnight)
+
+    def room(self, room_id, refresh_interval_in_secs=DEFAULT_REFRESH_INTERVAL_IN_SECS):
+        return SimulatedRoomRepository(self, room_id, self._clock, refresh_interval_in_secs)
+
+
+class SimulatedRoomRepository(rooms.RoomRepositoryPort):
+    """Caches the day schedule for `refresh_interval_in_secs` of virtual time, as the
+    Outlook repository does, so only refreshes and bookings count as requests."""
+
+    def __init__(self, calendar, room_id, clock, refresh_interval_in_secs=DEFAULT_REFRESH_INTERVAL_IN_SECS):
+        self._calendar = calendar
+        self._room_id = room_id
+        self._clock = clock
+        self._refresh_interval_in_secs = refresh_interval_in_secs
+        self._schedule = None
+        self._schedule_expires_at = 0
+
+    def fetch_calendar(self):
+        pass
+
+    def get_next_state_changing_appointment_up_to_midnight(self, time_in_sec_since_epoch):
+        return self.get_day_schedule(time_in_sec_since_epoch).next_state_changing(time_in_sec_since_epoch)
+
+    def get_day_schedule(self, time_in_sec_since_epoch):
+        if self._schedule is None \
+                or not self._schedule.covers(time_in_sec_since_epoch) \
+                or self._clock.now() >= self._schedule_expires_at:
+            self._calendar.request_count += 1
+            self._schedule = self._calendar.day_schedule(self._room_id, time_in_sec_since_epoch)
+            self._schedule_expires_at = self._clock.now() + self._refresh_interval_in_secs
+        return self._schedule
+
+    def book_room(self, time_from, time_to):
+        self._calendar.request_count += 1
+        appointment = self._calendar.add_meeting(self._room_id, self._clock.now(), time_from, time_to,
+                                                 app.AD_HOC_BOOKING_TITLE, is_adhoc=True)
+        if self._schedule is not None:
+            self._schedule = self._schedule.with_changes(added=[appointment])
+        return appointment
+
+    def cancel_running_adhoc_meeting(self):
+        return None
+
+
+class RecordingEventPort(rooms.EventPort):
+    """No-UI adapter remembering when which meeting was shown as current."""
+
+    def __init__(self, clock):
+        super(RecordingEventPort, self).__init__()
+        self._clock = clock
+        self.shown = []
+
+    def occupation_changed(self, current_occupation):
+        current = current_occupation.current_event
+        event_id = current.event_id if current is not None else None
+        if not self.shown or self.shown[-1][1] != event_id:
+            self.shown.append((self._clock.now(), event_id))
+
+    def no_network_connection(self):
+        pass
+
+    def incorrect_configuration(self, msg=""):
+        pass
+
+    def render_initial_state(self):
+        pass
+
+    def shut_down(self):
+        pass
+
+
+def transition_latencies(meetings, shown, until):
+    """Return the delays between meetings starting/ending and the display showing it,
+    and the number of transitions the display missed entirely."""
+    day = schedule.DaySchedule(meetings, 0, until)
+    instants = sorted({t for a in meetings for t in (a.date_from, a.date_until) if t < until})
+    latencies = []
+    missed = 0
+    for i, instant in enumerate(instants):
+        current = day.current(instant)
+        expected = current.event_id if current is not None else None
+        next_instant = instants[i + 1] if i + 1 < len(instants) else until
+        shown_before = [event_id for t, event_id in shown if t <= instant]
+        if shown_before and shown_before[-1] == expected:
+            shown_at = instant
+        else:
+            shown_at = next((t for t, event_id in shown if instant < t < next_instant and event_id == expected), None)
+        if shown_at is None:
+            missed += 1
+        else:
+            latencies.append(shown_at - instant)
+    return latencies, missed
+
+
+def _percentile(values, share):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def simulate(num_rooms, hours, start, seed=0, occupancy=0.4, short_notice_per_room_and_hour=0.1,
+             poll_policy=None, refresh_interval_in_secs=DEFAULT_REFRESH_INTERVAL_IN_SECS):
+    clock = VirtualClock(start)
+    room_ids = ['room{0:04d}@example.org'.format(i) for i in range(num_rooms)]
+    calendar = SimulatedCalendar(room_ids, clock, seed)
+    day_start, _ = time_util.get_day_bounds(start)
+    calendar.populate(day_start, occupancy, short_notice_per_room_and_hour)
+
+    tracemalloc.start()
+    always_connected = network.AlwaysConnected()
+    apps = []
+    for room_id in room_ids:
+        event_port = RecordingEventPort(clock)
+        apps.append(app.MeetingRoomApp(calendar.room(room_id, refresh_interval_in_secs), None, event_port,
+                                       always_connected, poll_policy if poll_policy is not None else polling.PollPolicy()))
+
+    end = start + hours * 3600
+    deadlines = [(start, i) for i in range(num_rooms)]
+    heapq.heapify(deadlines)
+    wall_start = time.perf_counter()
+    while deadlines[0][0] < end:
+        deadline, i = heapq.heappop(deadlines)
+        clock.advance_to(deadline)
+        heapq.heappush(deadlines, (apps[i]._run_due_tasks(clock.now()), i))
+    wall_secs = time.perf_counter() - wall_start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = []
+    missed = 0
+    for room_id, room_app in zip(room_ids, apps):
+        meetings = [a for a in calendar.meetings(room_id) if a.date_until > start]
+        room_latencies, room_missed = transition_latencies(meetings, room_app.event_port.shown, end)
+        latencies.extend(room_latencies)
+        missed += room_missed
+
+    return {
+        'rooms': num_rooms,
+        'simulated_hours': hours,
+        'requests': calendar.request_count,
+        'requests_per_hour': calendar.request_count / hours,
+        'requests_per_room_and_hour': calendar.request_count / hours / num_rooms,
+        'transitions': len(latencies) + missed,
+        'transition_latency_median_secs': statistics.median(latencies) if latencies else None,
+        'transition_latency_p95_secs': _percentile(latencies, 0.95),
+        'transition_latency_max_secs': max(latencies) if latencies else None,
+        'missed_transitions': missed,
+        # the apps are not started, so the threads are those a hub would run
+        'threads': THREADS_PER_PROCESS + THREADS_PER_ROOM * num_rooms,
+        'threads_per_room': THREADS_PER_ROOM,
+        'memory_per_room_bytes': memory / num_rooms,
+        'wall_secs': wall_secs,
+    }
+
+
+def _next_working_day_morning():
+    day = datetime.date.today()
+    while day.weekday() >= 5:
+        day += datetime.timedelta(days=1)
+    return time.mktime(datetime.datetime.combine(day, datetime.time(6, 0)).timetuple())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many meeting room displays on a virtual clock")
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--hours", type=float, default=14, help="simulated hours, starting at 06:00")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--occupancy", type=float, default=0.4, help="share of working time booked in advance")
+    parser.add_argument("--short-notice", type=float, default=0.1,
+                        help="meetings booked at short notice per room and hour")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    report = simulate(args.rooms, args.hours, _next_working_day_morning(), args.seed, args.occupancy,
+                      args.short_notice)
+
+    for key, value in report.items():
+        print("{0:<32} {1}".format(key, value))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+import os
+import os.path
+import configparser
+
+from . import app
+from . import network
+from . import outlook
+from . import polling
+from . import rooms
+from . import token_manager
+
+
+def read_configuration():
+    my_path = os.path.abspath(os.path.dirname(__file__))
+    config = configparser.ConfigParser()
+    config.read(os.path.join(my_path, "configuration.default.ini"))
+    config.read(os.path.join(my_path, "configuration.ini"))
+    return config
+
+
+def read_room_ids(config):
+    return [room_id.strip() for room_id in config.get('Hub', 'rooms', fallback='').split(',') if room_id.strip()]
+
+
+def create_room_apps(hub, client_id, client_secret, poll_policy, poll_rate=None):
+    """Create one headless `MeetingRoomApp` per room of the hub, each with its own state.
+
+    The requests of the hub are shared by all rooms, only the first app logs their rate."""
+    room_apps = []
+    for i, room_id in enumerate(hub.room_ids):
+        room_information = rooms.RoomInformation(room_id, room_id, "", "False", "False", "", client_id, client_secret)
+        event_port = rooms.CompositeEventPort([rooms.LoggingEventPort(room_id)])
+        room_app = app.MeetingRoomApp(hub.room(room_id), room_information, event_port, network.AlwaysConnected(),
+                                      poll_policy, poll_rate=poll_rate if i == 0 else None)
+        room_app.setDaemon(True)
+        room_apps.append(room_app)
+
+    return room_apps
+
+
+if __name__ == '__main__':
+
+    logging.info("Room hub starting")
+
+    config = read_configuration()
+    room_ids = read_room_ids(config)
+    if not room_ids:
+        raise SystemExit("No rooms configured in section [Hub]")
+
+    client_id = config.get('RoomInformation', 'client_id')
+    client_secret = config.get('RoomInformation', 'client_secret')
+    refresh_interval = config.getint('Hub', 'refresh_interval_in_secs',
+                                     fallback=outlook.OutlookRoomHub.DEFAULT_REFRESH_INTERVAL_IN_SECS)
+    logging.info("Tracking %d room(s), refresh interval: %ss", len(room_ids), refresh_interval)
+
+    graph_url = config.get('Outlook', 'graph_url', fallback='') or None
+    if config.getboolean('Outlook', 'allow_insecure_graph_url', fallback=False):
+        outlook.allow_insecure_transport()
+
+    tokens = token_manager.TokenManager()
+    tokens.start()
+    poll_rate = polling.PollRateMeter()
+    hub = outlook.OutlookRoomHub(room_ids, client_id, client_secret, refresh_interval_in_secs=refresh_interval,
+                                 token_manager=tokens, graph_url=graph_url, poll_rate=poll_rate)
+    room_apps = create_room_apps(hub, client_id, client_secret, polling.PollPolicy.from_config(config), poll_rate)
+
+    for room_app in room_apps:
+        room_app.start()
+
+    try:
+        for room_app in room_apps:
+            room_app.join()
+    except KeyboardInterrupt:
+        for room_app in room_apps:
+            room_app.on_exit()
@@ -0,0 +1,143 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import collections
+import logging
+import threading
+import time
+
+from . import rooms
+
+
+class AdapterMailbox(rooms.EventPort):
+    """Passes notifications on to one adapter from a worker thread of its own.
+
+    Posting never blocks. Occupations are latest-state-wins: an occupation still
+    waiting is replaced by a newer one, while other notifications are delivered
+    in order. A call taking longer than `slow_call_threshold_in_secs` is reported
+    as slow. It is not interrupted, it only delays later notifications of the
+    same adapter.
+
+    :param registry: optional `metrics.Registry` for delivery latencies and failures."""
+    DEFAULT_SLOW_CALL_THRESHOLD_IN_SECS = 5
+    DEFAULT_CAPACITY = 16
+
+    _occupation = 'occupation_changed'
+
+    def __init__(self, adapter, name, slow_call_threshold_in_secs=DEFAULT_SLOW_CALL_THRESHOLD_IN_SECS,
+                 capacity=DEFAULT_CAPACITY, registry=None):
+        super(AdapterMailbox, self).__init__()
+        self._adapter = adapter
+        self._name = name
+        self._slow_call_threshold_in_secs = slow_call_threshold_in_secs
+        self._capacity = capacity
+        self._registry = registry
+        self._messages = collections.deque()
+        self._condition = threading.Condition()
+        self._is_closed = False
+        self._busy_since = None
+        self.delivered_count = 0
+        self.replaced_count = 0
+        self.dropped_count = 0
+        self.failure_count = 0
+        self.slow_call_count = 0
+        self._thread = threading.Thread(target=self._run, name='AdapterMailbox-' + name, daemon=True)
+        self._thread.start()
+
+    @property
+    def adapter(self):
+        return self._adapter
+
+    @property
+    def is_stuck(self):
+        """True while a call to the adapter takes longer than the slow call threshold."""
+        busy_since = self._busy_since
+        return busy_since is not None and time.monotonic() - busy_since > self._slow_call_threshold_in_secs
+
+    def occupation_changed(self, current_occupation):
+        self._post(self._occupation, current_occupation)
+
+    def no_network_connection(self):
+        self._post('no_network_connection')
+
+    def incorrect_configuration(self, msg=""):
+        self._post('incorrect_configuration', msg)
+
+    def render_initial_state(self):
+        self._post('render_initial_state')
+
+    def shut_down(self):
+        self._post('shut_down')
+
+    def _post(self, method, *args):
+        with self._condition:
+            if self._is_closed:
+                return
+            if method == self._occupation and self._messages and self._messages[-1][0] == self._occupation:
+                self._messages.pop()
+                self.replaced_count += 1
+            elif len(self._messages) >= self._capacity:
+                self._messages.popleft()
+                self.dropped_count += 1
+                self._count_failure('dropped')
+                logging.warning("AdapterMailbox %s: queue full, dropped the oldest notification", self._name)
+            self._messages.append((method, args, time.monotonic()))
+            self._condition.notify()
+
+    def close(self, timeout_in_secs=None):
+        """Deliver the notifications still waiting, then stop the worker."""
+        with self._condition:
+            self._is_closed = True
+            self._condition.notify()
+        self._thread.join(timeout_in_secs)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._messages and not self._is_closed:
+                    self._condition.wait()
+                if not self._messages:
+                    return
+                method, args, posted_at = self._messages.popleft()
+
+            self._deliver(method, args, posted_at)
+
+    def _deliver(self, method, args, posted_at):
+        self._busy_since = time.monotonic()
+        try:
+            getattr(self._adapter, method)(*args)
+        except Exception as e:
+            self.failure_count += 1
+            self._count_failure('error')
+            logging.error("AdapterMailbox %s: %s failed: %s", self._name, method, e)
+        else:
+            self.delivered_count += 1
+        finally:
+            done = time.monotonic()
+            duration = done - self._busy_since
+            self._busy_since = None
+
+        if duration > self._slow_call_threshold_in_secs:
+            self.slow_call_count += 1
+            self._count_failure('slow')
+            logging.warning("AdapterMailbox %s: %s took %.1f s", self._name, method, duration)
+        if self._registry is not None:
+            self._registry.event_delivery_duration.observe(done - posted_at, adapter=self._name)
+
+    def _count_failure(self, kind):
+        if self._registry is not None:
+            self._registry.event_delivery_failures.inc(adapter=self._name, kind=kind)
@@ -0,0 +1,275 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import bisect
+import concurrent.futures
+import http.server
+import logging
+import socket
+import threading
+import time
+
+from . import rooms
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join('{0}="{1}"'.format(k, v) for (k, _), v in zip(labels, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+
+class Counter(object):
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self):
+        lines = ['# HELP {0} {1}'.format(self.name, self.help), '# TYPE {0} counter'.format(self.name)]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append('{0}{1} {2}'.format(self.name, _format_labels(labels), _format_value(value)))
+        return lines
+
+
+class Histogram(object):
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self._buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * len(self._buckets), 0))
+            counts[bisect.bisect_left(self._buckets, value)] += 1
+            self._series[key] = (counts, total + value)
+
+    def count(self, **labels):
+        counts, _ = self._series.get(tuple(sorted(labels.items())), ([], 0))
+        return sum(counts)
+
+    def render(self):
+        lines = ['# HELP {0} {1}'.format(self.name, self.help), '# TYPE {0} histogram'.format(self.name)]
+        with self._lock:
+            for labels, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self._buckets, counts):
+                    cumulative += count
+                    lines.append('{0}_bucket{1} {2}'.format(
+                        self.name, _format_labels(labels + (('le', _format_value(bound)),)), cumulative))
+                lines.append('{0}_sum{1} {2}'.format(self.name, _format_labels(labels), _format_value(total)))
+                lines.append('{0}_count{1} {2}'.format(self.name, _format_labels(labels), cumulative))
+        return lines
+
+
+class Gauge(object):
+    """Gauge whose value is read from `function` on every scrape, skipped if it returns None."""
+    def __init__(self, name, help, function):
+        self.name = name
+        self.help = help
+        self._function = function
+
+    def render(self):
+        value = self._function()
+        if value is None:
+            return []
+        return ['# HELP {0} {1}'.format(self.name, self.help), '# TYPE {0} gauge'.format(self.name),
+                '{0} {1}'.format(self.name, _format_value(value))]
+
+
+class Registry(object):
+    """Holds the metrics of the process and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+        self.backend_call_duration = self.add(Histogram(
+            'mrd_backend_call_duration_seconds',
+            'Duration of room repository calls that reach the calendar service, schedule reads are only '
+            'timed as refresh_day_schedule when they refresh the cached schedule.'))
+        self.backend_call_failures = self.add(Counter(
+            'mrd_backend_call_failures_total', 'Failed room repository calls by kind, error or timeout.'))
+        self.http_bytes = self.add(Counter(
+            'mrd_http_bytes_total', 'Bytes of HTTP bodies exchanged with the calendar service.'))
+        self.http_request_duration = self.add(Histogram(
+            'mrd_http_request_duration_seconds', 'Time until the calendar service answered an HTTP request.'))
+        self.event_delivery_duration = self.add(Histogram(
+            'mrd_event_delivery_seconds', 'Time from posting a notification to an adapter until it was handled.'))
+        self.event_delivery_failures = self.add(Counter(
+            'mrd_event_delivery_failures_total', 'Notifications an adapter failed on, was slow on or never got.'))
+        self.backlight_call_duration = self.add(Histogram(
+            'mrd_backlight_call_duration_seconds',
+            'Round trip of a state to the backlight service by transport, the D-Bus call or the MQTT acknowledgement.',
+            buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2)))
+        self.backlight_call_failures = self.add(Counter(
+            'mrd_backlight_call_failures_total',
+            'States the backlight service did not get by transport and kind, error or unavailable.'))
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def observe_schedule_refresh(self, duration_in_secs):
+        """Refresh hook of the room repositories, times the schedule reads that reached the calendar service."""
+        self.backend_call_duration.observe(duration_in_secs, call='refresh_day_schedule')
+
+    def count_response(self, response, *args, **kwargs):
+        """`requests` response hook counting the bytes of request and response bodies
+        and timing the request up to the response headers."""
+        method = response.request.method if response.request is not None else None
+        if response.elapsed is not None:
+            self.http_request_duration.observe(response.elapsed.total_seconds(), method=method)
+        body = response.request.body if response.request is not None else None
+        if body:
+            self.http_bytes.inc(len(body), direction='sent')
+        self.http_bytes.inc(len(response.content or b''), direction='received')
+
+    def aiohttp_trace_config(self):
+        """Return an `aiohttp.TraceConfig` counting the bytes of request and response bodies
+        and timing the request up to the response headers."""
+        import aiohttp
+
+        async def on_request_start(session, context, params):
+            context.started_at = time.monotonic()
+
+        async def on_request_end(session, context, params):
+            self.http_request_duration.observe(time.monotonic() - context.started_at, method=params.method)
+
+        async def on_request_chunk_sent(session, context, params):
+            self.http_bytes.inc(len(params.chunk), direction='sent')
+
+        async def on_response_chunk_received(session, context, params):
+            self.http_bytes.inc(len(params.chunk), direction='received')
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
+        trace_config.on_response_chunk_received.append(on_response_chunk_received)
+        return trace_config
+
+
+def is_timeout(error):
+    if isinstance(error, (TimeoutError, socket.timeout, concurrent.futures.TimeoutError)):
+        return True
+    # e.g. requests.exceptions.Timeout, which is no subclass of TimeoutError
+    return 'Timeout' in type(error).__name__
+
+
+class InstrumentedRoomRepository(rooms.RoomRepositoryPort):
+    """Records errors and timeouts of every call to the wrapped repository and the
+    duration of the calls that always reach the calendar service.
+
+    Schedule reads are mostly answered from the cache of the repository, their
+    refreshes are timed by `Registry.observe_schedule_refresh` instead."""
+
+    def __init__(self, repository, registry):
+        self._repository = repository
+        self._registry = registry
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._repository, name)
+
+    def _call(self, name, *args, is_timed=True):
+        start = time.monotonic()
+        try:
+            return getattr(self._repository, name)(*args)
+        except Exception as e:
+            self._registry.backend_call_failures.inc(call=name, kind='timeout' if is_timeout(e) else 'error')
+            raise
+        finally:
+            if is_timed:
+                self._registry.backend_call_duration.observe(time.monotonic() - start, call=name)
+
+    def fetch_calendar(self):
+        return self._call('fetch_calendar')
+
+    def get_next_state_changing_appointment_up_to_midnight(self, time_in_sec_since_epoch):
+        return self._call('get_next_state_changing_appointment_up_to_midnight', time_in_sec_since_epoch,
+                          is_timed=False)
+
+    def book_room(self, time_from, time_to):
+        return self._call('book_room', time_from, time_to)
+
+    def cancel_running_adhoc_meeting(self):
+        return self._call('cancel_running_adhoc_meeting')
+
+    def get_day_schedule(self, time_in_sec_since_epoch):
+        return self._call('get_day_schedule', time_in_sec_since_epoch, is_timed=False)
+
+
+class MetricsServer(object):
+    """Serves the registry on http://host:port/metrics from a background thread."""
+
+    def __init__(self, registry, host='127.0.0.1', port=9464):
+        self._registry = registry
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path != '/metrics':
+                    handler.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name='MetricsServer', daemon=True)
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        logging.info("MetricsServer: serving metrics on port %d", self.port)
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -18,8 +18,8 @@
 import paho.mqtt.client as mqtt
 import time
 import logging
-import pickle
-from mrd.backlight.backlight import BASE_URL, TOPIC
+from mrd.backlight import protocol
+from mrd.backlight.mqtt_client import BASE_URL, TOPIC
 
 URL = BASE_URL + TOPIC
 
@@ -45,28 +45,20 @@ class AlternatingBackLightClient(object):
 
 
     def set_free(self):
-        event = {'name': 'rgb', 'rgb': (0, 255, 0)}
-        dumps = pickle.dumps(event)
-        logging.info("set backlight to green: {0}".format(event))
-        self._client.publish(URL, dumps)
+        logging.info("set backlight to green")
+        self._client.publish(URL, protocol.encode('rgb', (0, 255, 0)))
 
     def set_occupied(self):
-        event = {'name': 'rgb', 'rgb': (255, 0, 0)}
-        dumps = pickle.dumps(event)
-        logging.info("set backlight to red: {0}".format(event))
-        self._client.publish(URL, dumps)
+        logging.info("set backlight to red")
+        self._client.publish(URL, protocol.encode('rgb', (255, 0, 0)))
 
     def turn_off_backlight(self):
-        event = {'name': 'clear'}
-        dumps = pickle.dumps(event)
-        logging.info("turn off backlight: {0}".format(event))
-        self._client.publish(URL, dumps)
+        logging.info("turn off backlight")
+        self._client.publish(URL, protocol.encode('clear'))
 
     def shut_down(self):
-        event = {'name': 'quit'}
-        dumps = pickle.dumps(event)
-        logging.info("shut down backlight: {0}".format(event))
-        self._client.publish(URL, dumps)
+        logging.info("shut down backlight")
+        self._client.publish(URL, protocol.encode('quit'))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,89 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import mrd.time_util as datetime
+
+BODY = "<html><head><meta http-equiv=\"Content-Type\" content=\"text/html; charset=utf-8\"></head><body>" \
+       + "<p>Agenda item with some details for the meeting.</p>" * 20 + "</body></html>"
+
+
+def graph_datetime(time_in_sec_since_epoch):
+    return {'dateTime': datetime.convert_secs_since_epoch_to_string(time_in_sec_since_epoch)[:-1] + '.0000000',
+            'timeZone': 'UTC'}
+
+
+def make_attendee(i):
+    address = "attendee{0}@example.org".format(i)
+    return {'type': 'required',
+            'status': {'response': 'accepted', 'time': '2019-04-24T08:00:00Z'},
+            'emailAddress': {'name': "Attendee {0}".format(i), 'address': address}}
+
+
+def make_event(id, date_from, date_until, subject="Mock Appointment", organizer="organizer@example.org", num_attendees=5):
+    """Return a Graph event resource shaped like a full, unselected calendarView response item."""
+    return {
+        '@odata.etag': 'W/"DwAAABYAAAB{0}"'.format(id),
+        'id': id,
+        'createdDateTime': '2019-04-20T08:00:00.0000000Z',
+        'lastModifiedDateTime': '2019-04-20T08:00:00.0000000Z',
+        'changeKey': 'DwAAABYAAAB{0}'.format(id),
+        'categories': [],
+        'originalStartTimeZone': 'W. Europe Standard Time',
+        'originalEndTimeZone': 'W. Europe Standard Time',
+        'iCalUId': '040000008200E00074C5B7101A82E008{0}'.format(id),
+        'reminderMinutesBeforeStart': 15,
+        'isReminderOn': True,
+        'hasAttachments': False,
+        'subject': subject,
+        'bodyPreview': 'Agenda item with some details for the meeting.',
+        'importance': 'normal',
+        'sensitivity': 'normal',
+        'isAllDay': False,
+        'isCancelled': False,
+        'isOrganizer': False,
+        'responseRequested': True,
+        'seriesMasterId': None,
+        'showAs': 'busy',
+        'type': 'singleInstance',
+        'webLink': 'https://outlook.office365.com/owa/?itemid={0}&exvsurl=1&path=/calendar/item'.format(id),
+        'onlineMeetingUrl': None,
+        'responseStatus': {'response': 'accepted', 'time': '2019-04-20T08:00:00Z'},
+        'body': {'contentType': 'html', 'content': BODY},
+        'start': graph_datetime(date_from),
+        'end': graph_datetime(date_until),
+        'location': {'displayName': 'Room 1337', 'locationType': 'default', 'uniqueIdType': 'unknown'},
+        'locations': [{'displayName': 'Room 1337', 'locationType': 'default', 'uniqueIdType': 'unknown'}],
+        'recurrence': None,
+        'attendees': [make_attendee(i) for i in range(num_attendees)],
+        'organizer': {'emailAddress': {'name': 'Organizer', 'address': organizer}},
+    }
+
+
+def make_day(day_start, num_events, num_attendees=5, duration_in_secs=30 * 60):
+    """Return `num_events` back-to-back events spread over the given day.
+
+    Events are shortened if that many do not fit into the day otherwise."""
+    step = (24 * 60 * 60 - 1) // max(num_events, 1)
+    duration_in_secs = min(duration_in_secs, step)
+    return [make_event(str(i), day_start + i * step, day_start + i * step + duration_in_secs,
+                       subject="Meeting {0}".format(i), num_attendees=num_attendees)
+            for i in range(num_events)]
+
+
+def select(event, fields):
+    """Project a Graph event to the given comma separated `$select` fields."""
+    return {k: v for k, v in event.items() if k in fields.split(',') or k.startswith('@odata')}
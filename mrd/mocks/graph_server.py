@@ -0,0 +1,422 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Local stand-in for the Microsoft Graph endpoints used by the Outlook repositories.
+
+Serves the default calendar, calendarView (plus delta), event create, patch and
+delete, `$batch` and a token endpoint from memory. Latency, errors and 429
+throttling can be injected to benchmark and soak-test the backend offline:
+
+    python -m mrd.mocks.graph_server --port 8000 --events 25 --latency 0.2 --throttle-rate 0.05
+
+and point `graph_url` in the [Outlook] section to http://127.0.0.1:8000/, with
+`allow_insecure_graph_url` set to True.
+"""
+
+import argparse
+import datetime
+import http.server
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import urllib.parse
+import zoneinfo
+
+from . import graph_payloads
+from .. import time_util
+
+API_PREFIX = '/v1.0'
+DEFAULT_MAILBOX = 'me'
+
+
+def to_secs(graph_datetime):
+    """Convert a Graph `dateTimeTimeZone` in any IANA or Windows time zone to seconds since epoch."""
+    zone_name = graph_datetime.get('timeZone') or 'UTC'
+    naive = datetime.datetime.strptime(graph_datetime['dateTime'][:19], '%Y-%m-%dT%H:%M:%S')
+    try:
+        zone = zoneinfo.ZoneInfo(zone_name)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        from O365.utils.windows_tz import get_iana_tz
+        zone = zoneinfo.ZoneInfo(get_iana_tz(zone_name))
+    return naive.replace(tzinfo=zone).timestamp()
+
+
+def to_secs_from_iso(value):
+    """Convert an ISO 8601 string such as '2019-04-25T13:14:15Z' or with offset, UTC if none is given."""
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+class GraphError(Exception):
+    def __init__(self, status, code, message, headers=None):
+        super(GraphError, self).__init__(message)
+        self.status = status
+        self.code = code
+        self.headers = headers or {}
+
+    def body(self):
+        return {'error': {'code': self.code, 'message': str(self)}}
+
+
+class GraphStandIn(object):
+    """In-memory Graph server, all fault settings may be changed while it runs.
+
+    :param latency_in_secs: delay added to every HTTP request.
+    :param latency_jitter_in_secs: upper bound of a random delay added on top.
+    :param error_rate: share of requests failing with 503.
+    :param throttle_rate: share of requests rejected with 429 and `Retry-After`.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency_in_secs=0.0, latency_jitter_in_secs=0.0, error_rate=0.0,
+                 throttle_rate=0.0, retry_after_in_secs=1, token_lifetime_in_secs=3600, seed=None,
+                 me_address='room@example.org'):
+        self.me_address = me_address
+        self.latency_in_secs = latency_in_secs
+        self.latency_jitter_in_secs = latency_jitter_in_secs
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after_in_secs = retry_after_in_secs
+        self.token_lifetime_in_secs = token_lifetime_in_secs
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._mailboxes = {}
+        self._ids = itertools.count(1)
+        self._change_seq = 0
+        self._changes = []
+        self._delta_windows = {}
+        self._request_count = 0
+        self._throttled_count = 0
+        self._failed_count = 0
+        self._server = http.server.ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='GraphStandIn', daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{0}:{1}/'.format(host, port)
+
+    @property
+    def service_url(self):
+        return self.url + API_PREFIX.lstrip('/') + '/'
+
+    @property
+    def token_url(self):
+        return self.url + 'token'
+
+    @property
+    def request_count(self):
+        return self._request_count
+
+    @property
+    def throttled_count(self):
+        return self._throttled_count
+
+    @property
+    def failed_count(self):
+        return self._failed_count
+
+    def start(self):
+        self._thread.start()
+        logging.info("GraphStandIn: serving on %s", self.url)
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def issue_token(self, scopes=('offline_access',)):
+        """Return a fresh token in the format O365 stores in its token file."""
+        now = time.time()
+        return {'token_type': 'Bearer', 'scope': list(scopes), 'expires_in': self.token_lifetime_in_secs,
+                'ext_expires_in': self.token_lifetime_in_secs, 'expires_at': now + self.token_lifetime_in_secs,
+                'access_token': 'stand-in-access-{0}'.format(next(self._ids)),
+                'refresh_token': 'stand-in-refresh-{0}'.format(next(self._ids))}
+
+    def write_token(self, path):
+        tmp_path = str(path) + '.tmp'
+        with open(tmp_path, 'w') as token_file:
+            json.dump(self.issue_token(), token_file)
+        os.replace(tmp_path, str(path))
+
+    def add_event(self, date_from, date_until, subject="Mock Appointment", mailbox=DEFAULT_MAILBOX,
+                  organizer="organizer@example.org", num_attendees=5):
+        """Add an event to the calendar of `mailbox` and return its Graph resource."""
+        with self._lock:
+            event = graph_payloads.make_event('AAMk{0}'.format(next(self._ids)), date_from, date_until,
+                                              subject=subject, organizer=organizer, num_attendees=num_attendees)
+            self._store(mailbox, event)
+            return event
+
+    def seed_day(self, time_in_sec_since_epoch, num_events, num_attendees=5, mailbox=DEFAULT_MAILBOX):
+        """Fill the day containing the given time with `num_events` evenly spread events."""
+        day_start, _ = time_util.get_day_bounds(time_in_sec_since_epoch)
+        with self._lock:
+            for event in graph_payloads.make_day(day_start, num_events, num_attendees):
+                event['id'] = 'AAMk{0}'.format(next(self._ids))
+                self._store(mailbox, event)
+
+    def events(self, mailbox=DEFAULT_MAILBOX):
+        with self._lock:
+            return list(self._mailbox(mailbox).values())
+
+    def _mailbox(self, mailbox):
+        return self._mailboxes.setdefault(mailbox.lower(), {})
+
+    def _store(self, mailbox, event):
+        self._mailbox(mailbox)[event['id']] = event
+        self._record_change(mailbox, event['id'])
+
+    def _record_change(self, mailbox, event_id):
+        self._change_seq += 1
+        self._changes.append((self._change_seq, mailbox.lower(), event_id))
+
+    # request handling
+
+    def _handler_class(self):
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _handle(handler):
+                length = int(handler.headers.get('Content-Length') or 0)
+                body = handler.rfile.read(length) if length else b''
+                status, headers, payload = stand_in._serve(handler.command, handler.path, handler.headers, body)
+                data = b'' if payload is None else (payload if isinstance(payload, bytes)
+                                                    else json.dumps(payload).encode('utf-8'))
+                handler.send_response(status)
+                for name, value in headers.items():
+                    handler.send_header(name, value)
+                if payload is not None:
+                    handler.send_header('Content-Type', 'application/json')
+                handler.send_header('Content-Length', str(len(data)))
+                handler.end_headers()
+                handler.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _handle
+
+            def log_message(handler, format, *args):
+                logging.debug("GraphStandIn: " + format, *args)
+
+        return Handler
+
+    def _serve(self, method, path, headers, body):
+        with self._lock:
+            self._request_count += 1
+        delay = self.latency_in_secs + self._random.uniform(0, self.latency_jitter_in_secs)
+        if delay > 0:
+            time.sleep(delay)
+
+        try:
+            url = urllib.parse.urlsplit(path)
+            if url.path == '/token':
+                return 200, {}, self._refresh_token(urllib.parse.parse_qs(body.decode('utf-8')))
+
+            self._inject_faults()
+            if not (headers.get('Authorization') or '').startswith('Bearer '):
+                raise GraphError(401, 'InvalidAuthenticationToken', 'Access token is empty.')
+            if not url.path.startswith(API_PREFIX + '/'):
+                raise GraphError(404, 'ResourceNotFound', 'Unknown API version.')
+            data = json.loads(body.decode('utf-8')) if body else None
+            query = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+            status, payload = self._route(method, url.path[len(API_PREFIX):], query, data)
+            return status, {}, payload
+        except GraphError as e:
+            return e.status, e.headers, e.body()
+
+    def _inject_faults(self):
+        with self._lock:
+            roll = self._random.random()
+            if roll < self.throttle_rate:
+                self._throttled_count += 1
+                raise GraphError(429, 'TooManyRequests', 'Application is over its MailboxConcurrency limit.',
+                                 {'Retry-After': str(self.retry_after_in_secs)})
+            if roll < self.throttle_rate + self.error_rate:
+                self._failed_count += 1
+                raise GraphError(503, 'ServiceNotAvailable', 'Injected failure.')
+
+    def _refresh_token(self, form):
+        scopes = form.get('scope', ['offline_access'])[-1].split()
+        return self.issue_token(scopes)
+
+    _mailbox_pattern = re.compile(r'^/(?:me|users/(?P<user>[^/]+))(?P<rest>/.*)?$')
+    _calendar_pattern = re.compile(r'^(?:/calendar|/calendars/[^/]+)(?P<rest>/.*)?$')
+
+    def _route(self, method, path, query, data):
+        if path == '/$batch' and method == 'POST':
+            return 200, self._batch(data)
+
+        match = self._mailbox_pattern.match(path)
+        if match is None:
+            raise GraphError(400, 'BadRequest', 'Unsupported resource {0}'.format(path))
+        mailbox = urllib.parse.unquote(match.group('user')) if match.group('user') else DEFAULT_MAILBOX
+        rest = match.group('rest') or ''
+
+        if rest == '/calendar' and method == 'GET':
+            owner = self.me_address if mailbox == DEFAULT_MAILBOX else mailbox
+            return 200, {'id': 'calendar-' + mailbox, 'name': 'Calendar', 'color': 'auto', 'canEdit': True,
+                         'canShare': True, 'canViewPrivateItems': True, 'owner': {'name': owner, 'address': owner}}
+
+        calendar = self._calendar_pattern.match(rest)
+        if calendar is not None:
+            rest = calendar.group('rest') or ''
+
+        with self._lock:
+            if rest == '/calendarView' and method == 'GET':
+                return 200, self._calendar_view(mailbox, query)
+            if rest == '/calendarView/delta' and method == 'GET':
+                return 200, self._delta(mailbox, query)
+            if rest == '/events' and method == 'POST':
+                return 201, self._create_event(mailbox, data)
+            if rest.startswith('/events/'):
+                event_id = urllib.parse.unquote(rest[len('/events/'):])
+                return self._event(mailbox, method, event_id, data)
+
+        raise GraphError(400, 'BadRequest', 'Unsupported request {0} {1}'.format(method, path))
+
+    def _window(self, query):
+        try:
+            return to_secs_from_iso(query['startDateTime']), to_secs_from_iso(query['endDateTime'])
+        except (KeyError, ValueError):
+            raise GraphError(400, 'ErrorInvalidParameter', 'startDateTime and endDateTime are required.')
+
+    def _in_window(self, event, start, end):
+        return to_secs(event['start']) < end and to_secs(event['end']) > start
+
+    def _calendar_view(self, mailbox, query):
+        start, end = self._window(query)
+        events = sorted((e for e in self._mailbox(mailbox).values() if self._in_window(e, start, end)),
+                        key=lambda e: to_secs(e['start']))
+        top, skip = int(query.get('$top', 10)), int(query.get('$skip', 0))
+        page = events[skip:skip + top]
+        if '$select' in query:
+            page = [graph_payloads.select(e, 'id,' + query['$select']) for e in page]
+        result = {'value': page}
+        if skip + top < len(events):
+            next_query = dict(query, **{'$skip': str(skip + top)})
+            result['@odata.nextLink'] = '{0}{1}/calendarView?{2}'.format(
+                self.service_url, 'me' if mailbox == DEFAULT_MAILBOX else 'users/' + urllib.parse.quote(mailbox),
+                urllib.parse.urlencode(next_query))
+        return result
+
+    def _delta(self, mailbox, query):
+        token = query.get('$deltatoken')
+        if token is None:
+            window = self._window(query)
+            value = [e for e in self._mailbox(mailbox).values() if self._in_window(e, *window)]
+        elif token in self._delta_windows:
+            window, since = self._delta_windows.pop(token)
+            changed = {event_id for seq, box, event_id in self._changes if seq > since and box == mailbox.lower()}
+            value = []
+            for event_id in sorted(changed):
+                event = self._mailbox(mailbox).get(event_id)
+                if event is not None and self._in_window(event, *window):
+                    value.append(event)
+                else:
+                    value.append({'id': event_id, '@removed': {'reason': 'deleted'}})
+        else:
+            raise GraphError(410, 'SyncStateNotFound', 'The sync state was not found or expired.')
+
+        token = str(next(self._ids))
+        self._delta_windows[token] = (window, self._change_seq)
+        delta_link = '{0}{1}/calendarView/delta?{2}'.format(
+            self.service_url, 'me' if mailbox == DEFAULT_MAILBOX else 'users/' + urllib.parse.quote(mailbox),
+            urllib.parse.urlencode({'$deltatoken': token}))
+        return {'value': value, '@odata.deltaLink': delta_link}
+
+    def _create_event(self, mailbox, data):
+        if not data or 'start' not in data or 'end' not in data:
+            raise GraphError(400, 'ErrorInvalidRequest', 'start and end are required.')
+        organizer = self.me_address if mailbox == DEFAULT_MAILBOX else mailbox
+        event = graph_payloads.make_event('AAMk{0}'.format(next(self._ids)), to_secs(data['start']),
+                                          to_secs(data['end']), subject=data.get('subject') or "",
+                                          organizer=organizer, num_attendees=0)
+        event['attendees'] = data.get('attendees') or []
+        event['isOrganizer'] = True
+        self._store(mailbox, event)
+        return event
+
+    def _event(self, mailbox, method, event_id, data):
+        events = self._mailbox(mailbox)
+        if event_id not in events:
+            raise GraphError(404, 'ErrorItemNotFound', 'The specified object was not found in the store.')
+
+        if method == 'GET':
+            return 200, events[event_id]
+        if method == 'DELETE':
+            del events[event_id]
+            self._record_change(mailbox, event_id)
+            return 204, None
+        if method == 'PATCH':
+            event = events[event_id]
+            for field in ('start', 'end'):
+                if field in (data or {}):
+                    event[field] = graph_payloads.graph_datetime(to_secs(data[field]))
+            if 'subject' in (data or {}):
+                event['subject'] = data['subject']
+            self._record_change(mailbox, event_id)
+            return 200, event
+        raise GraphError(405, 'ErrorInvalidRequest', 'Unsupported method {0}'.format(method))
+
+    def _batch(self, data):
+        responses = []
+        for request in (data or {}).get('requests', []):
+            url = urllib.parse.urlsplit(request['url'])
+            query = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+            try:
+                self._inject_faults()
+                status, body = self._route(request['method'], url.path, query, request.get('body'))
+                responses.append({'id': request['id'], 'status': status, 'headers': {}, 'body': body})
+            except GraphError as e:
+                responses.append({'id': request['id'], 'status': e.status, 'headers': e.headers, 'body': e.body()})
+        return {'responses': responses}
+
+
+def parse_command_line_args():
+    parser = argparse.ArgumentParser(description="Serve a local Microsoft Graph stand-in")
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--events", type=int, default=10, help="events seeded into today's calendar")
+    parser.add_argument("--attendees", type=int, default=5, help="attendees per seeded event")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="upper bound of random extra latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests failing with 429")
+    parser.add_argument("--token", help="write a token file accepted by the stand-in to this path")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    args = parse_command_line_args()
+    stand_in = GraphStandIn(args.host, args.port, args.latency, args.jitter, args.error_rate, args.throttle_rate)
+    stand_in.seed_day(time.time(), args.events, args.attendees)
+    if args.token:
+        stand_in.write_token(args.token)
+    stand_in.start()
+    try:
+        stand_in._thread.join()
+    except KeyboardInterrupt:
+        stand_in.stop()
@@ -19,7 +19,7 @@ import calendar
 import mrd.rooms as rooms
 import time
 
-from O365 import Calendar
+from O365.calendar import Calendar
 
 class OutlookRoomRepositoryMock(rooms.RoomRepositoryPort):
     _seconds_per_hour = 60*60
@@ -15,12 +15,16 @@
 # You should have received a copy of the GNU General Public License along with
 # Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
 
-import datetime
 import logging
+import os
 import pathlib
+import threading
 import time
+import urllib.parse
 
+from . import delta_sync
 from . import rooms
+from . import schedule
 from . import time_util
 
 
@@ -31,7 +35,48 @@ def to_appointment(event, is_adhoc=False):
         num_attendees = len(event.attendees) if not is_adhoc else 0
         return rooms.Appointment(time_util.convert_datetime_to_secs_since_epoch(event.start),
                                  time_util.convert_datetime_to_secs_since_epoch(event.end),
-                                 event.subject, num_attendees, is_adhoc)
+                                 event.subject, num_attendees, is_adhoc, event.object_id)
+
+
+def record_to_appointment(record, is_adhoc=False):
+    if record is None:
+        return record
+    else:
+        num_attendees = record['num_attendees'] if not is_adhoc else 0
+        return rooms.Appointment(record['start'], record['end'], record['subject'], num_attendees, is_adhoc,
+                                 record['id'])
+
+
+def end_appointment(appointment, time_in_sec_since_epoch):
+    """Return `appointment` ending at the given time, or None if it should rather be
+    deleted because it took no more than a minute."""
+    if time_in_sec_since_epoch - appointment.date_from <= 60:
+        return None
+    return rooms.Appointment(appointment.date_from, time_in_sec_since_epoch, appointment.title,
+                             appointment.num_attendees, appointment.is_adhoc, appointment.event_id)
+
+
+def to_graph_datetime(time_in_sec_since_epoch):
+    return {'dateTime': time_util.convert_secs_since_epoch_to_string(time_in_sec_since_epoch)[:-1], 'timeZone': 'UTC'}
+
+
+INSECURE_TRANSPORT_VARIABLE = 'OAUTHLIB_INSECURE_TRANSPORT'
+
+
+def allow_insecure_transport():
+    """Let oauthlib send tokens over plain http for the whole process, only meant for a local Graph stand-in."""
+    logging.warning("Allowing OAuth over unencrypted http, do not use with the real Graph API")
+    os.environ[INSECURE_TRANSPORT_VARIABLE] = '1'
+
+
+def load_o365(use_mock=False):
+    """Import the O365 classes used by `OutlookSession` into this module."""
+    global Account, FileSystemTokenBackend, MSGraphProtocol
+    if use_mock:
+        logging.warning("mock behavior not implemented yet, using O365 library anyway")
+        # from mrd.mocks.event_mock import AccountMock as Account
+        # from mrd.mocks.event_mock import EventMock as Event
+    from O365 import Account, FileSystemTokenBackend, MSGraphProtocol
 
 
 class MissingPasswordForRoomIdError(Exception):
@@ -53,60 +98,268 @@ class AuthenticationFailureError(Exception):
         self.message = message
 
 
+class OutlookSession(object):
+    """Long-lived O365 account and calendar handle.
+
+    Building an `Account` reads the token file and resolving the calendar costs
+    a round trip to Graph, so both are kept until the token or the calendar
+    handle turns out to be invalid."""
+    _token_path = pathlib.Path() / 'mrd'
+    _token_filename = 'o365_token.txt'
+    _invalidating_status_codes = (401, 403, 404)
+
+    def __init__(self, credentials, scopes, calendar_name=None, token_manager=None, graph_url=None):
+        self._credentials = credentials
+        self._graph_url = graph_url
+        self._scopes = scopes
+        self._calendar_name = calendar_name
+        self._token_manager = token_manager
+        self._lock = threading.RLock()
+        self._account = None
+        self._calendar = None
+        self._rebuild_count = 0
+        self._response_hooks = []
+
+    @property
+    def rebuild_count(self):
+        """Number of times account and calendar had to be (re)built."""
+        return self._rebuild_count
+
+    @property
+    def account(self):
+        with self._lock:
+            self._ensure_valid()
+            return self._account
+
+    def get_calendar(self):
+        with self._lock:
+            self._ensure_valid()
+            return self._calendar
+
+    def add_response_hook(self, hook):
+        """Register a `requests` response hook for all Graph requests, also after rebuilds."""
+        with self._lock:
+            self._response_hooks.append(hook)
+            if self._account is not None and self._account.con.session is not None:
+                self._account.con.session.hooks['response'].append(hook)
+
+    def invalidate(self, reason):
+        with self._lock:
+            logging.warning("OutlookSession: dropping account and calendar handle (%s)", reason)
+            self._account = None
+            self._calendar = None
+
+    def is_invalidating_error(self, error):
+        """Return True if `error` means the token or calendar handle went stale."""
+        if isinstance(error, RuntimeError):
+            # raised by O365 when no token is available or refreshing it failed
+            return True
+        response = getattr(error, 'response', None)
+        return response is not None and response.status_code in self._invalidating_status_codes
+
+    def _ensure_valid(self):
+        if self._calendar is not None and not self._is_token_expired():
+            return
+
+        self._rebuild()
+
+    def _is_token_expired(self):
+        token = self._account.con.token_backend.token
+        return token is not None and token.is_expired
+
+    def _protocol(self):
+        protocol = MSGraphProtocol()
+        if self._graph_url is not None:
+            # e.g. the local stand-in of mrd.mocks.graph_server
+            protocol.protocol_url = self._graph_url
+            protocol.service_url = self._graph_url + protocol.api_version + '/'
+            if self._graph_url.startswith('http://') and not os.environ.get(INSECURE_TRANSPORT_VARIABLE):
+                logging.warning("OutlookSession: unencrypted Graph endpoint %s, token requests will be refused "
+                                "unless insecure transport is allowed", self._graph_url)
+        return protocol
+
+    def _rebuild(self):
+        if self._token_manager is not None:
+            token_backend = self._token_manager.backend
+        else:
+            token_backend = FileSystemTokenBackend(token_path=self._token_path, token_filename=self._token_filename)
+        account = Account(credentials=self._credentials, scopes=self._scopes, token_backend=token_backend,
+                          protocol=self._protocol())
+        if self._graph_url is not None:
+            account.con._oauth2_token_url = self._graph_url + 'token'
+        if self._token_manager is not None:
+            self._token_manager.attach(account.con)
+        if self._response_hooks:
+            # O365 creates the HTTP session lazily, create it now to hook into it
+            account.con.session = account.con.get_session(load_token=True)
+            account.con.session.hooks['response'].extend(self._response_hooks)
+
+        schedule = account.schedule()
+        if self._calendar_name is not None:
+            calendar = schedule.get_calendar(calendar_name=self._calendar_name)
+        else:
+            calendar = schedule.get_default_calendar()
+
+        if calendar is None:
+            raise MissingCalendarError("no calendar found")
+
+        self._account = account
+        self._calendar = calendar
+        self._rebuild_count += 1
+        logging.info("OutlookSession: built account and calendar handle, %d build(s) so far", self._rebuild_count)
+
+
 class OutlookRoomRepository(rooms.RoomRepositoryPort):
-    _seconds_per_day = 60 * 60 * 24
+    SYNC_MODE_QUERY = 'query'
+    SYNC_MODE_DELTA = 'delta'
+
+    DEFAULT_REFRESH_INTERVAL_IN_SECS = 10
+
+    # a day with more events is fetched in several pages following @odata.nextLink
+    _events_per_page = 50
+    _lean_fields = 'id,start,end,subject,organizer'
     _scopes = ['offline_access', 'https://graph.microsoft.com/Calendars.ReadWrite']
     _ad_hoc_subject = "Ad-hoc Meeting"
 
-    def __init__(self, room_id, client_id, client_secret, use_mock=False):
+    def __init__(self, room_id, client_id, client_secret, use_mock=False, sync_mode=SYNC_MODE_QUERY,
+                 refresh_interval_in_secs=DEFAULT_REFRESH_INTERVAL_IN_SECS, lean_fetch=False, count_attendees=True,
+                 token_manager=None, graph_url=None, poll_rate=None):
         self._room_id = room_id
+        self._poll_rate = poll_rate
+        self._refresh_hooks = []
         self._credentials = (client_id, client_secret)
+        self._session = OutlookSession(self._credentials, self._scopes, token_manager=token_manager,
+                                       graph_url=graph_url)
+        self._delta_sync = delta_sync.CalendarDeltaSync() if sync_mode == self.SYNC_MODE_DELTA else None
+        self._refresh_interval_in_secs = refresh_interval_in_secs
+        self._lean_fetch = lean_fetch
+        self._count_attendees = count_attendees
+        self._schedule_lock = threading.RLock()
+        self._schedule = None
+        self._schedule_expires_at = 0
+        self._booked_appointment = None
         self.calendar = None
 
-        global Account, FileSystemTokenBackend
+        load_o365(use_mock)
 
-        if use_mock:
-            logging.warning("mock behavior not implemented yet, using O365 library anyway")
-            # from mrd.mocks.event_mock import AccountMock as Account
-            # from mrd.mocks.event_mock import EventMock as Event
-            from O365 import Account, FileSystemTokenBackend
-        else:
-            from O365 import Account, FileSystemTokenBackend
+    @property
+    def session(self):
+        return self._session
+
+    def add_refresh_hook(self, hook):
+        """Register `hook(duration_in_secs)`, called after every schedule refresh from Outlook."""
+        self._refresh_hooks.append(hook)
 
     def fetch_calendar(self):
         if self.calendar is not None:
             return
 
         try:
-            self.calendar = self._get_calendar()
+            self.calendar = self._session.get_calendar()
         except RuntimeError as e:
             raise AuthenticationFailureError(e)
 
-    def _fetch_event_from_outlook_calendar(self, time_in_sec_since_epoch):
-        start = time_util.convert_secs_since_epoch_to_datetime(time_in_sec_since_epoch)
-        midnight_in_secs = time_in_sec_since_epoch - (time_in_sec_since_epoch % self._seconds_per_day) + self._seconds_per_day - 1
-        # midnight: same day 23:59:59
-        midnight_datetime = time_util.convert_secs_since_epoch_to_datetime(midnight_in_secs)
-
-        calendar = self._get_calendar()
-
-        query = calendar.new_query('start').greater_equal(start)
-        query.chain('and').on_attribute('end').less_equal(midnight_datetime)
+    def _with_calendar(self, action):
+        """Run `action(calendar)`, rebuilding the session once if it went stale."""
+        try:
+            return action(self._session.get_calendar())
+        except Exception as e:
+            if not self._session.is_invalidating_error(e):
+                raise
+            self._session.invalidate(e)
 
-        events = calendar.get_events(limit=25, query=query, include_recurring=True)
+        return action(self._session.get_calendar())
 
-        event = None
-        for e in events:
-            end = time_util.convert_datetime_to_secs_since_epoch(e.end)
-            start = time_util.convert_datetime_to_secs_since_epoch(e.start)
-            # event out of range
-            if end < time_in_sec_since_epoch or start > midnight_in_secs:
-                continue
-            # event begins earlier than recently remembered event
-            if event is None or e.start < event.end:
-                event = e
+    def _fetch_events_from_outlook_calendar(self, time_in_sec_since_epoch):
+        """Return the O365 events from the given time up to midnight."""
+        _, midnight_in_secs = time_util.get_day_bounds(time_in_sec_since_epoch)
+        start = time_util.convert_secs_since_epoch_to_datetime(time_in_sec_since_epoch)
+        midnight_datetime = time_util.convert_secs_since_epoch_to_datetime(midnight_in_secs)
 
-        return event
+        def get_events(calendar):
+            query = calendar.new_query('start').greater_equal(start)
+            query.chain('and').on_attribute('end').less_equal(midnight_datetime)
+            return list(calendar.get_events(limit=None, batch=self._events_per_page, query=query,
+                                            order_by='start/dateTime', include_recurring=True))
+
+        return self._with_calendar(get_events)
+
+    def _fetch_records_lean(self, time_in_sec_since_epoch, midnight_in_secs):
+        """Fetch the events up to midnight as plain records, selecting only the fields
+        the display shows and skipping the construction of O365 `Event` objects."""
+        params = {
+            'startDateTime': time_util.convert_secs_since_epoch_to_string(time_in_sec_since_epoch),
+            'endDateTime': time_util.convert_secs_since_epoch_to_string(midnight_in_secs),
+            # Graph has no attendee count, the list is only selected if the capacity is shown
+            '$select': self._lean_fields + (',attendees' if self._count_attendees else ''),
+            '$top': self._events_per_page,
+            '$orderby': 'start/dateTime',
+        }
+        headers = {'Prefer': 'outlook.timezone="UTC"'}
+
+        def get_records(calendar):
+            if calendar.calendar_id is None:
+                url = calendar.build_url('/calendar/calendarView')
+            else:
+                url = calendar.build_url('/calendars/{0}/calendarView'.format(calendar.calendar_id))
+            records = []
+            request_params = params
+            while url is not None:
+                data = calendar.con.get(url, params=request_params, headers=headers).json()
+                records.extend(delta_sync.to_event_record(e) for e in data.get('value', []))
+                # the next link carries the query
+                url, request_params = data.get('@odata.nextLink'), None
+            return records
+
+        return self._with_calendar(get_records)
+
+    def _fetch_day_schedule(self, time_in_sec_since_epoch):
+        day_start, midnight_in_secs = time_util.get_day_bounds(time_in_sec_since_epoch)
+
+        if self._delta_sync is not None:
+            records = self._with_calendar(lambda calendar: self._delta_sync.sync(calendar, time_in_sec_since_epoch))
+            appointments = [record_to_appointment(r, self._is_adhoc_record(r)) for r in records]
+            return schedule.DaySchedule(appointments, day_start, midnight_in_secs)
+
+        if self._lean_fetch:
+            records = self._fetch_records_lean(time_in_sec_since_epoch, midnight_in_secs)
+            appointments = [record_to_appointment(r, self._is_adhoc_record(r)) for r in records]
+            return schedule.DaySchedule(appointments, time_in_sec_since_epoch, midnight_in_secs)
+
+        events = self._fetch_events_from_outlook_calendar(time_in_sec_since_epoch)
+        appointments = [to_appointment(e, self._is_adhoc(e)) for e in events]
+        return schedule.DaySchedule(appointments, time_in_sec_since_epoch, midnight_in_secs)
+
+    def get_day_schedule(self, time_in_sec_since_epoch):
+        """Return the cached `DaySchedule`, refreshing it from Outlook if it expired
+        or does not cover the given time."""
+        with self._schedule_lock:
+            if self._schedule is None \
+                    or not self._schedule.covers(time_in_sec_since_epoch) \
+                    or time.monotonic() >= self._schedule_expires_at:
+                if self._poll_rate is not None:
+                    self._poll_rate.record(time.time())
+                started_at = time.monotonic()
+                try:
+                    self._schedule = self._fetch_day_schedule(time_in_sec_since_epoch)
+                finally:
+                    for hook in self._refresh_hooks:
+                        hook(time.monotonic() - started_at)
+                self._schedule_expires_at = time.monotonic() + self._refresh_interval_in_secs
+                logging.info("OutlookRoomRepository: refreshed day schedule, %d event(s)", len(self._schedule))
+
+            return self._schedule
+
+    def invalidate_schedule(self):
+        """Signal that the calendar changed, the next lookup refreshes the schedule."""
+        with self._schedule_lock:
+            self._schedule = None
+
+    def _apply_to_schedule(self, added=(), removed_event_ids=()):
+        """Write a change made by this device through to the cached schedule instead of refetching it."""
+        with self._schedule_lock:
+            if self._schedule is not None:
+                self._schedule = self._schedule.with_changes(added, removed_event_ids)
 
     def get_next_state_changing_appointment_up_to_midnight(self, time_in_sec_since_epoch):
         '''
@@ -116,63 +369,83 @@ class OutlookRoomRepository(rooms.RoomRepositoryPort):
 
             time_in_sec_since_epoch -- timestamp for which the next upcoming event should get searched, now on default.
         '''
-        event = self._fetch_event_from_outlook_calendar(time_in_sec_since_epoch)
+        appointment = self.get_day_schedule(time_in_sec_since_epoch).next_state_changing(time_in_sec_since_epoch)
 
-        if event is None:
+        if appointment is None:
             # no upcoming event found or room already occupied: return None
             logging.info("OutlookRoomRepository: no event found for %s", self._room_id)
         else:
             logging.info("OutlookRoomRepository: found event {0}, {1}, {2}".format(
-                event.start,
-                event.end,
-                event.subject))
+                time_util.convert_secs_since_epoch_to_string(appointment.date_from),
+                time_util.convert_secs_since_epoch_to_string(appointment.date_until),
+                appointment.title))
 
-        return to_appointment(event, self._is_adhoc(event))
+        return appointment
 
     def book_room(self, time_from, time_to):
         logging.info("OutlookRoomRepository: received booking request from %s, to %s",
                      time_util.convert_secs_since_epoch_to_string(time_from),
                      time_util.convert_secs_since_epoch_to_string(time_to))
 
-        calendar = self._get_calendar()
-        event = calendar.new_event()
-
-        event.start = time_util.convert_secs_since_epoch_to_datetime(time_from)
-        event.end = time_util.convert_secs_since_epoch_to_datetime(time_to)
-        event.subject = self._ad_hoc_subject
-        event.save()
-
-        return to_appointment(event, is_adhoc=True)
+        def create_event(calendar):
+            event = calendar.new_event()
+            event.start = time_util.convert_secs_since_epoch_to_datetime(time_from)
+            event.end = time_util.convert_secs_since_epoch_to_datetime(time_to)
+            event.subject = self._ad_hoc_subject
+            event.save()
+            return event
+
+        event = self._with_calendar(create_event)
+        appointment = to_appointment(event, is_adhoc=True)
+        # remembered so that cancelling needs no lookup
+        self._booked_appointment = appointment
+        self._apply_to_schedule(added=[appointment])
+
+        return appointment
+
+    def _get_running_adhoc_appointment(self, time_in_sec_since_epoch):
+        booked = self._booked_appointment
+        if booked is not None and booked.date_from <= time_in_sec_since_epoch < booked.date_until:
+            return booked
+
+        # e.g. booked before a restart, the day schedule knows its id as well
+        current = self.get_day_schedule(time_in_sec_since_epoch).current(time_in_sec_since_epoch)
+        if current is None:
+            logging.info("OutlookRoomRepository: no currently running event")
+            return None
+        if not current.is_adhoc:
+            logging.info("OutlookRoomRepository: current event is no ad hoc booking")
+            return None
+        return current
 
     def cancel_running_adhoc_meeting(self):
+        """End the running ad hoc meeting with a single request.
+
+        :returns: the shortened `Appointment` or None if it was deleted or there was none."""
         time_in_sec_since_epoch = time.time()
-        event = self._fetch_event_from_outlook_calendar(time_in_sec_since_epoch)
-        if event is None or time_util.is_in_future(time_util.convert_datetime_to_secs_since_epoch(event.start)):
-            logging.info("OutlookRoomRepository: no currently running event")
-        elif not self._is_adhoc(event):
-            logging.info("OutlookRoomRepository: current event is no ad hoc booking")
+        appointment = self._get_running_adhoc_appointment(time_in_sec_since_epoch)
+        if appointment is None:
+            return None
+
+        # only retain events in calendar that took more than a minute
+        shortened = end_appointment(appointment, time_in_sec_since_epoch)
+        if shortened is not None:
+            end = to_graph_datetime(time_in_sec_since_epoch)
+            self._with_calendar(lambda calendar: calendar.con.patch(self._event_url(calendar, appointment.event_id),
+                                                                    data={'end': end}))
         else:
-            now = datetime.datetime.now(datetime.timezone.utc)
-            delta = now - event.start
-            if delta > datetime.timedelta(minutes=1):
-                # only retain events in calendar that took more than a minute
-                event.end = now
-                event.save()
-            else:
-                event.delete()
-            logging.info("OutlookRoomRepository: cancelled event {0}, {1}, {2}".format(event.subject, event.start, event.end))
+            self._with_calendar(lambda calendar: calendar.con.delete(self._event_url(calendar, appointment.event_id)))
 
-    def _get_calendar(self, name=None):
-        token_path = pathlib.Path() / 'mrd'
-        token_filename = 'o365_token.txt'
-        token_backend = FileSystemTokenBackend(token_path=token_path, token_filename=token_filename)
+        self._booked_appointment = None
+        self._apply_to_schedule(added=[shortened] if shortened is not None else [],
+                                removed_event_ids=[appointment.event_id])
+        logging.info("OutlookRoomRepository: cancelled event {0}, {1}, {2}".format(
+            appointment.title, appointment.date_from, time_in_sec_since_epoch))
 
-        account = Account(credentials=self._credentials, scopes=self._scopes, token_backend=token_backend)
-        schedule = account.schedule()
-        if name is not None:
-            return schedule.get_calendar(calendar_name=name)
+        return shortened
 
-        return schedule.get_default_calendar()
+    def _event_url(self, calendar, event_id):
+        return calendar.build_url('/events/{0}'.format(event_id))
 
     def _is_adhoc(self, event):
         if event is None:
@@ -180,3 +453,333 @@ class OutlookRoomRepository(rooms.RoomRepositoryPort):
         else:
             return event.organizer.address.lower() == self._room_id.lower() \
                 and event.subject == self._ad_hoc_subject
+
+    def _is_adhoc_record(self, record):
+        if record is None:
+            return False
+        else:
+            return record['organizer'].lower() == self._room_id.lower() \
+                and record['subject'] == self._ad_hoc_subject
+
+
+class OutlookRoomHub(object):
+    """Tracks the calendars of many rooms with one account.
+
+    The per-room calendar view queries are combined into Graph JSON batches of
+    up to 20 requests, so refreshing N rooms costs N / 20 round trips. The
+    account needs delegated access to the room calendars."""
+    DEFAULT_REFRESH_INTERVAL_IN_SECS = 60
+
+    _max_requests_per_batch = 20
+    _events_per_page = OutlookRoomRepository._events_per_page
+    _lean_fields = OutlookRoomRepository._lean_fields
+    _scopes = ['offline_access', 'https://graph.microsoft.com/Calendars.ReadWrite.Shared']
+    _ad_hoc_subject = OutlookRoomRepository._ad_hoc_subject
+
+    def __init__(self, room_ids, client_id, client_secret,
+                 refresh_interval_in_secs=DEFAULT_REFRESH_INTERVAL_IN_SECS, count_attendees=True, token_manager=None,
+                 graph_url=None, poll_rate=None):
+        self._room_ids = list(room_ids)
+        self._poll_rate = poll_rate
+        self._session = OutlookSession((client_id, client_secret), self._scopes, token_manager=token_manager,
+                                       graph_url=graph_url)
+        self._refresh_interval_in_secs = refresh_interval_in_secs
+        self._count_attendees = count_attendees
+        self._lock = threading.RLock()
+        # a single refresh is in flight at a time, it only holds the lock to swap in its results
+        self._refresh_done = threading.Condition(self._lock)
+        self._is_refreshing = False
+        # bookings and cancellations applied while refreshing, replayed onto the fetched schedules
+        self._changes_during_refresh = []
+        self._schedules = {}
+        self._booked_event_ids = {room_id: set() for room_id in self._room_ids}
+        # start of the day the booked ids of a room were last pruned for
+        self._booked_event_days = {}
+        self._expires_at = 0
+        self._round_trips = 0
+
+        load_o365()
+
+    @property
+    def room_ids(self):
+        return list(self._room_ids)
+
+    @property
+    def round_trips(self):
+        """Number of HTTP requests sent to Graph so far."""
+        return self._round_trips
+
+    def room(self, room_id):
+        """Return the `RoomRepositoryPort` of a single room tracked by this hub."""
+        if room_id not in self._booked_event_ids:
+            raise CorruptArgumentError("room {0} is not tracked by this hub".format(room_id))
+        return HubRoomRepository(self, room_id)
+
+    def fetch_calendar(self):
+        try:
+            self._session.get_calendar()
+        except RuntimeError as e:
+            raise AuthenticationFailureError(e)
+
+    def _with_account(self, action):
+        """Run `action(account)`, rebuilding the session once if it went stale."""
+        try:
+            return action(self._session.account)
+        except Exception as e:
+            if not self._session.is_invalidating_error(e):
+                raise
+            self._session.invalidate(e)
+
+        return action(self._session.account)
+
+    def get_day_schedule(self, room_id, time_in_sec_since_epoch):
+        """Return the cached `DaySchedule` of a room.
+
+        All rooms are refreshed together once the cache expired, a room whose
+        schedule is missing or outdated is refreshed on its own. While another
+        thread refreshes, the previous schedule is returned if it covers the time."""
+        with self._lock:
+            while self._is_refreshing:
+                if self._covers(room_id, time_in_sec_since_epoch):
+                    return self._schedules[room_id]
+                self._refresh_done.wait()
+
+            if time.monotonic() >= self._expires_at:
+                room_ids = self._room_ids
+            elif not self._covers(room_id, time_in_sec_since_epoch):
+                room_ids = [room_id]
+            else:
+                return self._schedules[room_id]
+            self._is_refreshing = True
+
+        self._refresh_claimed(time_in_sec_since_epoch, room_ids)
+
+        with self._lock:
+            if not self._covers(room_id, time_in_sec_since_epoch):
+                raise MissingCalendarError("no calendar data for room {0}".format(room_id))
+
+            return self._schedules[room_id]
+
+    def _covers(self, room_id, time_in_sec_since_epoch):
+        day_schedule = self._schedules.get(room_id)
+        return day_schedule is not None and day_schedule.covers(time_in_sec_since_epoch)
+
+    def invalidate_room(self, room_id):
+        with self._lock:
+            self._schedules.pop(room_id, None)
+
+    def refresh(self, time_in_sec_since_epoch, room_ids=None):
+        """Fetch the schedules of the given rooms, all rooms by default, up to midnight.
+
+        A room whose request failed keeps its previous schedule. Waits for a
+        refresh already in flight to finish first."""
+        with self._lock:
+            while self._is_refreshing:
+                self._refresh_done.wait()
+            self._is_refreshing = True
+
+        self._refresh_claimed(time_in_sec_since_epoch, self._room_ids if room_ids is None else list(room_ids))
+
+    def _refresh_claimed(self, time_in_sec_since_epoch, room_ids):
+        """Refresh once `_is_refreshing` was set by the caller, the requests are sent without holding the lock."""
+        try:
+            self._fetch_schedules(time_in_sec_since_epoch, room_ids)
+        finally:
+            with self._lock:
+                self._is_refreshing = False
+                self._changes_during_refresh = []
+                self._refresh_done.notify_all()
+
+    def _fetch_schedules(self, time_in_sec_since_epoch, room_ids):
+        day_start, midnight_in_secs = time_util.get_day_bounds(time_in_sec_since_epoch)
+
+        requests = [self._calendar_view_request(i, room_id, time_in_sec_since_epoch, midnight_in_secs)
+                    for i, room_id in enumerate(room_ids)]
+        responses = {}
+        for offset in range(0, len(requests), self._max_requests_per_batch):
+            responses.update(self._send_batch(requests[offset:offset + self._max_requests_per_batch]))
+
+        graph_events = {}
+        for request_id, response in responses.items():
+            if response.get('status') == 200:
+                graph_events[request_id] = self._with_remaining_pages(response['body'])
+
+        with self._lock:
+            failed = []
+            for i, room_id in enumerate(room_ids):
+                if str(i) not in graph_events:
+                    failed.append(room_id)
+                    continue
+
+                records = [delta_sync.to_event_record(e) for e in graph_events[str(i)]]
+                if self._booked_event_days.get(room_id) != day_start:
+                    # bookings of earlier days are gone from the calendar, keep only those still in it
+                    known_ids = {r['id'] for r in records}
+                    known_ids.update(a.event_id for changed_room_id, added, _ in self._changes_during_refresh
+                                     if changed_room_id == room_id for a in added)
+                    self._booked_event_ids[room_id] &= known_ids
+                    self._booked_event_days[room_id] = day_start
+                appointments = [record_to_appointment(r, self._is_adhoc_record(room_id, r)) for r in records]
+                day_schedule = schedule.DaySchedule(appointments, time_in_sec_since_epoch, midnight_in_secs)
+                for changed_room_id, added, removed_event_ids in self._changes_during_refresh:
+                    if changed_room_id == room_id:
+                        # the response may predate the change or already contain it
+                        day_schedule = day_schedule.with_changes(
+                            added, list(removed_event_ids) + [a.event_id for a in added])
+                self._schedules[room_id] = day_schedule
+
+            if len(room_ids) == len(self._room_ids):
+                self._expires_at = time.monotonic() + self._refresh_interval_in_secs
+
+        if failed:
+            logging.warning("OutlookRoomHub: no calendar data for %d room(s): %s", len(failed), ", ".join(failed))
+        logging.info("OutlookRoomHub: refreshed %d room(s), %d request(s) in total",
+                     len(room_ids) - len(failed), self._round_trips)
+
+    def _calendar_view_request(self, request_id, room_id, time_in_sec_since_epoch, midnight_in_secs):
+        params = {
+            'startDateTime': time_util.convert_secs_since_epoch_to_string(time_in_sec_since_epoch),
+            'endDateTime': time_util.convert_secs_since_epoch_to_string(midnight_in_secs),
+            '$select': self._lean_fields + (',attendees' if self._count_attendees else ''),
+            '$top': self._events_per_page,
+            '$orderby': 'start/dateTime',
+        }
+        return {
+            'id': str(request_id),
+            'method': 'GET',
+            'url': '{0}/calendarView?{1}'.format(self._room_path(room_id), urllib.parse.urlencode(params, safe='$/,:')),
+            'headers': {'Prefer': 'outlook.timezone="UTC"'},
+        }
+
+    def _count_round_trip(self, is_fetch=False):
+        with self._lock:
+            self._round_trips += 1
+        if is_fetch and self._poll_rate is not None:
+            self._poll_rate.record(time.time())
+
+    def _send_batch(self, requests):
+        def post(account):
+            self._count_round_trip(is_fetch=True)
+            return account.con.post(account.protocol.service_url + '$batch', data={'requests': requests}).json()
+
+        data = self._with_account(post)
+        return {response['id']: response for response in data.get('responses', [])}
+
+    def _with_remaining_pages(self, body):
+        """Return the events of a calendar view response body and of the pages following it."""
+        graph_events = list(body.get('value', []))
+        next_link = body.get('@odata.nextLink')
+        while next_link is not None:
+            def get(account):
+                self._count_round_trip(is_fetch=True)
+                return account.con.get(next_link, headers={'Prefer': 'outlook.timezone="UTC"'}).json()
+
+            data = self._with_account(get)
+            graph_events.extend(data.get('value', []))
+            next_link = data.get('@odata.nextLink')
+        return graph_events
+
+    def _room_path(self, room_id):
+        return '/users/{0}'.format(urllib.parse.quote(room_id))
+
+    def _room_url(self, account, room_id, endpoint):
+        return account.protocol.service_url.rstrip('/') + self._room_path(room_id) + endpoint
+
+    def book_room(self, room_id, time_from, time_to):
+        logging.info("OutlookRoomHub: received booking request for %s from %s, to %s", room_id,
+                     time_util.convert_secs_since_epoch_to_string(time_from),
+                     time_util.convert_secs_since_epoch_to_string(time_to))
+        event = {'subject': self._ad_hoc_subject, 'start': to_graph_datetime(time_from), 'end': to_graph_datetime(time_to)}
+
+        def post(account):
+            self._count_round_trip()
+            return account.con.post(self._room_url(account, room_id, '/events'), data=event).json()
+
+        appointment = record_to_appointment(delta_sync.to_event_record(self._with_account(post)), is_adhoc=True)
+        with self._lock:
+            # the organizer is the hub account, not the room, so bookings are remembered by id
+            self._booked_event_ids[room_id].add(appointment.event_id)
+            self._apply_to_schedule(room_id, added=[appointment])
+
+        return appointment
+
+    def _apply_to_schedule(self, room_id, added=(), removed_event_ids=()):
+        with self._lock:
+            if self._is_refreshing:
+                self._changes_during_refresh.append((room_id, list(added), list(removed_event_ids)))
+            day_schedule = self._schedules.get(room_id)
+            if day_schedule is not None:
+                self._schedules[room_id] = day_schedule.with_changes(added, removed_event_ids)
+
+    def cancel_running_adhoc_meeting(self, room_id):
+        """End the running ad hoc meeting of a room with a single request.
+
+        :returns: the shortened `Appointment` or None if it was deleted or there was none."""
+        time_in_sec_since_epoch = time.time()
+        appointment = self.get_day_schedule(room_id, time_in_sec_since_epoch).current(time_in_sec_since_epoch)
+        if appointment is None:
+            logging.info("OutlookRoomHub: no currently running event in %s", room_id)
+            return None
+        if not appointment.is_adhoc:
+            logging.info("OutlookRoomHub: current event in %s is no ad hoc booking", room_id)
+            return None
+
+        # only retain events in calendar that took more than a minute
+        shortened = end_appointment(appointment, time_in_sec_since_epoch)
+
+        def cancel(account):
+            self._count_round_trip()
+            url = self._room_url(account, room_id, '/events/{0}'.format(appointment.event_id))
+            if shortened is not None:
+                account.con.patch(url, data={'end': to_graph_datetime(time_in_sec_since_epoch)})
+            else:
+                account.con.delete(url)
+
+        self._with_account(cancel)
+        self._apply_to_schedule(room_id, added=[shortened] if shortened is not None else [],
+                                removed_event_ids=[appointment.event_id])
+        logging.info("OutlookRoomHub: cancelled event %s in %s", appointment.title, room_id)
+
+        return shortened
+
+    def _is_adhoc_record(self, room_id, record):
+        return record['subject'] == self._ad_hoc_subject \
+            and (record['organizer'].lower() == room_id.lower() or record['id'] in self._booked_event_ids[room_id])
+
+
+class HubRoomRepository(rooms.RoomRepositoryPort):
+    """View of a single room tracked by an `OutlookRoomHub`."""
+
+    def __init__(self, hub, room_id):
+        self._hub = hub
+        self._room_id = room_id
+
+    @property
+    def room_id(self):
+        return self._room_id
+
+    def fetch_calendar(self):
+        self._hub.fetch_calendar()
+
+    def get_day_schedule(self, time_in_sec_since_epoch):
+        return self._hub.get_day_schedule(self._room_id, time_in_sec_since_epoch)
+
+    def get_next_state_changing_appointment_up_to_midnight(self, time_in_sec_since_epoch):
+        appointment = self.get_day_schedule(time_in_sec_since_epoch).next_state_changing(time_in_sec_since_epoch)
+
+        if appointment is None:
+            logging.info("HubRoomRepository: no event found for %s", self._room_id)
+        else:
+            logging.info("HubRoomRepository: found event in {0}: {1}, {2}, {3}".format(
+                self._room_id,
+                time_util.convert_secs_since_epoch_to_string(appointment.date_from),
+                time_util.convert_secs_since_epoch_to_string(appointment.date_until),
+                appointment.title))
+
+        return appointment
+
+    def book_room(self, time_from, time_to):
+        return self._hub.book_room(self._room_id, time_from, time_to)
+
+    def cancel_running_adhoc_meeting(self):
+        return self._hub.cancel_running_adhoc_meeting(self._room_id)
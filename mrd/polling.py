@@ -0,0 +1,130 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import collections
+import datetime
+import logging
+
+
+def _parse_clock_time(value):
+    hours, minutes = value.strip().split(':')
+    return int(hours) * 60 * 60 + int(minutes) * 60
+
+
+class PollPolicy(object):
+    """Decides how long to wait until the calendar is polled again.
+
+    Polls fast shortly before a state change and after a local booking, slower
+    the further away the next state change is, and rarely outside working hours.
+    State changes themselves are handled locally and do not depend on polling."""
+    SECTION = 'Polling'
+
+    def __init__(self, fast_interval_in_secs=10, idle_interval_in_secs=300, off_hours_interval_in_secs=1800,
+                 proximity_in_secs=15 * 60, booking_boost_in_secs=5 * 60,
+                 working_days=(0, 1, 2, 3, 4), working_hours=('07:00', '19:00')):
+        self.fast_interval_in_secs = fast_interval_in_secs
+        self.idle_interval_in_secs = idle_interval_in_secs
+        self.off_hours_interval_in_secs = off_hours_interval_in_secs
+        self.proximity_in_secs = proximity_in_secs
+        self.booking_boost_in_secs = booking_boost_in_secs
+        self.working_days = tuple(working_days)
+        self._work_start = _parse_clock_time(working_hours[0])
+        self._work_end = _parse_clock_time(working_hours[1])
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a policy from the [Polling] section, falling back to defaults."""
+        if config is None or not config.has_section(cls.SECTION):
+            return cls()
+
+        section = config[cls.SECTION]
+        return cls(fast_interval_in_secs=section.getint('fast_interval_in_secs', 10),
+                   idle_interval_in_secs=section.getint('idle_interval_in_secs', 300),
+                   off_hours_interval_in_secs=section.getint('off_hours_interval_in_secs', 1800),
+                   proximity_in_secs=section.getint('proximity_in_secs', 15 * 60),
+                   booking_boost_in_secs=section.getint('booking_boost_in_secs', 5 * 60),
+                   working_days=[int(d) for d in section.get('working_days', '0,1,2,3,4').split(',')],
+                   working_hours=section.get('working_hours', '07:00-19:00').split('-'))
+
+    def next_interval(self, now, next_state_change_at=None, last_local_booking_at=None):
+        """Return the number of seconds until the next poll.
+
+        :param now: the current time in seconds since epoch.
+        :param next_state_change_at: next known start/end/warning instant or None.
+        :param last_local_booking_at: time of the last booking or cancellation on this device."""
+        if last_local_booking_at is not None and now - last_local_booking_at < self.booking_boost_in_secs:
+            return self.fast_interval_in_secs
+
+        distance = None if next_state_change_at is None else next_state_change_at - now
+        if distance is not None and distance <= self.proximity_in_secs:
+            return self.fast_interval_in_secs
+
+        if not self.is_working_time(now):
+            return max(self.fast_interval_in_secs,
+                       min(self.off_hours_interval_in_secs, self._secs_until_working_time(now)))
+
+        if distance is None:
+            return self.idle_interval_in_secs
+
+        # the further away the next state change, the less a late change matters
+        return max(self.fast_interval_in_secs, min(self.idle_interval_in_secs, (distance - self.proximity_in_secs) / 4))
+
+    def is_working_time(self, now):
+        local = datetime.datetime.fromtimestamp(now)
+        secs_of_day = local.hour * 60 * 60 + local.minute * 60 + local.second
+        return local.weekday() in self.working_days and self._work_start <= secs_of_day < self._work_end
+
+    def _secs_until_working_time(self, now):
+        local = datetime.datetime.fromtimestamp(now)
+        midnight = local.replace(hour=0, minute=0, second=0, microsecond=0)
+        for days in range(8):
+            day = midnight + datetime.timedelta(days=days)
+            start = day + datetime.timedelta(seconds=self._work_start)
+            if day.weekday() in self.working_days and start > local:
+                return (start - local).total_seconds()
+
+        return self.off_hours_interval_in_secs
+
+
+class PollRateMeter(object):
+    """Counts calendar requests over a sliding one hour window."""
+    WINDOW_IN_SECS = 60 * 60
+
+    def __init__(self):
+        self._requests = collections.deque()
+        self._total = 0
+
+    @property
+    def total(self):
+        return self._total
+
+    def record(self, now):
+        self._requests.append(now)
+        self._total += 1
+        self._expire(now)
+
+    def requests_per_hour(self, now):
+        self._expire(now)
+        return len(self._requests)
+
+    def _expire(self, now):
+        while self._requests and self._requests[0] <= now - self.WINDOW_IN_SECS:
+            self._requests.popleft()
+
+    def log_rate(self, now):
+        logging.info("Calendar polling: %d request(s) in the last hour, %d in total",
+                     self.requests_per_hour(now), self._total)
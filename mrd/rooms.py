@@ -17,15 +17,31 @@
 
 from abc import ABCMeta, abstractmethod
 import logging
+import threading
 
 
 class Appointment(object):
-    def __init__(self, date_from, date_until, title, num_attendees, is_adhoc=False):
+    def __init__(self, date_from, date_until, title, num_attendees, is_adhoc=False, event_id=None):
         self.date_from = date_from
         self.date_until = date_until
         self.title = title
         self.is_adhoc = is_adhoc
         self.num_attendees = num_attendees
+        self.event_id = event_id
+
+    @property
+    def fingerprint(self):
+        """Hashable summary of everything a display shows of the appointment."""
+        return self.date_from, self.date_until, self.title, self.num_attendees, self.is_adhoc, self.event_id
+
+    def __eq__(self, other):
+        return isinstance(other, Appointment) and self.fingerprint == other.fingerprint
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.fingerprint)
 
 
 class RoomInformation(object):
@@ -72,10 +88,28 @@ class RoomInformation(object):
         return self._client_secret
 
 class Occupation(object):
-    def __init__(self, current_event, upcoming_event):
+    def __init__(self, current_event, upcoming_event, is_stale=False, is_upcoming_soon=False):
         self._current_event = current_event
         self._is_occupied = current_event is not None
         self._upcoming_event = upcoming_event
+        self._is_stale = is_stale
+        self._is_upcoming_soon = is_upcoming_soon
+
+    @property
+    def fingerprint(self):
+        """Hashable summary, equal for occupations that look the same on the display."""
+        return (self._current_event.fingerprint if self._current_event is not None else None,
+                self._upcoming_event.fingerprint if self._upcoming_event is not None else None,
+                self._is_stale, self._is_upcoming_soon)
+
+    def __eq__(self, other):
+        return isinstance(other, Occupation) and self.fingerprint == other.fingerprint
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.fingerprint)
 
     @property
     def is_occupied(self):
@@ -89,6 +123,17 @@ class Occupation(object):
     def current_event(self):
         return self._current_event
 
+    @property
+    def is_stale(self):
+        """True if the occupation was computed from the cached schedule instead of the
+        calendar, while offline or as provisional state right after start."""
+        return self._is_stale
+
+    @property
+    def is_upcoming_soon(self):
+        """True if the upcoming event starts within the warning period."""
+        return self._is_upcoming_soon
+
 
 class RoomRepositoryPort(object, metaclass=ABCMeta):
     """Port for accessing and storing data"""
@@ -109,6 +154,47 @@ class RoomRepositoryPort(object, metaclass=ABCMeta):
         :returns: a instance of `Appointment` for the newly created appointment or None"""
         pass
 
+    def get_day_schedule(self, time_in_sec_since_epoch):
+        """Return the known `DaySchedule` of the day of the given time, or None if
+        the repository does not keep one."""
+        return None
+
+
+class AsyncRoomRepositoryPort(object, metaclass=ABCMeta):
+    """Asyncio variant of `RoomRepositoryPort`, all methods are coroutines"""
+
+    @abstractmethod
+    async def fetch_calendar(self):
+        pass
+
+    @abstractmethod
+    async def get_next_state_changing_appointment_up_to_midnight(self, time_in_sec_since_epoch):
+        """Return the next appointment from the given time up until midnight of today.
+
+        :param time_in_sec_since_epoch: the current time.
+        :returns: a instance of `Appointment` or None"""
+        pass
+
+    @abstractmethod
+    async def book_room(self, time_from, time_to):
+        """
+        :param time_from: seconds since epoch.
+        :param time_to: seconds since epoch.
+        :returns: a instance of `Appointment` for the newly created appointment or None"""
+        pass
+
+    @abstractmethod
+    async def cancel_running_adhoc_meeting(self):
+        pass
+
+    async def get_day_schedule(self, time_in_sec_since_epoch):
+        """See `RoomRepositoryPort.get_day_schedule`."""
+        return None
+
+    async def close(self):
+        """Release network resources, the repository must not be used afterwards."""
+        pass
+
 
 class EventPort(object, metaclass=ABCMeta):
     """Port description to distribute events throughout the application"""
@@ -138,31 +224,88 @@ class EventPort(object, metaclass=ABCMeta):
 
 
 class CompositeEventPort(EventPort):
-    """Combine several adapters to the EventPort into one."""
-    def __init__(self, adapters=[]):
+    """Combine several adapters to the EventPort into one.
+
+    An occupation equal to the one passed on last is not passed on again, any
+    other notification makes the adapters receive the next occupation anyway."""
+    _nothing_published = object()
+
+    def __init__(self, adapters=None):
         super(CompositeEventPort, self).__init__()
-        self._adapters = adapters
+        self._adapters = list(adapters) if adapters is not None else []
+        self._lock = threading.Lock()
+        self._last_fingerprint = self._nothing_published
+        self._suppressed_count = 0
+
+    @property
+    def suppressed_count(self):
+        """Number of occupations that were not passed on as nothing changed."""
+        return self._suppressed_count
 
     def add_adapter(self, adapter):
         self._adapters.append(adapter)
+        self._forget_occupation()
+
+    def _forget_occupation(self):
+        with self._lock:
+            self._last_fingerprint = self._nothing_published
 
     def occupation_changed(self, current_occupation):
-        for adapter in self._adapters:
-            adapter.occupation_changed(current_occupation)
+        fingerprint = current_occupation.fingerprint if current_occupation is not None else None
+        with self._lock:
+            if fingerprint == self._last_fingerprint:
+                self._suppressed_count += 1
+                return
+            self._last_fingerprint = fingerprint
+
+        self._notify('occupation_changed', current_occupation)
 
     def no_network_connection(self):
-        for adapter in self._adapters:
-            adapter.no_network_connection()
+        self._forget_occupation()
+        self._notify('no_network_connection')
 
     def incorrect_configuration(self, msg=""):
-        for adapter in self._adapters:
-            adapter.incorrect_configuration(msg)
+        self._forget_occupation()
+        self._notify('incorrect_configuration', msg)
 
     def render_initial_state(self):
         # should be called only once
-        for adapter in self._adapters:
-            adapter.render_initial_state()
+        self._forget_occupation()
+        self._notify('render_initial_state')
 
     def shut_down(self):
+        self._forget_occupation()
+        self._notify('shut_down')
+
+    def _notify(self, method, *args):
+        # a failing adapter must not keep the others from being notified
         for adapter in self._adapters:
-            adapter.shut_down()
+            try:
+                getattr(adapter, method)(*args)
+            except Exception as e:
+                logging.error("CompositeEventPort: %s of %s failed: %s", method, type(adapter).__name__, e)
+
+
+class LoggingEventPort(EventPort):
+    """Headless adapter that logs the occupation of a room, e.g. for a room hub."""
+    def __init__(self, room_id):
+        super(LoggingEventPort, self).__init__()
+        self._room_id = room_id
+
+    def occupation_changed(self, current_occupation):
+        current = current_occupation.current_event
+        upcoming = current_occupation.upcoming_event_today
+        logging.info("Room %s: occupied: %s, current: %s, upcoming: %s", self._room_id, current_occupation.is_occupied,
+                     current.title if current is not None else None, upcoming.title if upcoming is not None else None)
+
+    def no_network_connection(self):
+        logging.warning("Room %s: no network connection", self._room_id)
+
+    def incorrect_configuration(self, msg=""):
+        logging.error("Room %s: incorrect configuration %s", self._room_id, msg)
+
+    def render_initial_state(self):
+        logging.info("Room %s: starting", self._room_id)
+
+    def shut_down(self):
+        logging.info("Room %s: shutting down", self._room_id)
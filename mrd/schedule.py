@@ -0,0 +1,109 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import bisect
+
+
+class DaySchedule(object):
+    """Immutable interval index over the appointments of one day.
+
+    Appointments are kept sorted by start time together with a running index of
+    the appointment that ends latest so far, which answers current/next and
+    conflict queries with a binary search. An appointment occupies the half-open
+    interval [date_from, date_until).
+
+    :param appointments: iterable of `Appointment`.
+    :param valid_from: seconds since epoch from which on the schedule is complete.
+    :param valid_until: seconds since epoch up to which the schedule is complete,
+        usually the end of the day."""
+
+    def __init__(self, appointments, valid_from, valid_until):
+        self._appointments = sorted(appointments, key=lambda a: (a.date_from, a.date_until))
+        self._starts = [a.date_from for a in self._appointments]
+        self._valid_from = valid_from
+        self._valid_until = valid_until
+
+        self._latest_ending = []
+        latest = None
+        for i, appointment in enumerate(self._appointments):
+            if latest is None or appointment.date_until > self._appointments[latest].date_until:
+                latest = i
+            self._latest_ending.append(latest)
+
+    def __len__(self):
+        return len(self._appointments)
+
+    def __iter__(self):
+        return iter(self._appointments)
+
+    @property
+    def valid_from(self):
+        return self._valid_from
+
+    @property
+    def valid_until(self):
+        return self._valid_until
+
+    def with_changes(self, added=(), removed_event_ids=()):
+        """Return a copy with the appointments of `removed_event_ids` removed and `added` added."""
+        removed_event_ids = set(removed_event_ids)
+        appointments = [a for a in self._appointments if a.event_id is None or a.event_id not in removed_event_ids]
+        return DaySchedule(appointments + list(added), self._valid_from, self._valid_until)
+
+    def covers(self, time_in_sec_since_epoch):
+        return self._valid_from <= time_in_sec_since_epoch <= self._valid_until
+
+    def current(self, time_in_sec_since_epoch):
+        """Return the appointment running at the given time, or None."""
+        i = bisect.bisect_right(self._starts, time_in_sec_since_epoch) - 1
+        if i < 0:
+            return None
+
+        appointment = self._appointments[self._latest_ending[i]]
+        return appointment if appointment.date_until > time_in_sec_since_epoch else None
+
+    def upcoming(self, time_in_sec_since_epoch):
+        """Return the next appointment starting after the given time up to `valid_until`, or None."""
+        i = bisect.bisect_right(self._starts, time_in_sec_since_epoch)
+        if i < len(self._appointments) and self._starts[i] <= self._valid_until:
+            return self._appointments[i]
+        return None
+
+    def next_state_changing(self, time_in_sec_since_epoch):
+        """Return the running appointment or, if the room is free, the upcoming one."""
+        current = self.current(time_in_sec_since_epoch)
+        return current if current is not None else self.upcoming(time_in_sec_since_epoch)
+
+    def free_until(self, time_in_sec_since_epoch):
+        """Return until when the room is free, the given time if it is occupied."""
+        if self.current(time_in_sec_since_epoch) is not None:
+            return time_in_sec_since_epoch
+
+        upcoming = self.upcoming(time_in_sec_since_epoch)
+        return upcoming.date_from if upcoming is not None else self._valid_until
+
+    def has_conflict(self, time_from, time_to):
+        """Return True if any appointment overlaps [time_from, time_to)."""
+        i = bisect.bisect_left(self._starts, time_to) - 1
+        if i < 0:
+            return False
+        return self._appointments[self._latest_ending[i]].date_until > time_from
+
+    def conflicts(self, time_from, time_to):
+        """Return all appointments overlapping [time_from, time_to)."""
+        i = bisect.bisect_left(self._starts, time_to)
+        return [a for a in self._appointments[:i] if a.date_until > time_from]
@@ -0,0 +1,62 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+import os
+import time
+
+_imported_at = time.monotonic()
+_logged_frames = set()
+
+
+def _system_uptime():
+    try:
+        with open('/proc/uptime') as uptime_file:
+            return float(uptime_file.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _process_age(uptime):
+    """Seconds since the process was started, falls back to the time since this module was imported."""
+    try:
+        with open('/proc/self/stat') as stat_file:
+            # the command name may contain spaces, the fields after it may not
+            fields = stat_file.read().rsplit(')', 1)[1].split()
+        return uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, TypeError):
+        return time.monotonic() - _imported_at
+
+
+def log_milestone(milestone):
+    """Log how long after process start and system boot `milestone` was reached."""
+    uptime = _system_uptime()
+    if uptime is None:
+        logging.info("Startup: %s after %.2f s", milestone, _process_age(uptime))
+    else:
+        logging.info("Startup: %s after %.2f s, %.2f s since system boot", milestone, _process_age(uptime), uptime)
+
+
+def log_first_frame(occupation):
+    """Log the first provisional and the first live occupation rendered by this process."""
+    if occupation is None:
+        return
+
+    kind = "provisional" if occupation.is_stale else "live"
+    if kind not in _logged_frames:
+        _logged_frames.add(kind)
+        log_milestone("first {0} frame".format(kind))
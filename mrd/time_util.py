@@ -61,3 +61,14 @@ def convert_datetime_to_secs_since_epoch(datetime):
 
 def convert_secs_since_epoch_to_datetime(time_in_sec_since_epoch):
     return datetime.fromtimestamp(time_in_sec_since_epoch)
+
+def get_day_bounds(time_in_sec_since_epoch):
+    """Return the first and the last second of the local day containing the given time."""
+    day = datetime.fromtimestamp(time_in_sec_since_epoch).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = time.mktime(day.timetuple())
+    end = time.mktime(day.replace(hour=23, minute=59, second=59).timetuple())
+    return start, end
+
+def convert_graph_datetime_to_secs_since_epoch(graph_datetime):
+    """Convert a Graph `dateTimeTimeZone` value given in UTC, e.g. '2019-04-25T13:14:15.0000000'."""
+    return calendar.timegm(time.strptime(graph_datetime[:19], '%Y-%m-%dT%H:%M:%S'))
@@ -0,0 +1,213 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+
+from O365.utils import BaseTokenBackend
+
+
+class MemoryTokenBackend(BaseTokenBackend):
+    """O365 token backend that reads the token file once and then serves the
+    token from memory. Saving replaces the file atomically."""
+
+    def __init__(self, token_path):
+        super(MemoryTokenBackend, self).__init__()
+        self._token_path = pathlib.Path(token_path)
+        self._lock = threading.Lock()
+        self._load_count = 0
+        self._save_count = 0
+
+    @property
+    def load_count(self):
+        """Number of times the token file was read."""
+        return self._load_count
+
+    @property
+    def save_count(self):
+        """Number of times the token file was written."""
+        return self._save_count
+
+    def load_token(self):
+        with self._lock:
+            if self.token is not None:
+                return self.token
+            if not self._token_path.exists():
+                return None
+
+            with self._token_path.open('r') as token_file:
+                token = self.token_constructor(self.serializer.load(token_file))
+            self._load_count += 1
+            return token
+
+    def save_token(self):
+        if self.token is None:
+            raise ValueError('You have to set the "token" first.')
+
+        with self._lock:
+            tmp_path = self._token_path.with_suffix('.tmp')
+            with tmp_path.open('w') as token_file:
+                json.dump(self.token, token_file)
+                token_file.flush()
+                os.fsync(token_file.fileno())
+            os.replace(str(tmp_path), str(self._token_path))
+            self._save_count += 1
+
+        return True
+
+    def delete_token(self):
+        with self._lock:
+            self.token = None
+            if self._token_path.exists():
+                self._token_path.unlink()
+                return True
+        return False
+
+    def check_token(self):
+        return self.token is not None or self._token_path.exists()
+
+
+class TokenManager(object):
+    """Keeps the OAuth token in memory and refreshes it on a background thread
+    ahead of its expiry, so calendar requests never wait for a refresh.
+
+    All refreshes of the attached connection, also the ones O365 starts in the
+    middle of a request, are serialised by one lock, a caller that waited for
+    another refresh uses its result instead of refreshing again."""
+    DEFAULT_REFRESH_AHEAD_IN_SECS = 5 * 60
+    DEFAULT_RETRY_INTERVAL_IN_SECS = 60
+
+    _token_path = pathlib.Path() / 'mrd' / 'o365_token.txt'
+    _max_wait_in_secs = 5 * 60
+
+    def __init__(self, token_path=_token_path, refresh_ahead_in_secs=DEFAULT_REFRESH_AHEAD_IN_SECS,
+                 retry_interval_in_secs=DEFAULT_RETRY_INTERVAL_IN_SECS):
+        self._backend = MemoryTokenBackend(token_path)
+        self._refresh_ahead_in_secs = refresh_ahead_in_secs
+        self._retry_interval_in_secs = retry_interval_in_secs
+        self._connection = None
+        self._refresh_lock = threading.RLock()
+        self._not_before = 0
+        self._refresh_count = 0
+        self._failure_count = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='TokenManager', daemon=True)
+
+    @property
+    def backend(self):
+        """The token backend to hand to the O365 `Account`."""
+        return self._backend
+
+    @property
+    def refresh_count(self):
+        return self._refresh_count
+
+    @property
+    def failure_count(self):
+        return self._failure_count
+
+    def attach(self, connection):
+        """Use `connection`, the O365 connection of the current account, for refreshing."""
+        refresh_token = connection.refresh_token
+
+        def serialised_refresh_token():
+            expires_at = self._expires_at()
+            with self._refresh_lock:
+                if self._expires_at() != expires_at and not self._is_access_expired():
+                    # refreshed by another thread while this one waited
+                    return True
+                return refresh_token()
+
+        connection.refresh_token = serialised_refresh_token
+        self._connection = connection
+
+    def ensure_fresh(self, rejected_access_token=None):
+        """Refresh the token if it expired or its access token was rejected, returns False if that failed.
+
+        Safe to call from any thread, e.g. from an executor of the asyncio backend."""
+        with self._refresh_lock:
+            token = self._backend.get_token()
+            if token is not None and not token.is_access_expired \
+                    and token.get('access_token') != rejected_access_token:
+                return True
+            return self.refresh()
+
+    def _expires_at(self):
+        token = self._backend.token
+        return token.get('expires_at') if token is not None else None
+
+    def _is_access_expired(self):
+        token = self._backend.token
+        return token is None or token.is_access_expired
+
+    def seconds_until_expiry(self, now=None):
+        """Seconds until the access token expires, negative if it is expired, None without token."""
+        token = self._backend.get_token()
+        if token is None or not token.get('expires_at'):
+            return None
+        return token['expires_at'] - (time.time() if now is None else now)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _delay_until_refresh(self, now):
+        remaining = self.seconds_until_expiry(now)
+        if remaining is None:
+            delay = self._retry_interval_in_secs
+        else:
+            delay = remaining - self._refresh_ahead_in_secs
+        return max(0, delay, self._not_before - now)
+
+    def _run(self):
+        while not self._stopped.wait(min(self._delay_until_refresh(time.time()), self._max_wait_in_secs)):
+            if self._delay_until_refresh(time.time()) > 0:
+                continue
+            if self._connection is None:
+                # no account built yet
+                self._not_before = time.time() + self._retry_interval_in_secs
+            else:
+                self.refresh()
+
+    def refresh(self):
+        """Refresh the token now, returns False if that failed."""
+        connection = self._connection
+        with self._refresh_lock:
+            try:
+                is_refreshed = connection is not None and connection.refresh_token()
+            except Exception as e:
+                logging.error("TokenManager: refreshing the token failed: %s", e)
+                is_refreshed = False
+
+        if is_refreshed:
+            self._refresh_count += 1
+            self._not_before = 0
+            logging.info("TokenManager: refreshed token, expires in %d s", self.seconds_until_expiry())
+        else:
+            self._failure_count += 1
+            self._not_before = time.time() + self._retry_interval_in_secs
+            logging.warning("TokenManager: token not refreshed, retrying in %d s", self._retry_interval_in_secs)
+
+        return is_refreshed
@@ -21,10 +21,10 @@ import logging
 import os
 import qrcode
 import sys
-import threading
 import time
 
 import mrd.time_util as datetime
+from mrd import startup
 
 formatter = logging.Formatter("[%(asctime)s.%(msecs)03d] [%(levelname)s] %(message)s", "%H:%M:%S")
 console = logging.StreamHandler()
@@ -66,7 +66,7 @@ class ScreenManagement(ScreenManager):
     def __init__(self, app, *args, **kwargs):
         super(ScreenManagement, self).__init__(*args, **kwargs)
         self._app = app
-        self._free_until = 0
+        self._free_until_instant = None
 
     def switch_to(self, screen):
         if self.has_screen(screen):
@@ -77,26 +77,36 @@ class ScreenManagement(ScreenManager):
 
     def book_room_async(self, time_from, time_to):
         logging.info("Book room for {0} minutes".format(datetime.seconds(time_to - time_from)))
-        thread = threading.Thread(target=self._app.book_room, args=(time_from, time_to))
-        thread.start()
-        return thread
+        future = self._app.book_room_async(time_from, time_to)
+        self._report_outcome(future, _("Booking failed"))
+        return future
 
     def cancel_appointment_async(self):
         logging.info("Cancel current ad hoc meeting")
-        thread = threading.Thread(target=self._app.cancel_appointment)
-        thread.start()
+        future = self._app.cancel_appointment_async()
+        self._report_outcome(future, _("Cancellation failed"))
         self.set_password(None)
-        return thread
+        return future
 
-    def set_free_until(self, time_in_sec=3600):
-        self._free_until = time_in_sec
+    def _report_outcome(self, future, failure_msg):
+        # the occupation is already shown optimistically, only the status is pending
+        main_screen = self.get_screen('main_screen')
+        main_screen.show_status(_("saving ..."))
+        future.add_done_callback(lambda f: main_screen.show_outcome(f, failure_msg))
+
+    def set_free_until(self, instant=None):
+        """Remember until when the room is free, None if there is no further event today."""
+        self._free_until_instant = instant
 
     def set_password(self, pw):
         self.get_screen('numpad_screen')._set_password(pw)
 
     @property
     def free_until(self):
-        return self._free_until
+        """Seconds the room is still free, computed when asked as occupations are only sent on changes."""
+        if self._free_until_instant is None:
+            return datetime.minutes(60)
+        return self._free_until_instant - time.time()
 
     @property
     def is_occupied(self):
@@ -195,8 +205,8 @@ class BookingScreen(Screen):
         time_from = time.time()
         time_to = time_from + datetime.minutes(duration)
 
-        # handle information to app
-        self._manager.book_room_async(time_from, time_to).join()
+        # handle information to app, the result is reported on the main screen
+        self._manager.book_room_async(time_from, time_to)
         self._manager.switch_to('main_screen')
 
     def show_flames(self):
@@ -229,7 +239,7 @@ class CancellationScreen(Screen):
         self._manager.switch_to("main_screen")
 
     def cancel_appointment(self):
-        self._manager.cancel_appointment_async().join()
+        self._manager.cancel_appointment_async()
         self._manager.switch_to('main_screen')
 
     def render_screen(self, _):
@@ -243,6 +253,7 @@ class CancellationScreen(Screen):
 
 
 class MainScreen(Screen):
+    STATUS_INTERVAL = 10
     clock_label = ObjectProperty()
     room_free_label = ObjectProperty()
     main_layout = ObjectProperty()
@@ -251,6 +262,7 @@ class MainScreen(Screen):
     touch_image = ObjectProperty()
     capacity_label = ObjectProperty()
     capacity_image = ObjectProperty()
+    status_label = ObjectProperty()
     red = NumericProperty(0)
     green = NumericProperty(0)
     blue = NumericProperty(1)
@@ -272,6 +284,22 @@ class MainScreen(Screen):
     def on_leave(self):
         self._unschedule_clock_interval()
 
+    def show_status(self, text, timeout=None):
+        Clock.unschedule(self._clear_status)
+        self.status_label.text = text
+        if timeout is not None:
+            Clock.schedule_once(self._clear_status, timeout)
+
+    def _clear_status(self, *args):
+        self.status_label.text = ""
+
+    @mainthread
+    def show_outcome(self, future, failure_msg):
+        if future.exception() is None:
+            self.show_status("")
+        else:
+            self.show_status(failure_msg, self.STATUS_INTERVAL)
+
     def update_clock(self, *args):
         self.date_label.text = time.strftime(_("%a, %Y/%m/%d"))
         self.clock_label.text = time.strftime('%H:%M:%S')
@@ -289,9 +317,9 @@ class MainScreen(Screen):
         else:
             date_until = _("until") + " " + time.strftime("%H:%M", time.localtime(occupation.upcoming_event_today.date_from))
             title = occupation.upcoming_event_today.title
-            date_diff = int(occupation.upcoming_event_today.date_from - time.time())
-            self._manager.set_free_until(date_diff - datetime.minutes(1))  # leave one minute as buffer
-            if date_diff <= 15 * 60:
+            # leave one minute as buffer
+            self._manager.set_free_until(occupation.upcoming_event_today.date_from - datetime.minutes(1))
+            if occupation.is_upcoming_soon:
                 self.set_frame_color(1, 0.4, 0)
 
         self.appointment_time_label.text = date_until
@@ -316,6 +344,8 @@ class MainScreen(Screen):
         if not self._manager.is_adhoc:
             self._manager.switch_to(self.name)  # when occupation changes during BookingScreen
             self.display_touch_availability(False)
+        else:
+            self.display_touch_availability(True)
 
     def display_touch_availability(self, roomFreeOrClearable):
         if self._manager.is_adhoc_booking_allowed == "True" and roomFreeOrClearable:
@@ -342,6 +372,10 @@ class MainScreen(Screen):
         else:
             self.display_room_as_free(occupation)
 
+        if occupation is not None and occupation.is_stale:
+            # shown from the cached schedule, booking is not possible while offline
+            self.touch_image.source = "mrd/ui/img/no-wifi.png"
+
     def on_touch_down(self, screen):
         if not self._manager.is_occupied and self._manager.is_connected_to_network:
             logging.info("MainScreen received touch down, booking adhoc allowed: %s", self._manager.is_adhoc_booking_allowed)
@@ -547,6 +581,7 @@ class KivyUI(App):
             self._hide_flames()
             self._set_screen_labels(self.rooms_app.get_room_name())
         self.screen.render_screen(occupation)
+        startup.log_first_frame(occupation)
 
     @mainthread
     def no_network_connection(self):
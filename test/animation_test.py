@@ -0,0 +1,148 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import time
+import unittest
+from mock import MagicMock
+
+from mrd.backlight import animation
+from mrd.backlight.animation import pack_color
+from mrd.backlight.backlight_wrapper import FrameBuffer
+
+
+def frame_of(frame_buffer):
+    return list(frame_buffer._frame)
+
+
+class LookupTableTests(unittest.TestCase):
+
+    def test__gamma__keeps_end_points(self):
+        self.assertEqual(animation.GAMMA[0], 0)
+        self.assertEqual(animation.GAMMA[255], 255)
+
+    def test__brightness_table__spans_off_to_full(self):
+        table = animation.brightness_table((255, 95, 0))
+
+        self.assertEqual(table[0], 0)
+        self.assertEqual(table[255], pack_color(255, animation.GAMMA[95], 0))
+
+    def test__rainbow_frame__starts_with_red(self):
+        frame = animation.rainbow_frame(16)
+
+        self.assertEqual(len(frame), 16)
+        self.assertEqual(frame[0], pack_color(255, 0, 0))
+
+
+class EffectTests(unittest.TestCase):
+
+    def setUp(self):
+        self.frame_buffer = FrameBuffer(MagicMock(), 4)
+
+    def test__breathing__is_dim_at_start_and_bright_at_half_period(self):
+        effect = animation.Breathing((255, 0, 0), period_in_secs=2.0)
+
+        effect.draw(self.frame_buffer, 0)
+        dim = frame_of(self.frame_buffer)
+        effect.draw(self.frame_buffer, 1.0)
+        bright = frame_of(self.frame_buffer)
+
+        self.assertLess(dim[0], bright[0])
+        self.assertEqual(bright, [pack_color(255, 0, 0)] * 4)
+
+    def test__breathing__repeats_after_period(self):
+        effect = animation.Breathing((255, 0, 0), period_in_secs=2.0)
+
+        effect.draw(self.frame_buffer, 0.5)
+        first = frame_of(self.frame_buffer)
+        effect.draw(self.frame_buffer, 2.5)
+
+        self.assertEqual(frame_of(self.frame_buffer), first)
+
+    def test__progress__lights_remaining_share(self):
+        effect = animation.Progress((255, 0, 0), 1000, 4600, clock=lambda: 2800)
+
+        effect.draw(self.frame_buffer, 0)
+
+        self.assertEqual(frame_of(self.frame_buffer), [pack_color(255, 0, 0)] * 2 + [0] * 2)
+
+    def test__progress__counts_down_on_wall_clock(self):
+        now = [1000]
+        effect = animation.Progress((255, 0, 0), 1000, 4600, clock=lambda: now[0])
+
+        now[0] = 3700
+        effect.draw(self.frame_buffer, 0)
+
+        self.assertEqual(frame_of(self.frame_buffer), [pack_color(255, 0, 0)] + [0] * 3)
+
+    def test__progress__after_end__is_off(self):
+        effect = animation.Progress((255, 0, 0), 1000, 1060, clock=lambda: 1120)
+
+        effect.draw(self.frame_buffer, 0)
+
+        self.assertEqual(frame_of(self.frame_buffer), [0] * 4)
+
+    def test__pulse__fades_out(self):
+        effect = animation.Pulse((255, 255, 255), duration_in_secs=1.0)
+
+        effect.draw(self.frame_buffer, 0)
+        self.assertEqual(frame_of(self.frame_buffer), [pack_color(255, 255, 255)] * 4)
+        effect.draw(self.frame_buffer, 1.0)
+        self.assertEqual(frame_of(self.frame_buffer), [0] * 4)
+
+
+class AnimationEngineTests(unittest.TestCase):
+
+    def setUp(self):
+        self.strip = MagicMock()
+        self.frame_buffer = FrameBuffer(self.strip, 4)
+        self.engine = animation.AnimationEngine(self.frame_buffer)
+
+    def tearDown(self):
+        self.engine.close(timeout=1)
+
+    def test__play__static__draws_immediately_and_idles(self):
+        self.engine.play(animation.Static((0, 255, 0)))
+        time.sleep(.1)
+
+        self.assertEqual(frame_of(self.frame_buffer), [pack_color(0, 255, 0)] * 4)
+        self.strip.show.assert_called_once_with()
+        self.assertEqual(self.engine.stats.frames, 0)
+
+    def test__play__breathing__renders_frames(self):
+        self.engine.play(animation.Breathing((255, 0, 0), period_in_secs=0.2))
+        time.sleep(.3)
+
+        self.assertGreater(self.engine.stats.frames, 3)
+        self.assertGreater(self.strip.show.call_count, 3)
+
+    def test__flash__returns_to_running_effect(self):
+        self.engine.play(animation.Static((0, 255, 0)))
+
+        self.engine.flash(animation.Pulse((255, 255, 255), duration_in_secs=0.1))
+        self.assertEqual(frame_of(self.frame_buffer), [pack_color(255, 255, 255)] * 4)
+        time.sleep(.3)
+
+        self.assertEqual(frame_of(self.frame_buffer), [pack_color(0, 255, 0)] * 4)
+
+    def test__frame_stats__averages_jitter(self):
+        stats = animation.FrameStats()
+        stats.add(0.002)
+        stats.add(0.004)
+
+        self.assertEqual(stats.frames, 2)
+        self.assertAlmostEqual(stats.mean_jitter_in_secs, 0.003)
+        self.assertAlmostEqual(stats.max_jitter_in_secs, 0.004)
@@ -15,6 +15,7 @@
 # You should have received a copy of the GNU General Public License along with
 # Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
 
+import threading
 import unittest
 import time
 from mock import MagicMock
@@ -22,6 +23,7 @@ from mock import MagicMock
 
 import mrd.app
 from mrd.rooms import RoomInformation, EventPort, Occupation, Appointment
+from mrd.schedule import DaySchedule
 import mrd.mocks.room_mock as rooms
 import mrd.mocks.outlook_mock as outlook
 
@@ -118,3 +120,214 @@ class MeetingRoomAppTests(unittest.TestCase):
         self.assertFalse(occupation.is_occupied)
         self.assertIsNone(occupation.current_event)
         self.assertIsNotNone(occupation.upcoming_event_today)
+
+
+class MeetingRoomAppSchedulingTests(unittest.TestCase):
+    def setUp(self):
+        self.now = time.time()
+        self.backend = MagicMock()
+        self.backend.get_next_state_changing_appointment_up_to_midnight.return_value = None
+        self.backend.book_room.return_value = None
+        self.event_port = MagicMock()
+        self.app = mrd.app.MeetingRoomApp(self.backend, None, self.event_port, network.AlwaysConnected())
+
+    def test__next_state_change__upcoming_appointment__returns_warning_instant(self):
+        appointment = Appointment(self.now + 3600, self.now + 7200, "title", 1)
+
+        instant = mrd.app.next_state_change(appointment, self.now)
+
+        self.assertEqual(instant, appointment.date_from - mrd.app.UPCOMING_WARNING_IN_SECS)
+
+    def test__next_state_change__running_appointment__returns_end(self):
+        appointment = Appointment(self.now - 60, self.now + 60, "title", 1)
+
+        self.assertEqual(mrd.app.next_state_change(appointment, self.now), appointment.date_until)
+
+    def test__to_occupation__given_time__decides_against_it(self):
+        appointment = Appointment(1000, 2000, 'title', 1)
+
+        self.assertIsNotNone(mrd.app.to_occupation(appointment, now=999).upcoming_event_today)
+        self.assertIsNotNone(mrd.app.to_occupation(appointment, now=1000).current_event)
+
+    def test__to_occupation__upcoming_within_warning_period__is_upcoming_soon(self):
+        appointment = Appointment(self.now + 60, self.now + 120, 'title', 1)
+
+        self.assertTrue(mrd.app.to_occupation(appointment, now=self.now).is_upcoming_soon)
+        self.assertFalse(mrd.app.to_occupation(appointment, now=self.now - 3600).is_upcoming_soon)
+
+    def test__run_due_tasks__two_apps__keep_their_own_appointment(self):
+        other_backend = MagicMock()
+        other_backend.get_next_state_changing_appointment_up_to_midnight.return_value = \
+            Appointment(self.now - 60, self.now + 60, "title", 1)
+        other_app = mrd.app.MeetingRoomApp(other_backend, None, MagicMock(), network.AlwaysConnected())
+
+        other_app._run_due_tasks(self.now)
+        self.app._run_due_tasks(self.now)
+
+        self.assertIsNone(self.app.appointment)
+        self.assertEqual(other_app.appointment.title, "title")
+
+    def test__run_due_tasks__poll_due__fetches_and_returns_next_poll(self):
+        deadline = self.app._run_due_tasks(self.now)
+
+        self.event_port.occupation_changed.assert_called_once()
+        self.assertEqual(deadline, self.now + self.app._poll_policy.next_interval(self.now))
+
+    def test__run_due_tasks__appointment_starts_before_next_poll__returns_start(self):
+        start = self.now + 5
+        self.backend.get_next_state_changing_appointment_up_to_midnight.return_value = Appointment(start, start + 60, "title", 1)
+        self.app._next_state_change_at = None
+        self.app._next_poll_at = 0
+
+        deadline = self.app._run_due_tasks(self.now)
+
+        self.assertEqual(deadline, start)
+
+    def test__run_due_tasks__nothing_due__does_not_notify(self):
+        self.app._run_due_tasks(self.now)
+        self.app._run_due_tasks(self.now + 1)
+
+        self.event_port.occupation_changed.assert_called_once()
+
+    def test__book_room__polls_fast_afterwards(self):
+        self.app._run_due_tasks(self.now)
+        self.app.book_room(self.now, self.now + 1800)
+
+        self.assertTrue(self.app._wakeup.is_set())
+        deadline = self.app._run_due_tasks(self.now + 1)
+        self.assertLessEqual(deadline, time.time() + self.app._poll_policy.fast_interval_in_secs)
+
+    def test__book_room__does_not_write_next_poll_from_the_worker(self):
+        self.app._run_due_tasks(self.now)
+        next_poll_at = self.app._next_poll_at
+
+        self.app.book_room(self.now, self.now + 1800)
+
+        self.assertEqual(self.app._next_poll_at, next_poll_at)
+
+    def test__on_exit__interrupts_wait(self):
+        waiter = threading.Thread(target=self.app._wait_until, args=(time.time() + 60,))
+        waiter.start()
+
+        self.app.on_exit()
+        waiter.join(1)
+
+        self.assertFalse(waiter.is_alive())
+
+    def test__book_room_async__returns_future_of_backend_appointment(self):
+        booked = Appointment(self.now, self.now + 1800, "Ad-hoc Meeting", 0, True)
+        self.backend.book_room.return_value = booked
+
+        future = self.app.book_room_async(self.now, self.now + 1800)
+
+        self.assertIs(future.result(1), booked)
+        self.app.on_exit()
+
+    def test__book_room_async__publishes_occupied_before_backend_replies(self):
+        replied = threading.Event()
+        self.backend.book_room.side_effect = lambda time_from, time_to: replied.wait(1) and None
+
+        future = self.app.book_room_async(self.now, self.now + 1800)
+
+        occupation = self.event_port.occupation_changed.call_args_list[0][0][0]
+        self.assertTrue(occupation.is_occupied)
+        self.assertTrue(self.app.is_occupied())
+        replied.set()
+        future.result(1)
+        self.app.on_exit()
+
+    def test__book_room_async__backend_fails__rolls_back(self):
+        self.backend.book_room.side_effect = IOError("no route to host")
+
+        future = self.app.book_room_async(self.now, self.now + 1800)
+
+        self.assertRaises(IOError, future.result, 1)
+        self.assertFalse(self.app.is_occupied())
+        self.assertFalse(self.event_port.occupation_changed.call_args[0][0].is_occupied)
+        self.app.on_exit()
+
+    def test__book_room__booked_appointment__is_published_without_refetch(self):
+        booked = Appointment(self.now, self.now + 1800, "Ad-hoc Meeting", 0, True, "event-1")
+        self.backend.book_room.return_value = booked
+
+        self.app.book_room(self.now, self.now + 1800)
+
+        self.backend.get_next_state_changing_appointment_up_to_midnight.assert_not_called()
+        self.assertIs(self.event_port.occupation_changed.call_args[0][0].current_event, booked)
+
+    def test__run_due_tasks__offline_with_known_schedule__shows_stale_occupation(self):
+        meeting = Appointment(self.now - 60, self.now + 60, "title", 1)
+        self.app._day_schedule = DaySchedule([meeting], self.now - 3600, self.now + 3600)
+        self.app.network = MagicMock()
+        self.app.network.is_connected.return_value = False
+
+        deadline = self.app._run_due_tasks(self.now)
+
+        occupation = self.event_port.occupation_changed.call_args[0][0]
+        self.assertIs(occupation.current_event, meeting)
+        self.assertTrue(occupation.is_stale)
+        self.event_port.no_network_connection.assert_not_called()
+        self.assertEqual(deadline, self.now + mrd.app.CHECK_STATUS_TIMEOUT_IN_SECS)
+
+    def test__run_due_tasks__backend_fails_with_known_schedule__continues_offline(self):
+        self.app._day_schedule = DaySchedule([], self.now - 3600, self.now + 3600)
+        self.backend.get_next_state_changing_appointment_up_to_midnight.side_effect = IOError("timeout")
+
+        self.app._run_due_tasks(self.now)
+
+        self.assertTrue(self.event_port.occupation_changed.call_args[0][0].is_stale)
+
+    def test__run_due_tasks__reconnected__reconciles_with_calendar(self):
+        self.app._is_stale = True
+        self.backend.get_day_schedule.return_value = DaySchedule([], self.now, self.now + 3600)
+
+        self.app._run_due_tasks(self.now)
+
+        self.assertFalse(self.event_port.occupation_changed.call_args[0][0].is_stale)
+        self.assertIs(self.app._day_schedule, self.backend.get_day_schedule.return_value)
+
+    def test__run__with_cached_schedule__renders_provisional_state_before_calendar_is_reachable(self):
+        reachable = threading.Event()
+        self.backend.fetch_calendar.side_effect = lambda: reachable.wait(1)
+        room_information = RoomInformation("dummy@example.org", "Room 1", "", "False", "False", "", "id", "secret")
+        app = mrd.app.MeetingRoomApp(self.backend, room_information, self.event_port, network.AlwaysConnected())
+        app._day_schedule = DaySchedule([], self.now - 60, self.now + 3600)
+        app._admin_detected_on_startup = MagicMock(return_value=False)
+
+        app.start()
+        self.addCleanup(app.join, 1)
+        self.addCleanup(app.on_exit)
+        for _ in range(100):
+            if self.event_port.occupation_changed.called:
+                break
+            time.sleep(0.01)
+
+        self.assertTrue(self.event_port.occupation_changed.call_args[0][0].is_stale)
+        self.event_port.render_initial_state.assert_called_once()
+        reachable.set()
+
+    def _time_to_first_frame(self, day_schedule, round_trip_in_secs):
+        """Start an app against a calendar answering after `round_trip_in_secs`, return when it first rendered."""
+        self.backend.fetch_calendar.side_effect = lambda: time.sleep(round_trip_in_secs)
+        event_port = MagicMock()
+        first_frame = threading.Event()
+        event_port.occupation_changed.side_effect = lambda occupation: first_frame.set()
+        room_information = RoomInformation("dummy@example.org", "Room 1", "", "False", "False", "", "id", "secret")
+        app = mrd.app.MeetingRoomApp(self.backend, room_information, event_port, network.AlwaysConnected())
+        app._day_schedule = day_schedule
+        app._admin_detected_on_startup = MagicMock(return_value=False)
+
+        started_at = time.monotonic()
+        app.start()
+        self.addCleanup(app.join, 1)
+        self.addCleanup(app.on_exit)
+        self.assertTrue(first_frame.wait(2))
+        return time.monotonic() - started_at
+
+    def test__run__warm_start__first_frame_does_not_wait_for_calendar_round_trip(self):
+        round_trip_in_secs = 0.3
+        cold = self._time_to_first_frame(None, round_trip_in_secs)
+        warm = self._time_to_first_frame(DaySchedule([], self.now - 60, self.now + 3600), round_trip_in_secs)
+
+        self.assertGreaterEqual(cold, round_trip_in_secs)
+        self.assertLess(warm, round_trip_in_secs / 2)
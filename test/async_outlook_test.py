@@ -0,0 +1,204 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+import unittest
+from mock import MagicMock
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from mrd.async_engine import AsyncEngine, BlockingRoomRepository
+from mrd.async_outlook import AsyncOutlookRoomRepository
+from mrd.mocks import graph_payloads
+
+
+class AsyncOutlookRoomRepositoryTest(unittest.TestCase):
+    id = "dummy_room@example.org"
+
+    def setUp(self):
+        self.now = int(time.time())
+        self.session = MagicMock()
+        self.session.account.con.token_backend.token = MagicMock(is_access_expired=False)
+        self.session.account.con.token_backend.token.__getitem__.return_value = 'token-1'
+        self.repository = AsyncOutlookRoomRepository(self.id, "client_id", "client_secret", session=self.session)
+
+    def _record(self, id, start, end, subject="Mock Appointment", organizer="someone@example.org"):
+        return {'id': id, 'start': start, 'end': end, 'subject': subject, 'organizer': organizer, 'num_attendees': 1}
+
+    def test__get_appointment__concurrent_calls__fetch_once(self):
+        fetches = []
+
+        async def fetch_records(time_from, midnight):
+            fetches.append(time_from)
+            await asyncio.sleep(0.01)
+            return [self._record('1', self.now - 60, self.now + 60)]
+
+        self.repository._fetch_records = fetch_records
+
+        async def run():
+            return await asyncio.gather(
+                self.repository.get_next_state_changing_appointment_up_to_midnight(self.now),
+                self.repository.get_next_state_changing_appointment_up_to_midnight(self.now))
+
+        appointments = asyncio.run(run())
+
+        self.assertEqual(len(fetches), 1)
+        self.assertEqual([a.title for a in appointments], ["Mock Appointment"] * 2)
+
+    def test__fetch_records__next_link__fetches_all_pages(self):
+        next_link = 'https://graph.example.org/v1.0/me/calendarView?$skip=50'
+        pages = {
+            '/calendar/calendarView': {'value': [graph_payloads.make_event('1', self.now, self.now + 60)],
+                                       '@odata.nextLink': next_link},
+            next_link: {'value': [graph_payloads.make_event('2', self.now + 60, self.now + 120)]},
+        }
+        requests = []
+
+        async def request(method, endpoint, params=None, json=None, headers=None):
+            requests.append((endpoint, params))
+            return pages[endpoint]
+
+        self.repository._request = request
+
+        records = asyncio.run(self.repository._fetch_records(self.now, self.now + 3600))
+
+        self.assertEqual([r['id'] for r in records], ['1', '2'])
+        self.assertIsNone(requests[1][1])
+
+    def test__cancel_running_adhoc_meeting__just_started__deletes_event(self):
+        requests = []
+
+        async def fetch_records(time_from, midnight):
+            return [self._record('1', self.now - 10, self.now + 600, AsyncOutlookRoomRepository._ad_hoc_subject, self.id)]
+
+        async def request(method, endpoint, params=None, json=None, headers=None):
+            requests.append((method, endpoint))
+
+        self.repository._fetch_records = fetch_records
+        self.repository._request = request
+
+        asyncio.run(self.repository.cancel_running_adhoc_meeting())
+
+        self.assertEqual(requests, [('DELETE', '/events/1')])
+
+    def test__request__unauthorized__refreshes_token_and_retries(self):
+        authorizations = []
+
+        async def events(request):
+            authorizations.append(request.headers['Authorization'])
+            if len(authorizations) == 1:
+                return web.Response(status=401)
+            return web.json_response({'value': [graph_payloads.make_event('1', self.now, self.now + 60)]})
+
+        def refresh_token():
+            self.session.account.con.token_backend.token.__getitem__.return_value = 'token-2'
+            return True
+
+        self.session.account.con.refresh_token.side_effect = refresh_token
+
+        async def run():
+            app = web.Application()
+            app.router.add_get('/me/calendar/calendarView', events)
+            async with TestServer(app) as server:
+                self.session.account.protocol.service_url = str(server.make_url('/'))
+                try:
+                    return await self.repository._fetch_records(self.now, self.now + 3600)
+                finally:
+                    await self.repository.close()
+
+        records = asyncio.run(run())
+
+        self.assertEqual(authorizations, ['Bearer token-1', 'Bearer token-2'])
+        self.assertEqual([r['id'] for r in records], ['1'])
+
+    def test__request__resolves_account_off_the_event_loop(self):
+        account = self.session.account
+        threads = []
+
+        class RecordingSession(object):
+            @property
+            def account(self):
+                threads.append(threading.current_thread())
+                return account
+
+        self.repository._session = RecordingSession()
+
+        async def events(request):
+            return web.json_response({'value': []})
+
+        async def run():
+            app = web.Application()
+            app.router.add_get('/me/calendar/calendarView', events)
+            async with TestServer(app) as server:
+                account.protocol.service_url = str(server.make_url('/'))
+                try:
+                    return await self.repository._fetch_records(self.now, self.now + 3600)
+                finally:
+                    await self.repository.close()
+
+        asyncio.run(run())
+
+        self.assertTrue(threads)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test__request_context__rejected_with_token_manager__refreshes_through_manager(self):
+        token_manager = MagicMock()
+        token_manager.ensure_fresh.return_value = True
+        repository = AsyncOutlookRoomRepository(self.id, "client_id", "client_secret", session=self.session,
+                                                token_manager=token_manager)
+
+        repository._request_context(rejected_access_token='token-1')
+
+        token_manager.ensure_fresh.assert_called_once_with('token-1')
+        self.session.account.con.refresh_token.assert_not_called()
+
+
+class AsyncEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = AsyncEngine()
+        self.engine.start()
+        self.addCleanup(self.engine.stop)
+
+    def test__call__timeout__cancels_coroutine(self):
+        cancelled = concurrent.futures.Future()
+
+        async def hang():
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set_result(True)
+                raise
+
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            self.engine.call(hang(), 0.05)
+
+        self.assertTrue(cancelled.result(1))
+
+    def test__blocking_room_repository__book_room__returns_result_of_coroutine(self):
+        repository = MagicMock()
+
+        async def book_room(time_from, time_to):
+            return (time_from, time_to)
+
+        repository.book_room = book_room
+
+        self.assertEqual(BlockingRoomRepository(repository, self.engine).book_room(1, 2), (1, 2))
+
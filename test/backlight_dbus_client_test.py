@@ -0,0 +1,115 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import threading
+import time
+import unittest
+from mock import MagicMock
+
+from mrd import metrics
+
+try:
+    from mrd.backlight.dbus_client import AsyncBackLightDbusClient
+except ImportError:
+    AsyncBackLightDbusClient = None
+
+
+def wait_for(condition, timeout_in_secs=2):
+    deadline = time.monotonic() + timeout_in_secs
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(.01)
+    return condition()
+
+
+@unittest.skipIf(AsyncBackLightDbusClient is None, 'skipping tests that require pydbus')
+class AsyncBackLightDbusClientTest(unittest.TestCase):
+
+    def setUp(self):
+        AsyncBackLightDbusClient.MIN_REBIND_DELAY_IN_SECS = 0.05
+        self.service = MagicMock()
+        self.bind = MagicMock(return_value=self.service)
+        self.registry = metrics.Registry()
+        self.client = AsyncBackLightDbusClient(self.bind, self.registry)
+
+    def tearDown(self):
+        self.client.close(timeout_in_secs=1)
+        AsyncBackLightDbusClient.MIN_REBIND_DELAY_IN_SECS = 1
+
+    def test__publish__calls_service_in_background(self):
+        self.client.publish(b'state')
+
+        self.assertTrue(wait_for(lambda: self.client.delivered_count == 1))
+        self.service.set_state.assert_called_once_with(b'state', timeout=AsyncBackLightDbusClient.CALL_TIMEOUT_IN_SECS)
+        self.assertEqual(self.registry.backlight_call_duration.count(transport='dbus'), 1)
+
+    def test__publish__while_call_hangs__does_not_block_and_keeps_latest(self):
+        release = threading.Event()
+        self.service.set_state.side_effect = lambda dumps, timeout: release.wait()
+        self.client.publish(b'first')
+        self.assertTrue(wait_for(lambda: self.service.set_state.call_count == 1))
+
+        started_at = time.monotonic()
+        self.client.publish(b'second')
+        self.client.publish(b'third')
+        self.assertLess(time.monotonic() - started_at, .1)
+
+        release.set()
+        self.assertTrue(wait_for(lambda: self.client.delivered_count == 2))
+        self.assertEqual(self.service.set_state.call_args[0][0], b'third')
+        self.assertEqual(self.client.superseded_count, 1)
+
+    def test__publish__service_gone__rebinds_and_delivers(self):
+        self.service.set_state.side_effect = [RuntimeError("service gone"), None]
+
+        self.client.publish(b'state')
+
+        self.assertTrue(wait_for(lambda: self.client.delivered_count == 1))
+        self.assertEqual(self.bind.call_count, 2)
+        self.assertEqual(self.client.failure_count, 1)
+        self.assertEqual(self.registry.backlight_call_failures.value(kind='error', transport='dbus'), 1)
+
+    def test__publish__service_not_started_yet__binds_later(self):
+        self.bind.side_effect = [RuntimeError("no such service"), self.service]
+
+        self.client.publish(b'state')
+
+        self.assertTrue(wait_for(lambda: self.client.delivered_count == 1))
+        self.assertTrue(self.client.is_bound)
+        self.assertEqual(self.registry.backlight_call_failures.value(kind='unavailable', transport='dbus'), 1)
+
+    def test__close__delivers_pending_state(self):
+        release = threading.Event()
+        self.service.set_state.side_effect = lambda dumps, timeout: release.wait()
+        self.client.publish(b'state')
+        self.assertTrue(wait_for(lambda: self.service.set_state.call_count == 1))
+        self.client.publish(b'quit')
+
+        release.set()
+        self.client.close(timeout_in_secs=1)
+
+        self.assertEqual(self.service.set_state.call_args[0][0], b'quit')
+        self.assertEqual(self.client.delivered_count, 2)
+
+    def test__close__service_gone__gives_up_after_one_attempt(self):
+        self.bind.side_effect = RuntimeError("no such service")
+        self.client.close(timeout_in_secs=1)
+        self.client = AsyncBackLightDbusClient(self.bind, self.registry)
+
+        self.client.publish(b'quit')
+        self.client.close(timeout_in_secs=1)
+
+        self.assertFalse(self.client._thread.is_alive())
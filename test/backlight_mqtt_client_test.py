@@ -0,0 +1,118 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+from mock import MagicMock
+
+from mrd import metrics
+
+try:
+    import paho.mqtt.client as mqtt
+    from mrd.backlight.mqtt_client import BackLightMqttClient, BASE_URL, TOPIC
+except ImportError:
+    mqtt = None
+
+
+@unittest.skipIf(mqtt is None, 'skipping tests that require paho-mqtt')
+class BackLightMqttClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.paho = MagicMock()
+        self.paho.publish.return_value.rc = mqtt.MQTT_ERR_SUCCESS
+        self.paho.publish.return_value.mid = 1
+        self.registry = metrics.Registry()
+        self.client = BackLightMqttClient(client=self.paho, registry=self.registry)
+
+    def connect(self):
+        self.paho.on_connect(self.paho, None, {}, 0)
+
+    def test__init__starts_network_loop_without_blocking(self):
+        self.paho.connect_async.assert_called_once()
+        self.paho.loop_start.assert_called_once_with()
+        self.paho.reconnect_delay_set.assert_called_once()
+
+    def test__publish__connected__publishes_retained(self):
+        self.connect()
+
+        self.client.publish(b'state')
+
+        self.paho.publish.assert_called_once_with(BASE_URL + TOPIC, b'state', qos=1, retain=True)
+
+    def test__publish__disconnected__sends_latest_state_on_connect(self):
+        self.client.publish(b'first')
+        self.client.publish(b'second')
+        self.paho.publish.assert_not_called()
+
+        self.connect()
+
+        self.paho.publish.assert_called_once_with(BASE_URL + TOPIC, b'second', qos=1, retain=True)
+        self.assertEqual(self.client.coalesced_count, 1)
+
+    def test__publish__after_disconnect__waits_for_reconnect(self):
+        self.connect()
+        self.paho.on_disconnect(self.paho, None, 1)
+
+        self.client.publish(b'state')
+        self.paho.publish.assert_not_called()
+
+        self.connect()
+        self.paho.publish.assert_called_once_with(BASE_URL + TOPIC, b'state', qos=1, retain=True)
+
+    def test__publish__failed__is_retried_after_reconnect(self):
+        self.connect()
+        self.paho.publish.return_value.rc = mqtt.MQTT_ERR_NO_CONN
+        self.client.publish(b'state')
+        self.paho.publish.return_value.rc = mqtt.MQTT_ERR_SUCCESS
+
+        self.connect()
+
+        self.assertEqual(self.paho.publish.call_count, 2)
+
+    def test__on_publish__observes_round_trip(self):
+        self.connect()
+        self.client.publish(b'state')
+
+        self.paho.on_publish(self.paho, None, 1)
+
+        self.assertEqual(self.registry.backlight_call_duration.count(transport='mqtt'), 1)
+
+    def test__close__waits_for_acknowledgement_of_last_state(self):
+        self.connect()
+        self.client.publish(b'quit')
+        self.paho.publish.return_value.is_published.side_effect = [False, True]
+
+        self.client.close(timeout_in_secs=1)
+
+        self.assertEqual(self.paho.publish.return_value.is_published.call_count, 2)
+        self.paho.disconnect.assert_called_once_with()
+        self.paho.loop_stop.assert_called_once_with()
+
+    def test__close__unacknowledged__gives_up_after_timeout(self):
+        self.connect()
+        self.client.publish(b'quit')
+        self.paho.publish.return_value.is_published.return_value = False
+
+        self.client.close(timeout_in_secs=0.05)
+
+        self.paho.loop_stop.assert_called_once_with()
+
+    def test__on_disconnect__unexpected__counts_failure(self):
+        self.connect()
+
+        self.paho.on_disconnect(self.paho, None, 1)
+
+        self.assertEqual(self.registry.backlight_call_failures.value(kind='unavailable', transport='mqtt'), 1)
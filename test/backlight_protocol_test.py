@@ -0,0 +1,124 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+
+from mrd.backlight import protocol
+
+
+class BacklightProtocolTests(unittest.TestCase):
+
+    def test__encode__rgb__is_fixed_size(self):
+        data = protocol.encode('rgb', (255, 95, 0), sequence=7)
+
+        self.assertEqual(len(data), protocol.MESSAGE_SIZE)
+        self.assertEqual(data[0], protocol.VERSION)
+
+    def test__decode__rgb__round_trips(self):
+        message = protocol.decode(protocol.encode('rgb', (255, 95, 0), sequence=7))
+
+        self.assertEqual(message.name, 'rgb')
+        self.assertEqual(message.rgb, (255, 95, 0))
+        self.assertEqual(message.effect, protocol.EFFECT_NONE)
+        self.assertEqual(message.sequence, 7)
+
+    def test__decode__progress__round_trips_effect_times(self):
+        message = protocol.decode(protocol.encode('rgb', (255, 0, 0), protocol.EFFECT_PROGRESS, 3,
+                                                  1546300800.5, 1546387200))
+
+        self.assertEqual(message.effect, protocol.EFFECT_PROGRESS)
+        self.assertEqual(message.start, 1546300800)
+        self.assertEqual(message.end, 1546387200)
+
+    def test__decode__pulse_flag__is_kept_apart_from_effect(self):
+        message = protocol.decode(protocol.encode('rgb', (255, 0, 0), protocol.EFFECT_PROGRESS, 3, 1, 2, pulse=True))
+
+        self.assertEqual(message.effect, protocol.EFFECT_PROGRESS)
+        self.assertTrue(message.pulse)
+
+    def test__encode__negative_time__raises(self):
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.encode('rgb', (255, 0, 0), protocol.EFFECT_PROGRESS, start=-1)
+
+    def test__decode__version_1__is_accepted(self):
+        message = protocol.decode(b'\x01\x01\x00\xff\x00\x00\x00\x00\x00\x05')
+
+        self.assertEqual(message.name, 'rgb')
+        self.assertEqual(message.rgb, (0, 255, 0))
+        self.assertEqual(message.sequence, 5)
+        self.assertEqual(message.end, 0)
+
+    def test__decode__clear__has_no_rgb(self):
+        message = protocol.decode(protocol.encode('clear'))
+
+        self.assertEqual(message.name, 'clear')
+        self.assertIsNone(message.rgb)
+
+    def test__decode__quit_as_list_of_bytes__round_trips(self):
+        # pydbus hands over an `ay` argument as list of ints
+        message = protocol.decode(list(protocol.encode('quit')))
+
+        self.assertEqual(message.name, 'quit')
+
+    def test__encode__unknown_state__raises(self):
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.encode('disco')
+
+    def test__decode__other_version__raises(self):
+        data = bytearray(protocol.encode('clear'))
+        data[0] = protocol.VERSION + 1
+
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode(data)
+
+    def test__decode__pickled_payload__raises(self):
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode(b'\x80\x04\x95\x1d\x00\x00\x00\x00\x00\x00\x00}\x94\x8c\x04name\x94\x8c\x04quit\x94s.')
+
+    def test__decode__truncated_message__raises(self):
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode(protocol.encode('clear')[:-1])
+
+    def test__decode__unknown_kind__raises(self):
+        data = bytearray(protocol.encode('clear'))
+        data[1] = 99
+
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode(data)
+
+
+class ReceiverTests(unittest.TestCase):
+
+    def setUp(self):
+        self.receiver = protocol.Receiver()
+
+    def test__receive__redelivered_message__is_ignored(self):
+        data = protocol.encode('rgb', (0, 255, 0), sequence=1)
+
+        self.assertEqual(self.receiver.receive(data).rgb, (0, 255, 0))
+        self.assertIsNone(self.receiver.receive(data))
+
+    def test__receive__restarted_sender__is_accepted(self):
+        self.receiver.receive(protocol.encode('rgb', (0, 255, 0), sequence=42))
+
+        message = self.receiver.receive(protocol.encode('rgb', (255, 0, 0), sequence=1))
+
+        self.assertEqual(message.rgb, (255, 0, 0))
+
+    def test__receive__garbage__is_ignored(self):
+        self.assertIsNone(self.receiver.receive(b'garbage'))
+
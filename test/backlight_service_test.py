@@ -16,7 +16,6 @@
 # Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
 
 import unittest
-import pickle
 import logging
 import time
 import _thread
@@ -24,7 +23,8 @@ import paho.mqtt.client as mqtt
 
 from mrd.backlight.mqtt_service import BackLightMqttService
 from mrd.backlight.backlight_wrapper import LEDState, BacklightMock
-from mrd.backlight.backlight import BASE_URL, TOPIC
+from mrd.backlight import protocol
+from mrd.backlight.mqtt_client import BASE_URL, TOPIC
 
 # logging.basicConfig(level=logging.INFO,
 #                     format='%(asctime)s %(levelname)s %(message)s',
@@ -80,10 +80,7 @@ class BacklightServiceTest(unittest.TestCase):
 
         name = 'rgb'
         rgb = (0, 255, 0)
-        event = {'name': name, 'rgb': rgb}
-
-        dumps = pickle.dumps(event)
-        client.publish(url, dumps)
+        client.publish(url, protocol.encode(name, rgb))
         time.sleep(.1)
 
         self.assertEqual(self.port.unicorn.state.name, name)
@@ -101,10 +98,7 @@ class BacklightServiceTest(unittest.TestCase):
 
         name = 'clear'
         rgb = None
-        event = {'name': name, 'rgb': rgb}
-
-        dumps = pickle.dumps(event)
-        client.publish(url, dumps)
+        client.publish(url, protocol.encode(name, rgb))
         time.sleep(.1)
 
         self.assertEqual(self.port.unicorn.state.name, name)
@@ -122,10 +116,7 @@ class BacklightServiceTest(unittest.TestCase):
 
         name = 'quit'
         rgb = None
-        event = {'name': name, 'rgb': rgb}
-
-        dumps = pickle.dumps(event)
-        client.publish(url, dumps)
+        client.publish(url, protocol.encode(name, rgb))
         time.sleep(.1)
 
         self.assertEqual(self.port.unicorn.state.name, name)
@@ -0,0 +1,183 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import grp
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import unittest
+
+from mrd import rooms
+from mrd.backlight import protocol
+from mrd.backlight.backlight import BackLight
+from mrd.backlight.socket_client import BackLightSocketClient
+from mrd.backlight.socket_service import BackLightSocketService
+
+
+class RecordingPort(object):
+
+    def __init__(self):
+        self.states = []
+        self.delivered = threading.Event()
+
+    def state_changed(self, state):
+        self.states.append(state)
+        self.delivered.set()
+
+
+class BackLightSocketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'backlight.sock')
+        self.port = RecordingPort()
+        self.service = None
+        self.client = None
+
+    def tearDown(self):
+        if self.client is not None:
+            self.client.close()
+        if self.service is not None:
+            self.service.close()
+        shutil.rmtree(self.directory)
+
+    def start_service(self):
+        self.service = BackLightSocketService(self.port, self.path)
+        thread = threading.Thread(target=self.service.run)
+        thread.daemon = True
+        thread.start()
+
+    def test__publish__reaches_service(self):
+        self.start_service()
+        self.client = BackLightSocketClient(self.path)
+
+        self.client.publish(protocol.encode('rgb', (0, 255, 0), sequence=1))
+
+        self.assertTrue(self.port.delivered.wait(1))
+        self.assertEqual(self.port.states[0].rgb, (0, 255, 0))
+
+    def test__publish__without_service__does_not_raise(self):
+        self.client = BackLightSocketClient(self.path)
+
+        self.client.publish(protocol.encode('clear'))
+
+        self.assertEqual(self.client.failure_count, 1)
+
+    def test__resend__service_started_late__gets_latest_state(self):
+        BackLightSocketClient.RESEND_INTERVAL_IN_SECS = 0.05
+        try:
+            self.client = BackLightSocketClient(self.path)
+            self.client.publish(protocol.encode('rgb', (255, 0, 0), sequence=1))
+            self.start_service()
+
+            self.assertTrue(self.port.delivered.wait(1))
+        finally:
+            BackLightSocketClient.RESEND_INTERVAL_IN_SECS = 10
+        self.assertEqual(self.port.states[0].rgb, (255, 0, 0))
+
+    def test__service__stale_socket_file__is_replaced(self):
+        open(self.path, 'w').close()
+
+        self.start_service()
+        self.client = BackLightSocketClient(self.path)
+        self.client.publish(protocol.encode('clear'))
+
+        self.assertTrue(self.port.delivered.wait(1))
+
+    def test__init__socket__is_only_writable_by_owner_and_group(self):
+        group = grp.getgrgid(os.getgid()).gr_name
+        self.service = BackLightSocketService(self.port, self.path, group)
+
+        status = os.stat(self.path)
+        self.assertEqual(stat.S_IMODE(status.st_mode), 0o660)
+        self.assertEqual(status.st_gid, os.getgid())
+
+    def test__backlight__upcoming_event__breathes_orange(self):
+        self.start_service()
+        backlight = BackLight(transport='socket', socket_path=self.path)
+        self.client = backlight.impl._client
+
+        upcoming = rooms.Appointment(1, 2, "title", 1)
+        backlight.occupation_changed(rooms.Occupation(None, upcoming, is_upcoming_soon=True))
+
+        self.assertTrue(self.port.delivered.wait(1))
+        self.assertEqual(self.port.states[0].rgb, (255, 95, 0))
+        self.assertEqual(self.port.states[0].effect, protocol.EFFECT_BREATHING)
+
+    def test__backlight__shut_down__sends_quit_and_closes_client(self):
+        self.start_service()
+        backlight = BackLight(transport='socket', socket_path=self.path)
+
+        backlight.shut_down()
+
+        self.assertTrue(self.port.delivered.wait(1))
+        self.assertEqual(self.port.states[0].name, 'quit')
+        self.assertFalse(backlight.impl._client._thread.is_alive())
+
+    def test__backlight__upcoming_event_not_soon__shows_free(self):
+        self.start_service()
+        backlight = BackLight(transport='socket', socket_path=self.path)
+        self.client = backlight.impl._client
+
+        # the flag decides, not the distance to the event start
+        upcoming = rooms.Appointment(1, 2, "title", 1)
+        backlight.occupation_changed(rooms.Occupation(None, upcoming, is_upcoming_soon=False))
+
+        self.assertTrue(self.port.delivered.wait(1))
+        self.assertEqual(self.port.states[0].rgb, (0, 255, 0))
+        self.assertEqual(self.port.states[0].effect, protocol.EFFECT_NONE)
+
+    def test__backlight__occupied__sends_absolute_meeting_times(self):
+        self.start_service()
+        backlight = BackLight(transport='socket', socket_path=self.path)
+        self.client = backlight.impl._client
+
+        current = rooms.Appointment(1000, 4600, "title", 1)
+        backlight.occupation_changed(rooms.Occupation(current, None))
+
+        self.assertTrue(self.port.delivered.wait(1))
+        self.assertEqual(self.port.states[0].effect, protocol.EFFECT_PROGRESS)
+        self.assertEqual((self.port.states[0].start, self.port.states[0].end), (1000, 4600))
+
+    def test__backlight__all_day_meeting__shows_static_color(self):
+        self.start_service()
+        backlight = BackLight(transport='socket', socket_path=self.path)
+        self.client = backlight.impl._client
+
+        current = rooms.Appointment(0, 24 * 60 * 60, "title", 1)
+        backlight.occupation_changed(rooms.Occupation(current, None))
+
+        self.assertTrue(self.port.delivered.wait(1))
+        self.assertEqual(self.port.states[0].effect, protocol.EFFECT_NONE)
+        self.assertEqual(self.port.states[0].rgb, (255, 0, 0))
+
+    def test__backlight__new_booking__pulses_within_the_occupied_state(self):
+        self.start_service()
+        backlight = BackLight(transport='socket', socket_path=self.path)
+        self.client = backlight.impl._client
+
+        booked = rooms.Appointment(1000, 4600, "Ad-hoc Meeting", 0, True, "event-1")
+        backlight.occupation_changed(rooms.Occupation(booked, None))
+        self.assertTrue(self.port.delivered.wait(1))
+        self.port.delivered.clear()
+        backlight.occupation_changed(rooms.Occupation(booked, None))
+        self.assertTrue(self.port.delivered.wait(1))
+
+        self.assertEqual([(s.effect, s.pulse) for s in self.port.states],
+                         [(protocol.EFFECT_PROGRESS, True), (protocol.EFFECT_PROGRESS, False)])
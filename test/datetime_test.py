@@ -88,3 +88,15 @@ class DateTimeTest(unittest.TestCase):
         actual_time_string = datetime.convert_secs_since_epoch_to_string(expected_epoch_time)
 
         self.assertEqual(actual_time_string, time_as_outlook_string)
+
+    def test__convert_graph_datetime__with_fraction__ignores_fraction(self):
+        secs = datetime.convert_graph_datetime_to_secs_since_epoch('2018-04-25T13:14:15.0000000')
+
+        self.assertEqual(secs, 1524662055)
+
+    def test__get_day_bounds__contains_given_time(self):
+        now = time.time()
+        start, end = datetime.get_day_bounds(now)
+
+        self.assertTrue(datetime.is_date_in_span(start, end, now))
+        self.assertLess(end - start, 25 * 60 * 60)
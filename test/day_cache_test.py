@@ -0,0 +1,59 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import unittest
+
+from mrd.day_cache import DayScheduleCache
+from mrd.rooms import Appointment
+from mrd.schedule import DaySchedule
+
+
+class DayScheduleCacheTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        os.remove(self.path)
+        self.addCleanup(lambda: os.path.exists(self.path) and os.remove(self.path))
+
+        self.schedule = DaySchedule([Appointment(100, 200, "meeting", 3, False, "event-1"),
+                                     Appointment(300, 400, "Ad-hoc Meeting", 0, True, "event-2")], 0, 1000)
+
+    def test__load__after_save__returns_same_schedule(self):
+        DayScheduleCache(self.path).save(self.schedule)
+
+        loaded = DayScheduleCache(self.path).load()
+
+        self.assertEqual([(a.date_from, a.title, a.is_adhoc, a.event_id) for a in loaded],
+                         [(100, "meeting", False, "event-1"), (300, "Ad-hoc Meeting", True, "event-2")])
+        self.assertEqual(loaded.valid_until, 1000)
+
+    def test__save__unchanged_schedule__does_not_rewrite_file(self):
+        cache = DayScheduleCache(self.path)
+        cache.save(self.schedule)
+        os.utime(self.path, ns=(0, 0))
+
+        cache.save(DaySchedule(list(self.schedule), 0, 1000))
+
+        self.assertEqual(os.stat(self.path).st_mtime_ns, 0)
+
+    def test__load__corrupt_file__returns_none(self):
+        with open(self.path, 'w') as cache_file:
+            cache_file.write('{"version": 1, "appointments"')
+
+        self.assertIsNone(DayScheduleCache(self.path).load())
@@ -0,0 +1,119 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+import time
+import unittest
+from mock import MagicMock
+
+import mrd.time_util as datetime
+from mrd.delta_sync import CalendarDeltaSync
+
+
+def graph_event(id, start, end, subject="Mock Appointment"):
+    return {
+        'id': id,
+        'start': {'dateTime': datetime.convert_secs_since_epoch_to_string(start)[:-1] + '.0000000', 'timeZone': 'UTC'},
+        'end': {'dateTime': datetime.convert_secs_since_epoch_to_string(end)[:-1] + '.0000000', 'timeZone': 'UTC'},
+        'subject': subject,
+        'organizer': {'emailAddress': {'address': "organizer@example.org"}},
+        'attendees': [{}, {}],
+    }
+
+
+class CalendarMock(object):
+    def __init__(self):
+        self.con = MagicMock()
+
+    def build_url(self, endpoint):
+        return "https://graph.example.org/me" + endpoint
+
+    def respond_with(self, *pages):
+        responses = []
+        for page in pages:
+            response = MagicMock()
+            response.json.return_value = page
+            responses.append(response)
+        self.con.get.side_effect = responses
+
+
+class CalendarDeltaSyncTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.state_path = tempfile.mkstemp()
+        os.close(fd)
+        os.remove(self.state_path)
+        self.addCleanup(lambda: os.path.exists(self.state_path) and os.remove(self.state_path))
+
+        self.now = int(time.time())
+        self.calendar = CalendarMock()
+
+    def test__sync__initial_pages__collects_all_events(self):
+        self.calendar.respond_with(
+            {'value': [graph_event('1', self.now, self.now + 60)], '@odata.nextLink': 'next'},
+            {'value': [graph_event('2', self.now + 120, self.now + 180)], '@odata.deltaLink': 'delta-1'})
+
+        events = CalendarDeltaSync(self.state_path).sync(self.calendar, self.now)
+
+        self.assertEqual(sorted(e['id'] for e in events), ['1', '2'])
+        self.assertEqual(events[0]['num_attendees'], 2)
+
+    def test__sync__second_call__follows_delta_link_and_applies_removal(self):
+        sync = CalendarDeltaSync(self.state_path)
+        self.calendar.respond_with(
+            {'value': [graph_event('1', self.now, self.now + 60)], '@odata.deltaLink': 'delta-1'},
+            {'value': [{'id': '1', '@removed': {'reason': 'deleted'}}], '@odata.deltaLink': 'delta-2'})
+
+        sync.sync(self.calendar, self.now)
+        events = sync.sync(self.calendar, self.now)
+
+        self.assertEqual(events, [])
+        self.assertEqual(self.calendar.con.get.call_args[0][0], 'delta-1')
+
+    def test__sync__after_restart__continues_with_stored_delta_link(self):
+        self.calendar.respond_with({'value': [graph_event('1', self.now, self.now + 60)], '@odata.deltaLink': 'delta-1'})
+        CalendarDeltaSync(self.state_path).sync(self.calendar, self.now)
+
+        self.calendar.respond_with({'value': [], '@odata.deltaLink': 'delta-2'})
+        events = CalendarDeltaSync(self.state_path).sync(self.calendar, self.now)
+
+        self.assertEqual(self.calendar.con.get.call_args[0][0], 'delta-1')
+        self.assertEqual([e['id'] for e in events], ['1'])
+
+    def test__sync__without_changes__does_not_rewrite_state(self):
+        sync = CalendarDeltaSync(self.state_path)
+        self.calendar.respond_with(
+            {'value': [graph_event('1', self.now, self.now + 60)], '@odata.deltaLink': 'delta-1'},
+            {'value': [], '@odata.deltaLink': 'delta-2'})
+        sync.sync(self.calendar, self.now)
+        modified = os.stat(self.state_path).st_mtime_ns
+        os.utime(self.state_path, ns=(0, 0))
+
+        sync.sync(self.calendar, self.now)
+
+        self.assertNotEqual(modified, 0)
+        self.assertEqual(os.stat(self.state_path).st_mtime_ns, 0)
+
+    def test__init__state_file_of_wrong_shape__starts_full_sync(self):
+        for content in ('null', '[]', '{"day": 0, "delta_link": "delta-1", "events": [1]}', '{broken'):
+            with open(self.state_path, 'w') as state_file:
+                state_file.write(content)
+            self.calendar.respond_with({'value': [], '@odata.deltaLink': 'delta-2'})
+
+            CalendarDeltaSync(self.state_path).sync(self.calendar, self.now)
+
+            self.assertEqual(self.calendar.con.get.call_args[0][0], "https://graph.example.org/me/calendarView/delta")
@@ -0,0 +1,72 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+
+from mrd import fleet_simulator
+from mrd.rooms import Appointment
+
+
+class FleetSimulatorTest(unittest.TestCase):
+    start = 1556172000  # Thursday, 2019-04-25 06:00 UTC
+
+    def test__transition_latencies__display_follows_late__returns_delay(self):
+        meeting = Appointment(100, 200, "title", 1, event_id='a')
+        shown = [(0, None), (130, 'a'), (200, None)]
+
+        latencies, missed = fleet_simulator.transition_latencies([meeting], shown, 1000)
+
+        self.assertEqual(latencies, [30, 0])
+        self.assertEqual(missed, 0)
+
+    def test__transition_latencies__meeting_never_shown__counts_missed(self):
+        meeting = Appointment(100, 200, "title", 1, event_id='a')
+
+        latencies, missed = fleet_simulator.transition_latencies([meeting], [(0, None)], 1000)
+
+        self.assertEqual(missed, 1)
+
+    def test__simulated_room__short_notice_meeting__is_invisible_before_its_creation(self):
+        clock = fleet_simulator.VirtualClock(self.start)
+        calendar = fleet_simulator.SimulatedCalendar(['room'], clock)
+        calendar.add_meeting('room', self.start + 600, self.start + 1200, self.start + 1800)
+        room = calendar.room('room')
+
+        self.assertIsNone(room.get_next_state_changing_appointment_up_to_midnight(self.start))
+        clock.advance_to(self.start + 600)
+        self.assertIsNotNone(room.get_next_state_changing_appointment_up_to_midnight(self.start + 600))
+        self.assertEqual(calendar.request_count, 2)
+
+    def test__simulate__small_building__shows_every_transition(self):
+        report = fleet_simulator.simulate(num_rooms=3, hours=4, start=self.start, seed=1)
+
+        self.assertGreater(report['requests'], 0)
+        self.assertGreater(report['transitions'], 0)
+        self.assertEqual(report['missed_transitions'], 0)
+        self.assertEqual(report['threads'], fleet_simulator.THREADS_PER_PROCESS + 3 * fleet_simulator.THREADS_PER_ROOM)
+
+    def test__simulated_room__lookups_within_refresh_interval__count_one_request(self):
+        clock = fleet_simulator.VirtualClock(self.start)
+        calendar = fleet_simulator.SimulatedCalendar(['room'], clock)
+        room = calendar.room('room', refresh_interval_in_secs=10)
+
+        room.get_next_state_changing_appointment_up_to_midnight(self.start)
+        room.get_day_schedule(self.start)
+        clock.advance_to(self.start + 5)
+        room.get_next_state_changing_appointment_up_to_midnight(self.start + 5)
+
+        self.assertEqual(calendar.request_count, 1)
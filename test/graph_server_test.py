@@ -0,0 +1,143 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from mock import patch
+
+import requests
+
+from mrd import delta_sync
+from mrd import outlook
+from mrd.mocks.graph_server import GraphStandIn
+from mrd.token_manager import TokenManager
+
+
+class GraphStandInTest(unittest.TestCase):
+    room_id = 'room@example.org'
+
+    def setUp(self):
+        self.now = time.time()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.stand_in = GraphStandIn(seed=0, me_address=self.room_id).start()
+        self.addCleanup(self.stand_in.stop)
+        self.token_path = os.path.join(self.directory, 'token.txt')
+        self.stand_in.write_token(self.token_path)
+        self.tokens = TokenManager(token_path=self.token_path)
+        # the stand-in serves plain http
+        environment = patch.dict(os.environ, {outlook.INSECURE_TRANSPORT_VARIABLE: '1'})
+        environment.start()
+        self.addCleanup(environment.stop)
+
+    def repository(self, **kwargs):
+        return outlook.OutlookRoomRepository(self.room_id, 'client', 'secret', token_manager=self.tokens,
+                                             graph_url=self.stand_in.url, **kwargs)
+
+    def test__get_day_schedule__lean_fetch__returns_events_up_to_midnight(self):
+        self.stand_in.add_event(self.now - 60, self.now + 600, "Running")
+        self.stand_in.add_event(self.now - 7200, self.now - 3600, "Elapsed")
+
+        day_schedule = self.repository(lean_fetch=True).get_day_schedule(self.now)
+
+        self.assertEqual(day_schedule.current(self.now).title, "Running")
+        self.assertEqual(len(day_schedule), 1)
+
+    def add_events(self, count, **kwargs):
+        for i in range(count):
+            self.stand_in.add_event(self.now + i, self.now + i + 1, "Event {0}".format(i), **kwargs)
+
+    def test__get_day_schedule__more_events_than_a_page__follows_next_link(self):
+        self.add_events(outlook.OutlookRoomRepository._events_per_page * 2 + 1)
+
+        for options in ({}, {'lean_fetch': True}):
+            day_schedule = self.repository(**options).get_day_schedule(self.now)
+
+            self.assertEqual(len(day_schedule), outlook.OutlookRoomRepository._events_per_page * 2 + 1)
+
+    def test__get_next_state_changing_appointment__full_fetch__returns_running_event(self):
+        self.stand_in.add_event(self.now - 60, self.now + 600, "Running")
+
+        appointment = self.repository().get_next_state_changing_appointment_up_to_midnight(self.now)
+
+        self.assertEqual(appointment.title, "Running")
+
+    def test__cancel_running_adhoc_meeting__just_booked__deletes_event(self):
+        repository = self.repository(lean_fetch=True)
+        repository.book_room(self.now - 30, self.now + 1800)
+
+        self.assertIsNone(repository.cancel_running_adhoc_meeting())
+
+        self.assertEqual(self.stand_in.events(), [])
+
+    def test__delta_sync__deleted_event__is_removed_from_schedule(self):
+        event = self.stand_in.add_event(self.now + 60, self.now + 600, "Planned")
+        repository = self.repository(sync_mode=outlook.OutlookRoomRepository.SYNC_MODE_DELTA)
+        repository._delta_sync = delta_sync.CalendarDeltaSync(os.path.join(self.directory, 'delta.json'))
+        self.assertEqual(len(repository.get_day_schedule(self.now)), 1)
+
+        requests.delete(self.stand_in.service_url + 'me/events/' + event['id'], headers={'Authorization': 'Bearer x'})
+        repository.invalidate_schedule()
+
+        self.assertEqual(len(repository.get_day_schedule(self.now)), 0)
+
+    def test__hub_refresh__fetches_rooms_in_one_batch(self):
+        self.stand_in.add_event(self.now - 60, self.now + 600, "Hub Meeting", mailbox='a@example.org')
+        hub = outlook.OutlookRoomHub(['a@example.org', 'b@example.org'], 'client', 'secret',
+                                     token_manager=self.tokens, graph_url=self.stand_in.url)
+
+        day_schedule = hub.get_day_schedule('a@example.org', self.now)
+
+        self.assertEqual(day_schedule.current(self.now).title, "Hub Meeting")
+        self.assertEqual(hub.round_trips, 1)
+
+    def test__hub_refresh__more_events_than_a_page__follows_next_link(self):
+        self.add_events(outlook.OutlookRoomHub._events_per_page + 1, mailbox='a@example.org')
+        hub = outlook.OutlookRoomHub(['a@example.org'], 'client', 'secret', token_manager=self.tokens,
+                                     graph_url=self.stand_in.url)
+
+        day_schedule = hub.get_day_schedule('a@example.org', self.now)
+
+        self.assertEqual(len(day_schedule), outlook.OutlookRoomHub._events_per_page + 1)
+        self.assertEqual(hub.round_trips, 2)
+
+    def test__throttled_requests__are_retried_by_the_client(self):
+        self.stand_in.throttle_rate = 0.5
+        self.stand_in.retry_after_in_secs = 0
+
+        repository = self.repository(lean_fetch=True)
+        for i in range(5):
+            repository.invalidate_schedule()
+            repository.get_day_schedule(self.now)
+
+        self.assertGreater(self.stand_in.throttled_count, 0)
+
+    def test__request__error_rate_one__fails_with_service_unavailable(self):
+        self.stand_in.error_rate = 1.0
+
+        response = requests.get(self.stand_in.service_url + 'me/calendar', headers={'Authorization': 'Bearer x'})
+
+        self.assertEqual(response.status_code, 503)
+
+    def test__token_refresh__is_answered_by_stand_in(self):
+        self.repository().fetch_calendar()
+
+        self.assertTrue(self.tokens.refresh())
+        self.assertEqual(self.tokens.refresh_count, 1)
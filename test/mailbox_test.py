@@ -0,0 +1,97 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import threading
+import time
+import unittest
+from mock import MagicMock
+
+from mrd import mailbox
+from mrd import metrics
+from mrd.rooms import Occupation
+
+
+class BlockingAdapter(object):
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def occupation_changed(self, occupation):
+        self.release.wait(1)
+        self.calls.append(('occupation_changed', occupation))
+
+    def no_network_connection(self):
+        self.calls.append(('no_network_connection', None))
+
+
+class AdapterMailboxTest(unittest.TestCase):
+    def close_after_test(self, adapter_mailbox):
+        self.addCleanup(adapter_mailbox.close, 1)
+        return adapter_mailbox
+
+    def test__occupation_changed__adapter_blocks__returns_immediately_and_keeps_latest(self):
+        adapter = BlockingAdapter()
+        adapter_mailbox = self.close_after_test(mailbox.AdapterMailbox(adapter, 'blocking'))
+        first, second, third = Occupation(None, None), Occupation(None, None, True), Occupation(None, None)
+
+        start = time.monotonic()
+        for occupation in (first, second, third):
+            adapter_mailbox.occupation_changed(occupation)
+        self.assertLess(time.monotonic() - start, 0.5)
+
+        adapter.release.set()
+        adapter_mailbox.close(1)
+        self.assertIs(adapter.calls[-1][1], third)
+        self.assertLessEqual(len(adapter.calls), 2)
+
+    def test__no_network_connection__is_delivered_after_pending_occupation(self):
+        adapter = BlockingAdapter()
+        adapter.release.set()
+        adapter_mailbox = mailbox.AdapterMailbox(adapter, 'ordered')
+
+        adapter_mailbox.occupation_changed(Occupation(None, None))
+        adapter_mailbox.no_network_connection()
+        adapter_mailbox.close(1)
+
+        self.assertEqual([method for method, _ in adapter.calls], ['occupation_changed', 'no_network_connection'])
+
+    def test__occupation_changed__adapter_fails__counts_failure_and_keeps_delivering(self):
+        adapter = MagicMock()
+        adapter.no_network_connection.side_effect = IOError("dbus down")
+        adapter_mailbox = mailbox.AdapterMailbox(adapter, 'failing')
+
+        adapter_mailbox.no_network_connection()
+        adapter_mailbox.occupation_changed(Occupation(None, None))
+        adapter_mailbox.close(1)
+
+        self.assertEqual(adapter_mailbox.failure_count, 1)
+        self.assertEqual(adapter_mailbox.delivered_count, 1)
+        adapter.occupation_changed.assert_called_once()
+
+    def test__occupation_changed__slow_adapter__counts_slow_call_and_records_latency(self):
+        adapter = MagicMock()
+        adapter.occupation_changed.side_effect = lambda occupation: time.sleep(0.05)
+        registry = metrics.Registry()
+        adapter_mailbox = mailbox.AdapterMailbox(adapter, 'slow', slow_call_threshold_in_secs=0.01,
+                                                registry=registry)
+
+        adapter_mailbox.occupation_changed(Occupation(None, None))
+        adapter_mailbox.close(1)
+
+        self.assertEqual(adapter_mailbox.slow_call_count, 1)
+        self.assertEqual(registry.event_delivery_duration.count(adapter='slow'), 1)
+        self.assertEqual(registry.event_delivery_failures.value(adapter='slow', kind='slow'), 1)
@@ -0,0 +1,117 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import datetime
+import socket
+import unittest
+import urllib.request
+from mock import MagicMock
+
+from mrd import metrics
+
+
+class RegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test__render__observed_duration__renders_cumulative_buckets(self):
+        self.registry.backend_call_duration.observe(0.3, call='book_room')
+
+        text = self.registry.render()
+
+        self.assertIn('# TYPE mrd_backend_call_duration_seconds histogram', text)
+        self.assertIn('mrd_backend_call_duration_seconds_bucket{call="book_room",le="0.25"} 0', text)
+        self.assertIn('mrd_backend_call_duration_seconds_bucket{call="book_room",le="0.5"} 1', text)
+        self.assertIn('mrd_backend_call_duration_seconds_bucket{call="book_room",le="+Inf"} 1', text)
+        self.assertIn('mrd_backend_call_duration_seconds_count{call="book_room"} 1', text)
+
+    def test__render__gauge_without_value__is_skipped(self):
+        self.registry.add(metrics.Gauge('mrd_token_expiry_seconds', 'help', lambda: None))
+
+        self.assertNotIn('mrd_token_expiry_seconds', self.registry.render())
+
+    def test__count_response__counts_sent_and_received_bytes(self):
+        response = MagicMock(content=b'{"value": []}', elapsed=datetime.timedelta(seconds=0.2))
+        response.request.body = b'{}'
+
+        self.registry.count_response(response)
+
+        self.assertEqual(self.registry.http_bytes.value(direction='sent'), 2)
+        self.assertEqual(self.registry.http_bytes.value(direction='received'), 13)
+
+    def test__observe_schedule_refresh__times_refresh_call(self):
+        self.registry.observe_schedule_refresh(0.3)
+
+        self.assertEqual(self.registry.backend_call_duration.count(call='refresh_day_schedule'), 1)
+
+    def test__count_response__records_request_duration(self):
+        response = MagicMock(content=b'', elapsed=datetime.timedelta(seconds=0.2))
+        response.request.method = 'GET'
+
+        self.registry.count_response(response)
+
+        self.assertEqual(self.registry.http_request_duration.count(method='GET'), 1)
+
+
+class InstrumentedRoomRepositoryTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+        self.backend = MagicMock()
+        self.repository = metrics.InstrumentedRoomRepository(self.backend, self.registry)
+
+    def test__book_room__records_duration_and_returns_result(self):
+        result = self.repository.book_room(0, 60)
+
+        self.assertIs(result, self.backend.book_room.return_value)
+        self.assertEqual(self.registry.backend_call_duration.count(call='book_room'), 1)
+
+    def test__fetch_calendar__timeout__is_counted_as_timeout(self):
+        self.backend.fetch_calendar.side_effect = socket.timeout()
+
+        self.assertRaises(socket.timeout, self.repository.fetch_calendar)
+        self.assertEqual(self.registry.backend_call_failures.value(call='fetch_calendar', kind='timeout'), 1)
+
+    def test__cancel_running_adhoc_meeting__failure__is_counted_as_error(self):
+        self.backend.cancel_running_adhoc_meeting.side_effect = IOError("no route to host")
+
+        self.assertRaises(IOError, self.repository.cancel_running_adhoc_meeting)
+        self.assertEqual(self.registry.backend_call_failures.value(call='cancel_running_adhoc_meeting', kind='error'), 1)
+
+    def test__get_day_schedule__served_from_cache__records_no_duration(self):
+        self.repository.get_day_schedule(0)
+
+        self.assertEqual(self.registry.backend_call_duration.count(call='get_day_schedule'), 0)
+
+    def test__get_day_schedule__failure__is_counted_as_error(self):
+        self.backend.get_day_schedule.side_effect = IOError("no route to host")
+
+        self.assertRaises(IOError, self.repository.get_day_schedule, 0)
+        self.assertEqual(self.registry.backend_call_failures.value(call='get_day_schedule', kind='error'), 1)
+
+
+class MetricsServerTest(unittest.TestCase):
+    def test__get_metrics__serves_prometheus_text(self):
+        registry = metrics.Registry()
+        registry.backend_call_failures.inc(call='fetch_calendar', kind='error')
+        server = metrics.MetricsServer(registry, port=0)
+        server.start()
+        self.addCleanup(server.stop)
+
+        with urllib.request.urlopen('http://127.0.0.1:{0}/metrics'.format(server.port)) as response:
+            body = response.read().decode('utf-8')
+
+        self.assertIn('mrd_backend_call_failures_total{call="fetch_calendar",kind="error"} 1', body)
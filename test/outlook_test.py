@@ -17,11 +17,18 @@
 
 import mrd.time_util as datetime
 import logging
+import threading
 import unittest
 import time
+import urllib.parse
+from mock import MagicMock, patch
 
 import mrd.outlook as outlook
+from mrd.mocks import graph_payloads
+from mrd.polling import PollRateMeter
 from mrd.mocks.event_mock import EventStates, set_auth_error_true
+from mrd.rooms import Appointment
+from mrd.schedule import DaySchedule
 
 
 class OutlookRoomRepositoryTest(unittest.TestCase):
@@ -141,3 +148,307 @@ class OutlookRoomRepositoryTest(unittest.TestCase):
 
         self.assertFalse(appointment.is_adhoc)
         self.assertIsNotNone(appointment)
+
+
+class OutlookSessionTest(unittest.TestCase):
+    credentials = ("client_id", "client_secret")
+
+    def setUp(self):
+        account_patcher = patch('mrd.outlook.Account', create=True)
+        backend_patcher = patch('mrd.outlook.FileSystemTokenBackend', create=True)
+        self.account_class = account_patcher.start()
+        backend_patcher.start()
+        self.addCleanup(account_patcher.stop)
+        self.addCleanup(backend_patcher.stop)
+
+        self.account_class.return_value.con.token_backend.token.is_expired = False
+        self.session = outlook.OutlookSession(self.credentials, [])
+
+    def test__get_calendar_twice__builds_account_once(self):
+        fst_calendar = self.session.get_calendar()
+        snd_calendar = self.session.get_calendar()
+
+        self.assertIs(fst_calendar, snd_calendar)
+        self.assertEqual(self.account_class.call_count, 1)
+        self.assertEqual(self.session.rebuild_count, 1)
+
+    def test__get_calendar__after_invalidate__rebuilds(self):
+        self.session.get_calendar()
+        self.session.invalidate("test")
+        self.session.get_calendar()
+
+        self.assertEqual(self.session.rebuild_count, 2)
+
+    def test__get_calendar__with_expired_token__rebuilds(self):
+        self.session.get_calendar()
+        self.account_class.return_value.con.token_backend.token.is_expired = True
+        self.session.get_calendar()
+
+        self.assertEqual(self.session.rebuild_count, 2)
+
+    def test__get_calendar__with_token_manager__uses_its_backend_and_attaches_connection(self):
+        token_manager = MagicMock()
+        session = outlook.OutlookSession(self.credentials, [], token_manager=token_manager)
+
+        session.get_calendar()
+
+        self.assertIs(self.account_class.call_args[1]['token_backend'], token_manager.backend)
+        token_manager.attach.assert_called_once_with(self.account_class.return_value.con)
+
+    def test__is_invalidating_error__unauthorized__returns_true(self):
+        error = Exception()
+        error.response = MagicMock(status_code=401)
+
+        self.assertTrue(self.session.is_invalidating_error(error))
+
+    def test__is_invalidating_error__server_error__returns_false(self):
+        error = Exception()
+        error.response = MagicMock(status_code=503)
+
+        self.assertFalse(self.session.is_invalidating_error(error))
+
+
+class OutlookRoomRepositoryScheduleTest(unittest.TestCase):
+    id = "dummy_room@example.org"
+
+    def setUp(self):
+        self.backend = outlook.OutlookRoomRepository(self.id, "client_id", "client_secret", refresh_interval_in_secs=60)
+        self.backend._fetch_day_schedule = MagicMock(
+            side_effect=lambda now: DaySchedule([Appointment(now - 60, now + 60, "Mock Appointment", 1)], now, now + 3600))
+
+    def test__get_appointment__twice_within_refresh_interval__fetches_once(self):
+        now = time.time()
+        self.backend.get_next_state_changing_appointment_up_to_midnight(now)
+        appointment = self.backend.get_next_state_changing_appointment_up_to_midnight(now + 1)
+
+        self.assertEqual(self.backend._fetch_day_schedule.call_count, 1)
+        self.assertEqual(appointment.title, "Mock Appointment")
+
+    def test__get_appointment__after_invalidate_schedule__fetches_again(self):
+        now = time.time()
+        self.backend.get_next_state_changing_appointment_up_to_midnight(now)
+        self.backend.invalidate_schedule()
+        self.backend.get_next_state_changing_appointment_up_to_midnight(now)
+
+        self.assertEqual(self.backend._fetch_day_schedule.call_count, 2)
+
+    def test__get_appointment__poll_rate__counts_only_fetches(self):
+        now = time.time()
+        poll_rate = PollRateMeter()
+        backend = outlook.OutlookRoomRepository(self.id, "client_id", "client_secret", refresh_interval_in_secs=60,
+                                                poll_rate=poll_rate)
+        backend._fetch_day_schedule = self.backend._fetch_day_schedule
+
+        backend.get_next_state_changing_appointment_up_to_midnight(now)
+        backend.get_next_state_changing_appointment_up_to_midnight(now + 1)
+        backend.invalidate_schedule()
+        backend.get_next_state_changing_appointment_up_to_midnight(now + 2)
+
+        self.assertEqual(poll_rate.total, 2)
+
+    def test__get_appointment__refresh_hook__is_called_for_fetches_only(self):
+        now = time.time()
+        durations = []
+        self.backend.add_refresh_hook(durations.append)
+
+        self.backend.get_next_state_changing_appointment_up_to_midnight(now)
+        self.backend.get_next_state_changing_appointment_up_to_midnight(now + 1)
+
+        self.assertEqual(len(durations), 1)
+
+
+class OutlookRoomRepositoryLeanFetchTest(unittest.TestCase):
+    id = "dummy_room@example.org"
+
+    def setUp(self):
+        self.now = int(time.time())
+        self.calendar = MagicMock(calendar_id=None)
+        self.calendar.con.get.return_value.json.return_value = {'value': [
+            graph_payloads.select(graph_payloads.make_event('1', self.now - 60, self.now + 60, organizer=self.id),
+                                  outlook.OutlookRoomRepository._lean_fields)]}
+
+        self.backend = outlook.OutlookRoomRepository(self.id, "client_id", "client_secret", lean_fetch=True, count_attendees=False)
+        self.backend._session.get_calendar = MagicMock(return_value=self.calendar)
+
+    def test__fetch_day_schedule__without_attendees__selects_only_lean_fields(self):
+        day_schedule = self.backend._fetch_day_schedule(self.now)
+
+        params = self.calendar.con.get.call_args[1]['params']
+        self.assertEqual(params['$select'], outlook.OutlookRoomRepository._lean_fields)
+        self.assertEqual(day_schedule.current(self.now).date_from, self.now - 60)
+        self.assertEqual(day_schedule.current(self.now).num_attendees, 0)
+
+
+class OutlookRoomHubTest(unittest.TestCase):
+    room_ids = ["room{0}@example.org".format(i) for i in range(45)]
+
+    def setUp(self):
+        self.now = int(time.time())
+        self.failing_rooms = set()
+        self.hub = outlook.OutlookRoomHub(self.room_ids, "client_id", "client_secret")
+        self.hub._session = MagicMock()
+        self.account = self.hub._session.account
+        self.account.protocol.service_url = "https://graph.example.org/v1.0/"
+        self.account.con.post.side_effect = self._respond
+
+    def _respond(self, url, data):
+        response = MagicMock()
+        if url.endswith('$batch'):
+            response.json.return_value = {'responses': [self._respond_to_request(r) for r in data['requests']]}
+        else:
+            response.json.return_value = graph_payloads.make_event(
+                'booked', self.now, self.now + 60, outlook.OutlookRoomHub._ad_hoc_subject, "hub@example.org")
+        return response
+
+    def _respond_to_request(self, request):
+        room_id = urllib.parse.unquote(request['url'].split('/')[2])
+        if room_id in self.failing_rooms:
+            return {'id': request['id'], 'status': 503, 'body': {}}
+        event = graph_payloads.make_event(room_id, self.now - 60, self.now + 60, room_id, "someone@example.org")
+        return {'id': request['id'], 'status': 200, 'body': {'value': [event]}}
+
+    def test__refresh__45_rooms__sends_three_batches_of_at_most_20(self):
+        self.hub.refresh(self.now)
+
+        batch_sizes = [len(c[1]['data']['requests']) for c in self.account.con.post.call_args_list]
+        self.assertEqual(batch_sizes, [20, 20, 5])
+        self.assertEqual(self.hub.round_trips, 3)
+
+    def test__room_views__keep_state_of_each_room_apart(self):
+        fst = self.hub.room(self.room_ids[0]).get_next_state_changing_appointment_up_to_midnight(self.now)
+        snd = self.hub.room(self.room_ids[1]).get_next_state_changing_appointment_up_to_midnight(self.now)
+
+        self.assertEqual(fst.title, self.room_ids[0])
+        self.assertEqual(snd.title, self.room_ids[1])
+        self.assertEqual(self.hub.round_trips, 3)
+
+    def test__refresh__failing_room__keeps_previous_schedule(self):
+        self.hub.refresh(self.now)
+        self.failing_rooms.add(self.room_ids[0])
+        self.hub.refresh(self.now)
+
+        appointment = self.hub.get_day_schedule(self.room_ids[0], self.now).current(self.now)
+        self.assertEqual(appointment.title, self.room_ids[0])
+
+    def test__book_room__booking_of_hub_account__is_adhoc(self):
+        self.hub.refresh(self.now)
+        appointment = self.hub.room(self.room_ids[0]).book_room(self.now, self.now + 60)
+
+        self.assertTrue(appointment.is_adhoc)
+        self.assertIn('booked', self.hub._booked_event_ids[self.room_ids[0]])
+        self.assertNotIn('booked', self.hub._booked_event_ids[self.room_ids[1]])
+
+    def test__refresh__next_day__prunes_bookings_no_longer_in_calendar(self):
+        self.hub.refresh(self.now)
+        self.hub.book_room(self.room_ids[0], self.now, self.now + 60)
+
+        self.hub.refresh(self.now + 24 * 60 * 60)
+
+        self.assertEqual(self.hub._booked_event_ids[self.room_ids[0]], set())
+
+    def test__refresh__same_day__keeps_bookings(self):
+        self.hub.refresh(self.now)
+        self.hub.book_room(self.room_ids[0], self.now, self.now + 60)
+
+        self.hub.refresh(self.now)
+
+        self.assertIn('booked', self.hub._booked_event_ids[self.room_ids[0]])
+
+    def _block_batches(self):
+        """Let batch requests block until the returned event is set, returns (sending, release)."""
+        sending, release = threading.Event(), threading.Event()
+        respond = self.account.con.post.side_effect
+
+        def blocking_respond(url, data):
+            if url.endswith('$batch'):
+                sending.set()
+                release.wait(1)
+            return respond(url, data)
+
+        self.account.con.post.side_effect = blocking_respond
+        return sending, release
+
+    def _refresh_in_background(self):
+        refresher = threading.Thread(target=self.hub.refresh, args=(self.now,))
+        refresher.start()
+        self.addCleanup(refresher.join, 1)
+        return refresher
+
+    def test__get_day_schedule__while_refreshing__returns_previous_schedule_without_waiting(self):
+        self.hub.refresh(self.now)
+        sending, release = self._block_batches()
+        refresher = self._refresh_in_background()
+        sending.wait(1)
+
+        day_schedule = self.hub.get_day_schedule(self.room_ids[0], self.now)
+
+        self.assertTrue(refresher.is_alive())
+        self.assertEqual(day_schedule.current(self.now).title, self.room_ids[0])
+        release.set()
+
+    def test__get_day_schedule__concurrent_expiry__refreshes_once(self):
+        sending, release = self._block_batches()
+        refresher = self._refresh_in_background()
+        sending.wait(1)
+
+        waiter = threading.Thread(target=self.hub.get_day_schedule, args=(self.room_ids[0], self.now))
+        waiter.start()
+        release.set()
+        refresher.join(1)
+        waiter.join(1)
+
+        self.assertEqual(self.hub.round_trips, 3)
+
+    def test__book_room__while_refreshing__is_kept_in_fetched_schedule(self):
+        self.hub.refresh(self.now)
+        sending, release = self._block_batches()
+        refresher = self._refresh_in_background()
+        sending.wait(1)
+
+        self.hub.book_room(self.room_ids[0], self.now, self.now + 60)
+        release.set()
+        refresher.join(1)
+
+        day_schedule = self.hub.get_day_schedule(self.room_ids[0], self.now)
+        self.assertIn('booked', [a.event_id for a in day_schedule._appointments])
+
+
+class OutlookRoomRepositoryWriteThroughTest(unittest.TestCase):
+    id = "dummy_room@example.org"
+
+    def setUp(self):
+        self.now = time.time()
+        self.calendar = MagicMock()
+        self.calendar.build_url.side_effect = lambda endpoint: "https://graph.example.org/me" + endpoint
+        self.calendar.new_event.return_value.object_id = "event-1"
+
+        self.backend = outlook.OutlookRoomRepository(self.id, "client_id", "client_secret", refresh_interval_in_secs=60)
+        self.backend._session.get_calendar = MagicMock(return_value=self.calendar)
+        self.backend._fetch_day_schedule = MagicMock(side_effect=lambda now: DaySchedule([], now - 3600, now + 3600))
+
+    def test__book_room__adds_booking_to_schedule_without_refetch(self):
+        self.backend.get_day_schedule(self.now)
+        self.backend.book_room(self.now, self.now + 1800)
+
+        appointment = self.backend.get_day_schedule(self.now).current(self.now)
+        self.assertEqual(appointment.event_id, "event-1")
+        self.assertTrue(appointment.is_adhoc)
+        self.assertEqual(self.backend._fetch_day_schedule.call_count, 1)
+
+    def test__cancel_running_adhoc_meeting__after_booking__patches_end_with_single_request(self):
+        self.backend.get_day_schedule(self.now)
+        self.backend.book_room(self.now - 120, self.now + 1800)
+
+        shortened = self.backend.cancel_running_adhoc_meeting()
+
+        self.calendar.con.patch.assert_called_once()
+        self.assertEqual(self.calendar.con.patch.call_args[0][0], "https://graph.example.org/me/events/event-1")
+        self.assertLessEqual(shortened.date_until, time.time())
+        self.assertIsNone(self.backend.get_day_schedule(time.time()).current(time.time()))
+        self.assertEqual(self.backend._fetch_day_schedule.call_count, 1)
+
+    def test__cancel_running_adhoc_meeting__just_booked__deletes_event(self):
+        self.backend.book_room(self.now, self.now + 1800)
+
+        self.assertIsNone(self.backend.cancel_running_adhoc_meeting())
+        self.calendar.con.delete.assert_called_once_with("https://graph.example.org/me/events/event-1")
@@ -0,0 +1,85 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import configparser
+import time
+import unittest
+
+from mrd.polling import PollPolicy, PollRateMeter
+
+# Wednesday, 2019-04-24, local time
+WEDNESDAY_10_AM = time.mktime((2019, 4, 24, 10, 0, 0, 0, 0, -1))
+WEDNESDAY_10_PM = time.mktime((2019, 4, 24, 22, 0, 0, 0, 0, -1))
+SATURDAY_NOON = time.mktime((2019, 4, 27, 12, 0, 0, 0, 0, -1))
+
+
+class PollPolicyTest(unittest.TestCase):
+    def setUp(self):
+        self.policy = PollPolicy()
+
+    def test__next_interval__close_to_state_change__returns_fast_interval(self):
+        interval = self.policy.next_interval(WEDNESDAY_10_AM, WEDNESDAY_10_AM + 60)
+
+        self.assertEqual(interval, self.policy.fast_interval_in_secs)
+
+    def test__next_interval__after_local_booking__returns_fast_interval(self):
+        interval = self.policy.next_interval(WEDNESDAY_10_AM, None, WEDNESDAY_10_AM - 30)
+
+        self.assertEqual(interval, self.policy.fast_interval_in_secs)
+
+    def test__next_interval__no_more_events__returns_idle_interval(self):
+        interval = self.policy.next_interval(WEDNESDAY_10_AM)
+
+        self.assertEqual(interval, self.policy.idle_interval_in_secs)
+
+    def test__next_interval__state_change_hours_away__polls_slower_than_close_by(self):
+        far = self.policy.next_interval(WEDNESDAY_10_AM, WEDNESDAY_10_AM + 3 * 3600)
+        near = self.policy.next_interval(WEDNESDAY_10_AM, WEDNESDAY_10_AM + 20 * 60)
+
+        self.assertGreater(far, near)
+
+    def test__next_interval__at_night__returns_off_hours_interval(self):
+        interval = self.policy.next_interval(WEDNESDAY_10_PM)
+
+        self.assertEqual(interval, self.policy.off_hours_interval_in_secs)
+
+    def test__next_interval__off_hours__does_not_sleep_past_start_of_work(self):
+        policy = PollPolicy(off_hours_interval_in_secs=3 * 24 * 3600)
+        interval = policy.next_interval(SATURDAY_NOON)
+
+        monday_7_am = time.mktime((2019, 4, 29, 7, 0, 0, 0, 0, -1))
+        self.assertEqual(SATURDAY_NOON + interval, monday_7_am)
+
+    def test__from_config__reads_polling_section(self):
+        config = configparser.ConfigParser()
+        config.read_string("[Polling]\nidle_interval_in_secs: 42\nworking_hours: 08:00-17:00\n")
+
+        policy = PollPolicy.from_config(config)
+
+        self.assertEqual(policy.idle_interval_in_secs, 42)
+        self.assertFalse(policy.is_working_time(time.mktime((2019, 4, 24, 7, 30, 0, 0, 0, -1))))
+
+
+class PollRateMeterTest(unittest.TestCase):
+    def test__requests_per_hour__drops_requests_older_than_an_hour(self):
+        meter = PollRateMeter()
+        meter.record(0)
+        meter.record(1800)
+        meter.record(3700)
+
+        self.assertEqual(meter.requests_per_hour(3700), 2)
+        self.assertEqual(meter.total, 3)
@@ -16,6 +16,7 @@
 # Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
 
 import unittest
+from mock import MagicMock
 
 import mrd.rooms as rooms
 
@@ -45,3 +46,45 @@ class CompositeEventPortTest(unittest.TestCase):
 
         call_counts = [a.count for a in [adapter1, adapter2]]
         self.assertEqual(sum(call_counts, 0), 2, "Each event port adapter should have been called")
+
+    def test__occupation_changed__unchanged_occupation__is_suppressed(self):
+        adapter = MagicMock()
+        composite_event_port = rooms.CompositeEventPort([adapter])
+        meeting = rooms.Appointment(100, 200, "title", 1, event_id='a')
+
+        composite_event_port.occupation_changed(rooms.Occupation(meeting, None))
+        composite_event_port.occupation_changed(rooms.Occupation(rooms.Appointment(100, 200, "title", 1, event_id='a'), None))
+
+        adapter.occupation_changed.assert_called_once()
+        self.assertEqual(composite_event_port.suppressed_count, 1)
+
+    def test__occupation_changed__after_no_network_connection__is_passed_on_again(self):
+        adapter = MagicMock()
+        composite_event_port = rooms.CompositeEventPort([adapter])
+
+        composite_event_port.occupation_changed(rooms.Occupation(None, None))
+        composite_event_port.no_network_connection()
+        composite_event_port.occupation_changed(rooms.Occupation(None, None))
+
+        self.assertEqual(adapter.occupation_changed.call_count, 2)
+
+    def test__no_network_connection__failing_adapter__still_notifies_the_others(self):
+        failing, other = MagicMock(), MagicMock()
+        failing.no_network_connection.side_effect = IOError("dbus down")
+        composite_event_port = rooms.CompositeEventPort([failing, other])
+
+        composite_event_port.no_network_connection()
+
+        other.no_network_connection.assert_called_once()
+
+
+class OccupationTest(unittest.TestCase):
+    def test__eq__upcoming_event_gets_close__differs(self):
+        meeting = rooms.Appointment(100, 200, "title", 1)
+
+        self.assertNotEqual(rooms.Occupation(None, meeting), rooms.Occupation(None, meeting, is_upcoming_soon=True))
+
+    def test__eq__appointment_moved__differs(self):
+        self.assertNotEqual(rooms.Occupation(rooms.Appointment(100, 200, "title", 1), None),
+                            rooms.Occupation(rooms.Appointment(100, 300, "title", 1), None))
+        self.assertEqual(hash(rooms.Appointment(100, 200, "title", 1)), hash(rooms.Appointment(100, 200, "title", 1)))
@@ -0,0 +1,66 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+
+from mrd.rooms import Appointment
+from mrd.schedule import DaySchedule
+
+
+class DayScheduleTest(unittest.TestCase):
+    def setUp(self):
+        self.long_meeting = Appointment(100, 400, "long meeting", 3)
+        self.short_meeting = Appointment(150, 200, "short meeting", 2)
+        self.late_meeting = Appointment(500, 600, "late meeting", 4)
+        self.schedule = DaySchedule([self.late_meeting, self.short_meeting, self.long_meeting], 0, 1000)
+
+    def test__current__inside_overlapping_appointments__returns_latest_ending(self):
+        self.assertIs(self.schedule.current(300), self.long_meeting)
+
+    def test__current__at_end_of_appointment__returns_none(self):
+        self.assertIsNone(self.schedule.current(400))
+
+    def test__upcoming__between_appointments__returns_next(self):
+        self.assertIs(self.schedule.upcoming(450), self.late_meeting)
+
+    def test__next_state_changing__after_last_appointment__returns_none(self):
+        self.assertIsNone(self.schedule.next_state_changing(700))
+
+    def test__free_until__while_free__returns_start_of_next_appointment(self):
+        self.assertEqual(self.schedule.free_until(450), 500)
+
+    def test__free_until__without_upcoming_appointment__returns_valid_until(self):
+        self.assertEqual(self.schedule.free_until(700), 1000)
+
+    def test__has_conflict__overlapping_span__returns_true(self):
+        self.assertTrue(self.schedule.has_conflict(350, 450))
+
+    def test__has_conflict__adjacent_span__returns_false(self):
+        self.assertFalse(self.schedule.has_conflict(400, 500))
+
+    def test__conflicts__span_over_two_appointments__returns_both(self):
+        self.assertEqual(self.schedule.conflicts(180, 250), [self.long_meeting, self.short_meeting])
+
+    def test__with_changes__replaces_appointment_by_event_id(self):
+        booked = Appointment(450, 480, "booked", 0, True, "event-1")
+        shortened = Appointment(450, 460, "booked", 0, True, "event-1")
+
+        schedule = self.schedule.with_changes(added=[booked]).with_changes(added=[shortened], removed_event_ids=["event-1"])
+
+        self.assertIs(schedule.current(455), shortened)
+        self.assertIsNone(schedule.current(470))
+        self.assertEqual(len(schedule), 4)
@@ -0,0 +1,147 @@
+# Copyright 2018-2019 Method Park Engineering GmbH
+#
+# This file is part of Meeting-Room Display.
+#
+# Meeting-Room Display is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# Meeting-Room Display is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Meeting-Room Display.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from mock import MagicMock
+from O365.utils import Token
+
+from mrd.token_manager import MemoryTokenBackend, TokenManager
+
+
+class TokenManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.token_path = os.path.join(self.directory.name, 'o365_token.txt')
+        self.now = time.time()
+        self._write_token(self.now + 3600)
+
+    def _write_token(self, expires_at):
+        with open(self.token_path, 'w') as token_file:
+            json.dump({'access_token': 'access', 'refresh_token': 'refresh', 'expires_at': expires_at}, token_file)
+
+    def test__get_token__twice__reads_file_once(self):
+        backend = MemoryTokenBackend(self.token_path)
+
+        backend.get_token()
+        os.remove(self.token_path)
+        token = backend.get_token()
+
+        self.assertEqual(token['access_token'], 'access')
+        self.assertEqual(backend.load_count, 1)
+
+    def test__save_token__replaces_file_without_leftovers(self):
+        backend = MemoryTokenBackend(self.token_path)
+        backend.token = {'access_token': 'new', 'refresh_token': 'refresh', 'expires_at': self.now + 7200}
+
+        backend.save_token()
+
+        with open(self.token_path) as token_file:
+            self.assertEqual(json.load(token_file)['access_token'], 'new')
+        self.assertEqual(os.listdir(self.directory.name), ['o365_token.txt'])
+
+    def test__delay_until_refresh__refreshes_ahead_of_expiry(self):
+        manager = TokenManager(self.token_path, refresh_ahead_in_secs=300)
+
+        self.assertAlmostEqual(manager._delay_until_refresh(self.now), 3300, delta=1)
+        self.assertEqual(manager._delay_until_refresh(self.now + 3400), 0)
+
+    def test__refresh__failing__backs_off(self):
+        manager = TokenManager(self.token_path, retry_interval_in_secs=60)
+        connection = MagicMock()
+        connection.refresh_token.side_effect = IOError("no route to host")
+        manager.attach(connection)
+
+        self.assertFalse(manager.refresh())
+        self.assertGreaterEqual(manager._delay_until_refresh(time.time()), 59)
+        self.assertEqual(manager.failure_count, 1)
+
+    def test__start__token_about_to_expire__refreshes_in_background(self):
+        self._write_token(self.now + 10)
+        manager = TokenManager(self.token_path, refresh_ahead_in_secs=300)
+        connection = MagicMock()
+
+        def refresh_token():
+            manager.backend.token = {'access_token': 'new', 'refresh_token': 'refresh', 'expires_at': time.time() + 3600}
+            return True
+
+        connection.refresh_token.side_effect = refresh_token
+        manager.attach(connection)
+
+        manager.start()
+        for _ in range(100):
+            if manager.refresh_count:
+                break
+            time.sleep(0.01)
+        manager.stop()
+
+        self.assertEqual(manager.refresh_count, 1)
+        self.assertGreater(manager.seconds_until_expiry(), 3000)
+
+    def _manager_with_refreshing_connection(self, delay_in_secs=0):
+        manager = TokenManager(self.token_path)
+        connection = MagicMock()
+
+        def refresh_token():
+            time.sleep(delay_in_secs)
+            manager.backend.token = Token({'access_token': 'new', 'refresh_token': 'refresh',
+                                           'expires_at': time.time() + 3600})
+            return True
+
+        connection.refresh_token.side_effect = refresh_token
+        original = connection.refresh_token
+        manager.attach(connection)
+        return manager, connection, original
+
+    def test__ensure_fresh__valid_token__does_not_refresh(self):
+        manager, _, original = self._manager_with_refreshing_connection()
+
+        self.assertTrue(manager.ensure_fresh())
+        original.assert_not_called()
+
+    def test__ensure_fresh__expired_token__refreshes(self):
+        self._write_token(self.now - 10)
+        manager, _, original = self._manager_with_refreshing_connection()
+
+        self.assertTrue(manager.ensure_fresh())
+        self.assertEqual(original.call_count, 1)
+        self.assertEqual(manager.backend.token['access_token'], 'new')
+
+    def test__ensure_fresh__rejected_token__refreshes(self):
+        manager, _, original = self._manager_with_refreshing_connection()
+
+        self.assertTrue(manager.ensure_fresh(rejected_access_token='access'))
+        self.assertEqual(original.call_count, 1)
+
+    def test__refresh_token__concurrent_callers__refresh_once(self):
+        self._write_token(self.now - 10)
+        manager, connection, original = self._manager_with_refreshing_connection(delay_in_secs=0.1)
+        manager.backend.get_token()
+
+        # e.g. the background refresh and O365 refreshing in the middle of a request
+        threads = [threading.Thread(target=connection.refresh_token), threading.Thread(target=manager.ensure_fresh)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(original.call_count, 1)
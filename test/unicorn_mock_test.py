@@ -17,8 +17,10 @@
 
 import unittest
 import time
+from mock import MagicMock, patch
 
-from mrd.backlight.backlight_wrapper import BacklightMock, LEDState, CompositeLEDPort
+from mrd.backlight import backlight_wrapper
+from mrd.backlight.backlight_wrapper import BacklightMock, LEDState, CompositeLEDPort, FrameBuffer, pack_color
 
 
 class UnicornMockTests(unittest.TestCase):
@@ -90,3 +92,83 @@ class LEDPortTests(unittest.TestCase):
         self.port.state_changed(state)
         self.assertEqual(self.adapter.state.name, state.name)
         self.assertEqual(self.adapter.state.rgb, state.rgb)
+
+
+class FrameBufferTests(unittest.TestCase):
+
+    def setUp(self):
+        self.strip = MagicMock()
+        self.frame_buffer = FrameBuffer(self.strip, 4)
+
+    def test__render__first_frame__pushes_all_pixels(self):
+        self.frame_buffer.fill(0, 255, 0)
+
+        self.assertTrue(self.frame_buffer.render())
+        self.assertEqual(self.strip.setPixelColor.call_count, 4)
+        self.strip.setPixelColor.assert_called_with(3, pack_color(0, 255, 0))
+        self.strip.show.assert_called_once_with()
+
+    def test__render__unchanged_frame__skips_show(self):
+        self.frame_buffer.fill(0, 255, 0)
+        self.frame_buffer.render()
+        self.strip.reset_mock()
+
+        self.frame_buffer.fill(0, 255, 0)
+
+        self.assertFalse(self.frame_buffer.render())
+        self.strip.setPixelColor.assert_not_called()
+        self.strip.show.assert_not_called()
+        self.assertEqual(self.frame_buffer.frames_rendered, 1)
+        self.assertEqual(self.frame_buffer.frames_skipped, 1)
+
+    def test__render__one_changed_pixel__pushes_only_that_pixel(self):
+        self.frame_buffer.fill(0, 255, 0)
+        self.frame_buffer.render()
+        self.strip.reset_mock()
+
+        self.frame_buffer.set_pixel(2, 255, 0, 0)
+        self.frame_buffer.render()
+
+        self.strip.setPixelColor.assert_called_once_with(2, pack_color(255, 0, 0))
+        self.strip.show.assert_called_once_with()
+        self.assertEqual(self.frame_buffer.pixels_pushed, 5)
+
+    def test__render__after_invalidate__pushes_all_pixels_again(self):
+        self.frame_buffer.fill(0, 255, 0)
+        self.frame_buffer.render()
+        self.strip.reset_mock()
+
+        self.frame_buffer.invalidate()
+        self.frame_buffer.render()
+
+        self.assertEqual(self.strip.setPixelColor.call_count, 4)
+
+    def test__pack_color__matches_neopixel_layout(self):
+        self.assertEqual(pack_color(0x12, 0x34, 0x56), 0x123456)
+
+
+class NeoPixelLightTests(unittest.TestCase):
+
+    def setUp(self):
+        self.strip = MagicMock()
+        self.strip.numPixels.return_value = 16
+        with patch.object(backlight_wrapper, 'Adafruit_NeoPixel', return_value=self.strip), \
+                patch.object(backlight_wrapper.time, 'sleep'):
+            self.light = backlight_wrapper.NeoPixelLight()
+        self.strip.reset_mock()
+
+    def tearDown(self):
+        self.light.animation.close(timeout=1)
+
+    def test__state_changed__same_color_twice__shows_once(self):
+        self.light.state_changed(LEDState('rgb', (0, 255, 0)))
+        self.light.state_changed(LEDState('rgb', (0, 255, 0)))
+
+        self.strip.show.assert_called_once_with()
+
+    def test__state_changed__rainbow_twice__shows_once(self):
+        self.light.state_changed(LEDState('rainbow'))
+        self.light.state_changed(LEDState('rainbow'))
+
+        self.assertEqual(self.strip.setPixelColor.call_count, 16)
+        self.strip.show.assert_called_once_with()